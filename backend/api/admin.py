@@ -0,0 +1,132 @@
+"""
+Общие инструменты админки для больших таблиц: фильтры с автодополнением
+вместо перечисления всех значений и пагинатор с оценкой количества строк.
+"""
+import json
+
+from django import forms
+from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count, OuterRef, QuerySet, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.functional import cached_property
+
+
+def count_subquery(queryset, field):
+    """
+    Коррелированный подсчет связанных строк. В отличие от annotate(Count())
+    не требует GROUP BY по всей таблице и считается только для строк
+    текущей страницы.
+    """
+    return Coalesce(Subquery(
+        queryset.filter(**{field: OuterRef('pk')}).order_by().values(
+            field
+        ).annotate(total=Count('*')).values('total')
+    ), 0)
+
+
+class AutocompleteFilter(admin.SimpleListFilter):
+    """
+    Фильтр по внешнему ключу с виджетом автодополнения админки.
+    Значения не перечисляются: варианты подгружаются через autocomplete_view
+    (у админки связанной модели должны быть search_fields).
+    """
+    template = 'admin/autocomplete_filter.html'
+    field_name = None
+
+    def __init__(self, request, params, model, model_admin):
+        self.parameter_name = f'{self.field_name}__id__exact'
+        self.field = model._meta.get_field(self.field_name)
+        self.admin_site = model_admin.admin_site
+        super().__init__(request, params, model, model_admin)
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.value():
+            return queryset.filter(**{self.field.attname: self.value()})
+        return queryset
+
+    @property
+    def rendered_widget(self):
+        remote_model = self.field.remote_field.model
+        form_field = forms.ModelChoiceField(
+            queryset=remote_model._default_manager.all(),
+            widget=AutocompleteSelect(self.field, self.admin_site),
+            required=False,
+        )
+        return form_field.widget.render(
+            self.parameter_name, self.value(),
+            attrs={
+                'id': f'filter_{self.parameter_name}',
+                'style': 'width: 100%',
+            },
+        )
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Пагинатор, который на больших таблицах PostgreSQL не делает COUNT(*).
+    Без фильтров берется pg_class.reltuples, с фильтрами - оценка строк
+    из EXPLAIN. Если оценка меньше threshold, считается точно.
+    """
+    threshold = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not isinstance(queryset, QuerySet):
+            return super().count
+        connection = connections[queryset.db]
+        if connection.vendor != 'postgresql':
+            return super().count
+
+        with connection.cursor() as cursor:
+            if not queryset.query.where:
+                cursor.execute(
+                    'SELECT reltuples::bigint FROM pg_class '
+                    'WHERE oid = %s::regclass',
+                    [queryset.model._meta.db_table]
+                )
+                row = cursor.fetchone()
+                estimate = row[0] if row else None
+            else:
+                sql, params = queryset.query.sql_with_params()
+                cursor.execute('EXPLAIN (FORMAT JSON) ' + sql, params)
+                plan = cursor.fetchone()[0]
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                estimate = plan[0]['Plan']['Plan Rows']
+
+        if estimate is None or estimate < self.threshold:
+            return super().count
+        return int(estimate)
+
+
+class LargeTableAdminMixin:
+    """
+    Настройки changelist для больших таблиц: оценка количества строк,
+    без повторного COUNT(*) по всей таблице, статика для AutocompleteFilter.
+    """
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    @property
+    def media(self):
+        media = super().media
+        for list_filter in self.list_filter:
+            if (isinstance(list_filter, type)
+                    and issubclass(list_filter, AutocompleteFilter)):
+                field = self.model._meta.get_field(list_filter.field_name)
+                return (
+                    media
+                    + AutocompleteSelect(field, self.admin_site).media
+                    + forms.Media(js=['admin/js/autocomplete_filter.js'])
+                )
+        return media
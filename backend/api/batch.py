@@ -0,0 +1,172 @@
+"""
+Пакетное выполнение GET-запросов к API (/api/batch/).
+
+Пользователь аутентифицируется один раз при запросе к /api/batch/,
+подзапросы получают его через принудительную аутентификацию DRF
+(без повторной проверки токена) и выполняются в том же потоке, то есть
+на одном соединении с БД. Запросы отдельных объектов (detail без
+параметров) у ViewSet с read_many (см. api.mixins.MultiGetMixin)
+группируются: каждый ViewSet читает все свои объекты одним проходом.
+Перед этим для каждого такого подзапроса выполняются те же проверки,
+что DRF делает до вызова действия (права и лимиты view). read_many
+отдает словари, а не объекты, поэтому группируются только действия без
+проверок прав на уровне объекта. Остальные подзапросы проходят через
+view как обычно.
+"""
+import io
+from urllib.parse import urlsplit
+
+from django.core.handlers.wsgi import WSGIRequest
+from django.urls import Resolver404, resolve
+from rest_framework import status
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import BasePermission
+
+API_PREFIX = '/api/'
+BATCH_PATH = '/api/batch/'
+MAX_REQUESTS = 20
+
+
+def _wsgi_str(value):
+    # WSGI передает пути как байты, декодированные в latin-1.
+    return value.encode('utf-8').decode('iso-8859-1')
+
+
+def _result(path, status_code, body):
+    return {'path': path, 'status': status_code, 'body': body}
+
+
+def _sub_request(request, url):
+    """GET-запрос с заголовками и пользователем родительского запроса."""
+    environ = dict(request.META)
+    environ.pop('CONTENT_TYPE', None)
+    environ.update({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': _wsgi_str(url.path),
+        'QUERY_STRING': _wsgi_str(url.query),
+        'CONTENT_LENGTH': '0',
+        'wsgi.input': io.BytesIO(),
+    })
+    sub_request = WSGIRequest(environ)
+    if request.user.is_authenticated:
+        # Анонимный подзапрос проходит обычную аутентификацию, чтобы
+        # отказ был таким же, как у прямого запроса (401, а не 403).
+        sub_request._force_auth_user = request.user
+        sub_request._force_auth_token = request.auth
+    return sub_request
+
+
+def _dispatch(request, path, url, match):
+    response = match.func(_sub_request(request, url), *match.args,
+                          **match.kwargs)
+    body = getattr(response, 'data', None)
+    response.close()
+    return _result(path, response.status_code, body)
+
+
+def _initial_view(request, url, match):
+    """
+    Экземпляр ViewSet подзапроса в том состоянии, в каком его видит
+    dispatch() перед initial(): с действием и запросом DRF.
+    """
+    func = match.func
+    view = func.cls(**func.initkwargs)
+    view.action_map = func.actions
+    view.args, view.kwargs = match.args, match.kwargs
+    view.request = view.initialize_request(
+        _sub_request(request, url), *match.args, **match.kwargs
+    )
+    view.format_kwarg = view.get_format_suffix(**match.kwargs)
+    view.headers = view.default_response_headers
+    return view
+
+
+def _without_object_permissions(view):
+    return all(
+        type(permission).has_object_permission
+        is BasePermission.has_object_permission
+        for permission in view.get_permissions()
+    )
+
+
+def _check(view):
+    """Права и лимиты view; ответ об ошибке или None."""
+    try:
+        view.initial(view.request)
+    except Exception as exc:
+        return view.handle_exception(exc)
+    return None
+
+
+def _object_id(url, match):
+    """
+    (ViewSet, id), если подзапрос - чтение одного объекта, которое
+    можно объединить с другими (при отсутствии прав на уровне объекта);
+    иначе None.
+    """
+    view_class = getattr(match.func, 'cls', None)
+    actions = getattr(match.func, 'actions', None) or {}
+    if (url.query or view_class is None
+            or getattr(view_class, 'read_many', None) is None
+            or actions.get('get') != 'retrieve'):
+        return None
+    lookup = view_class.lookup_url_kwarg or view_class.lookup_field
+    value = match.kwargs.get(lookup, '')
+    if not value.isdigit():
+        return None
+    return view_class, int(value)
+
+
+def run(request, paths):
+    """Выполняет GET по путям paths, ответы - в том же порядке."""
+    results = [None] * len(paths)
+    grouped = {}
+    for index, path in enumerate(paths):
+        url = urlsplit(path)
+        if (url.scheme or url.netloc or not url.path.startswith(API_PREFIX)
+                or url.path.startswith(BATCH_PATH)):
+            results[index] = _result(
+                path, status.HTTP_400_BAD_REQUEST,
+                {'detail': 'Допустимы только пути API вида /api/...'},
+            )
+            continue
+        try:
+            match = resolve(url.path)
+        except Resolver404:
+            results[index] = _result(
+                path, status.HTTP_404_NOT_FOUND,
+                {'detail': NotFound.default_detail},
+            )
+            continue
+        object_id = _object_id(url, match)
+        view = None
+        if object_id is not None:
+            view = _initial_view(request, url, match)
+            if not _without_object_permissions(view):
+                view = None
+        if view is None:
+            results[index] = _dispatch(request, path, url, match)
+            continue
+        error = _check(view)
+        if error is not None:
+            results[index] = _result(path, error.status_code, error.data)
+            continue
+        view_class, pk = object_id
+        grouped.setdefault(view_class, []).append((index, pk))
+
+    for view_class, items in grouped.items():
+        ids = list(dict.fromkeys(pk for index, pk in items))
+        objects = {
+            data['id']: data for data in view_class.read_many(ids, request)
+        }
+        for index, pk in items:
+            if pk in objects:
+                results[index] = _result(
+                    paths[index], status.HTTP_200_OK, objects[pk]
+                )
+            else:
+                results[index] = _result(
+                    paths[index], status.HTTP_404_NOT_FOUND,
+                    {'detail': NotFound.default_detail},
+                )
+    return results
@@ -0,0 +1,624 @@
+"""
+Нагрузочное тестирование API по сценариям из postman-коллекции.
+
+Запросы (метод, адрес, тело, авторизация) берутся из коллекции
+postman_collection/foodgram.postman_collection.json по пути
+"папка/.../имя запроса". Сценарии (SCENARIOS) задают порядок запросов
+и какие значения ответов подставлять в следующие запросы вместо
+переменных коллекции ({{userToken}}, {{firstRecipeId}}, ...).
+Подстановка текстовая, как в Postman: строковые переменные тел
+(email, username, password) хранятся JSON-литералами, как в самой
+коллекции.
+
+Каждый поток играет за своего синтетического пользователя (seed()),
+сценарии выбираются случайно с учетом весов, общий темп запросов
+ограничивается параметром rate. Для каждого эндпоинта (шаблона адреса
+из коллекции) считаются перцентили задержки, пропускная способность и
+доля ошибок. Троттлинг (api.throttling) действует и на нагрузочный
+тест: ответы 429 считаются отдельно от ошибок.
+"""
+import base64
+import http.client
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from urllib.parse import quote, urlsplit
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+from recipes import duplicates
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from recipes.similarity import index_new_recipes
+from recipes.usage import recipes_added
+
+from .storage import acquire
+
+VARIABLE = re.compile(r'{{(\w+)}}')
+SEED_PREFIX = 'loadtest-'
+SEED_EMAIL_DOMAIN = 'example.org'
+SEED_PASSWORD = 'LoadTest-Pa$$w0rd'
+SEED_IMAGE = 'recipes/images/loadtest.png'
+# Картинка 1x1, та же, что в теле запросов коллекции.
+PNG = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABAgMAAABieywaAAAACVBMVEUAAAD///9fX1/S0ec'
+    'CAAAACXBIWXMAAA7EAAAOxAGVKw4bAAAACklEQVQImWNoAAAAggCByxOyYQAAAABJRU5Er'
+    'kJggg=='
+)
+PERCENTILES = (50, 95, 99)
+
+
+@dataclass(frozen=True)
+class CollectionRequest:
+    method: str
+    url: str
+    body: str
+    headers: tuple
+
+
+@dataclass(frozen=True)
+class Step:
+    # Путь запроса в коллекции и пары (переменная, ключ JSON-ответа).
+    request: str
+    save: tuple = ()
+
+
+@dataclass(frozen=True)
+class Scenario:
+    name: str
+    weight: int
+    steps: tuple
+    # Сценарий регистрирует нового пользователя со своими email/паролем.
+    new_user: bool = False
+
+
+ADD_TO_CART = Step(
+    'shopping_cart/add_to_shopping_cart/add_to_shopping_cart // User'
+)
+REMOVE_FROM_CART = Step(
+    'delete_requests/shopping_cart/remove_from_shopping_cart // User'
+)
+
+SCENARIOS = (
+    Scenario('browse', 10, (
+        Step('recipes/get_recipes/get_recipes_list // User'),
+        Step('recipes/get_recipes/get_recipe_detail // User'),
+        Step('ingredients/get_ingradients/'
+             'get_ingredients_list_with_name_filter // User'),
+        Step('users/get_user_info/get_profile // User'),
+    )),
+    Scenario('signup', 1, (
+        Step('register_and_get_tokens // No Auth/create_users/'
+             'create_first_user'),
+        Step('register_and_get_tokens // No Auth/get_tokens/'
+             'get_token_for_first_user', save=(('userToken', 'auth_token'),)),
+        Step('users/get_user_info/users_me // User'),
+    ), new_user=True),
+    Scenario('login', 2, (
+        Step('register_and_get_tokens // No Auth/logout/get_token',
+             save=(('userToken', 'auth_token'),)),
+        Step('users/get_user_info/users_me // User'),
+    )),
+    Scenario('recipe_crud', 2, (
+        Step('recipes/create_recipes/create_first_recipe // Second User',
+             save=(('firstRecipeId', 'id'),)),
+        Step('recipes/get_recipes/get_recipe_detail // User'),
+        Step('recipes/update_recipes/update_recipe // Second User'),
+        Step('delete_requests/recipes/delete_first_recipe // Second User'),
+    )),
+    Scenario('favorites', 3, (
+        Step('favorite/add_to_favorite/add_to_favorite // User'),
+        Step('recipe_filters_for_favorite_and_shopping_cart/'
+             'get_recipes_list_with_is_favorited_param // User'),
+        Step('delete_requests/favorite/remove_from_favorite // User'),
+    )),
+    Scenario('cart', 3, (
+        ADD_TO_CART,
+        Step('recipe_filters_for_favorite_and_shopping_cart/'
+             'get_recipes_list_with_is_in_shopping_cart_param // User'),
+        REMOVE_FROM_CART,
+    )),
+    Scenario('download', 1, (
+        ADD_TO_CART,
+        Step('shopping_cart/download_shopping_cart/'
+             'download_shopping_cart // User'),
+        REMOVE_FROM_CART,
+    )),
+    Scenario('subscriptions', 2, (
+        Step('subscriptions/create_subscriptions/create_subscription // User'),
+        Step('subscriptions/get_subscriptions/get_subscription_list // User'),
+        Step('delete_requests/subscriptions/'
+             'delete_first_subscription // User'),
+    )),
+)
+
+
+def _auth_headers(auth):
+    if not auth or auth.get('type') != 'apikey':
+        return ()
+    options = {item['key']: item['value'] for item in auth['apikey']}
+    if options.get('in', 'header') != 'header':
+        return ()
+    return ((options['key'], options['value']),)
+
+
+def load_collection(path):
+    """
+    Возвращает ({путь запроса: CollectionRequest}, {переменная: значение}).
+    Авторизация наследуется от папок, как в Postman.
+    """
+    with open(path, encoding='utf-8') as f:
+        collection = json.load(f)
+    requests = {}
+
+    def walk(items, prefix, auth):
+        for item in items:
+            name = f'{prefix}{item["name"]}'
+            if 'item' in item:
+                walk(item['item'], f'{name}/', item.get('auth') or auth)
+                continue
+            request = item['request']
+            url = request['url']
+            url = url['raw'] if isinstance(url, dict) else url
+            body = request.get('body') or {}
+            headers = [
+                (header['key'], header['value'])
+                for header in request.get('header', ())
+                if not header.get('disabled')
+            ]
+            if body.get('mode') == 'raw' and body.get('raw'):
+                headers.append(('Content-Type', 'application/json'))
+            headers.extend(_auth_headers(request.get('auth') or auth))
+            requests[name] = CollectionRequest(
+                method=request['method'],
+                url=url.replace('{{baseUrl}}', ''),
+                body=body.get('raw', '') if body.get('mode') == 'raw' else '',
+                headers=tuple(headers),
+            )
+
+    walk(collection['item'], '', collection.get('auth'))
+    variables = {
+        variable['key']: variable['value']
+        for variable in collection.get('variable', ())
+    }
+    return requests, variables
+
+
+def check_scenarios(requests, scenarios):
+    """Пути запросов сценариев, которых нет в коллекции."""
+    return sorted({
+        step.request
+        for scenario in scenarios
+        for step in scenario.steps
+        if step.request not in requests
+    })
+
+
+def render(template, context):
+    def replace(match):
+        try:
+            return context[match.group(1)]
+        except KeyError:
+            raise LookupError(
+                f'Переменная {{{{{match.group(1)}}}}} не задана'
+            ) from None
+    return VARIABLE.sub(replace, template)
+
+
+@dataclass(frozen=True)
+class Account:
+    id: int
+    email: str
+    token: str
+
+
+@dataclass(frozen=True)
+class Dataset:
+    accounts: tuple
+    recipe_ids: tuple
+    ingredients: tuple
+
+
+def synthetic_users():
+    """
+    Пользователи, созданные нагрузочным тестом: и username, и email
+    вида loadtest-...@example.org. Настоящий пользователь с похожим
+    username сюда не попадает.
+    """
+    return get_user_model().objects.filter(
+        username__startswith=SEED_PREFIX,
+        email__startswith=SEED_PREFIX,
+        email__endswith=f'@{SEED_EMAIL_DOMAIN}',
+    )
+
+
+def _seed_users(count):
+    User = get_user_model()
+    existing = synthetic_users().count()
+    password = make_password(SEED_PASSWORD)
+    User.objects.bulk_create(
+        User(
+            username=f'{SEED_PREFIX}{number}',
+            email=f'{SEED_PREFIX}{number}@{SEED_EMAIL_DOMAIN}',
+            first_name='Нагрузка', last_name='Тестовая',
+            password=password,
+        )
+        for number in range(existing, count)
+    )
+    users = list(synthetic_users().order_by('pk')[:count])
+    return tuple(
+        Account(user.pk, user.email, Token.objects.get_or_create(
+            user=user
+        )[0].key)
+        for user in users
+    )
+
+
+def _seed_recipes(count, accounts, ingredient_ids, rng):
+    existing = Recipe.objects.filter(
+        author__username__startswith=SEED_PREFIX
+    ).count()
+    if existing >= count:
+        return
+    image = default_storage.save(SEED_IMAGE, ContentFile(PNG))
+    recipes = Recipe.objects.bulk_create(
+        Recipe(
+            author_id=accounts[number % len(accounts)].id,
+            name=f'Нагрузочный рецепт {number}',
+            text='Синтетический рецепт для нагрузочного теста.',
+            cooking_time=rng.randint(1, 120),
+            image=image,
+            ingredients_count=0,
+        )
+        for number in range(existing, count)
+    )
+    links, index = [], {}
+    for recipe in recipes:
+        chosen = rng.sample(ingredient_ids, min(len(ingredient_ids),
+                                                rng.randint(3, 8)))
+        index[recipe.pk] = chosen
+        amounts = [
+            (ingredient_id, rng.randint(1, 500)) for ingredient_id in chosen
+        ]
+        links.extend(
+            RecipeIngredient(
+                recipe_id=recipe.pk, ingredient_id=ingredient_id,
+                amount=amount,
+            )
+            for ingredient_id, amount in amounts
+        )
+        recipe.ingredients_count = len(chosen)
+        duplicates.fingerprint(recipe, amounts)
+    RecipeIngredient.objects.bulk_create(links)
+    Recipe.objects.bulk_update(recipes, [
+        'ingredients_count', 'ingredients_fingerprint', 'name_fingerprint'
+    ])
+    index_new_recipes(index)
+    recipes_added(index)
+    # bulk_create не шлет сигналы, ссылки на картинку учитываем сами.
+    for recipe in recipes:
+        acquire(image, default_storage)
+
+
+def seed(users, recipes, random_seed=None):
+    """
+    Доводит число синтетических пользователей (loadtest-N) и их
+    рецептов до users и recipes. Возвращает Dataset для прогона.
+    """
+    rng = random.Random(random_seed)
+    ingredients = tuple(Ingredient.objects.values_list('id', 'name'))
+    if len(ingredients) < 2:
+        raise ValueError(
+            'Нужно хотя бы два ингредиента: выполните load_ingredients.'
+        )
+    with transaction.atomic():
+        accounts = _seed_users(users)
+        if recipes:
+            _seed_recipes(
+                recipes, accounts, [pk for pk, name in ingredients], rng
+            )
+    recipe_ids = tuple(Recipe.objects.values_list('id', flat=True))
+    if not recipe_ids:
+        raise ValueError('В базе нет рецептов для сценариев.')
+    return Dataset(accounts, recipe_ids, ingredients)
+
+
+def cleanup():
+    """Удаляет синтетических пользователей вместе с их данными."""
+    deleted, _ = synthetic_users().delete()
+    return deleted
+
+
+class Pacer:
+    """Общий для потоков темп: не больше rate запросов в секунду."""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+
+    def wait(self):
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            slot = max(self.next_slot, now)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+def percentile(values, percent):
+    """Перцентиль по ближайшему рангу для отсортированного списка."""
+    if not values:
+        return None
+    rank = max(1, -(-len(values) * percent // 100))
+    return values[int(rank) - 1]
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.scenarios = Counter()
+
+    def record(self, endpoint, status, seconds):
+        with self.lock:
+            self.latencies[endpoint].append(seconds)
+            self.statuses[endpoint][status] += 1
+
+    def _summarize(self, latencies, statuses, elapsed):
+        latencies = sorted(latencies)
+        count = len(latencies)
+        throttled = statuses.get(429, 0)
+        errors = sum(
+            number for status, number in statuses.items()
+            if status is None or (status >= 400 and status != 429)
+        )
+        summary = {
+            'requests': count,
+            'errors': errors,
+            'throttled': throttled,
+            'error_rate': round(errors / count, 4) if count else 0,
+            'rps': round(count / elapsed, 2) if elapsed else 0,
+            'statuses': {
+                str(status or 'error'): number
+                for status, number in sorted(
+                    statuses.items(), key=lambda item: str(item[0])
+                )
+            },
+        }
+        latency = {
+            f'p{percent}': percentile(latencies, percent)
+            for percent in PERCENTILES
+        }
+        latency['mean'] = sum(latencies) / count if count else None
+        latency['max'] = latencies[-1] if latencies else None
+        summary['latency_ms'] = {
+            name: round(value * 1000, 2) if value is not None else None
+            for name, value in latency.items()
+        }
+        return summary
+
+    def summary(self, elapsed):
+        with self.lock:
+            endpoints = {
+                endpoint: self._summarize(
+                    self.latencies[endpoint], self.statuses[endpoint],
+                    elapsed,
+                )
+                for endpoint in sorted(self.latencies)
+            }
+            total = Counter()
+            for statuses in self.statuses.values():
+                total.update(statuses)
+            return {
+                'elapsed_seconds': round(elapsed, 3),
+                'scenarios': dict(self.scenarios),
+                'total': self._summarize(
+                    [value for values in self.latencies.values()
+                     for value in values],
+                    total, elapsed,
+                ),
+                'endpoints': endpoints,
+            }
+
+
+def saved_values(content, save):
+    """
+    {переменная: str(значение)} по парам (переменная, ключ) save из
+    JSON-ответа; ValueError, если ответ не JSON-объект с этими ключами.
+    """
+    data = json.loads(content)
+    try:
+        return {variable: str(data[key]) for variable, key in save}
+    except (KeyError, TypeError, IndexError) as error:
+        raise ValueError(f'В ответе нет поля {error}') from error
+
+
+class Runner:
+    """
+    Прогон сценариев в concurrency потоках в течение duration секунд
+    (или до iterations итераций сценариев в сумме).
+    """
+
+    def __init__(self, base_url, requests, variables, dataset, scenarios,
+                 concurrency=10, rate=0, duration=60, iterations=None,
+                 timeout=30, random_seed=None):
+        url = urlsplit(base_url)
+        self.connection_class = (
+            http.client.HTTPSConnection if url.scheme == 'https'
+            else http.client.HTTPConnection
+        )
+        self.netloc = url.netloc
+        self.prefix = url.path.rstrip('/')
+        self.requests = requests
+        self.variables = variables
+        self.dataset = dataset
+        self.scenarios = [scenario for scenario in scenarios
+                          if scenario.weight > 0]
+        self.weights = [scenario.weight for scenario in self.scenarios]
+        self.concurrency = concurrency
+        self.pacer = Pacer(rate)
+        self.duration = duration
+        self.iterations = iterations
+        self.timeout = timeout
+        self.random_seed = random_seed
+        self.stats = Stats()
+        self.stop = threading.Event()
+        self.started = 0
+        self.counter_lock = threading.Lock()
+
+    def _next_iteration(self):
+        with self.counter_lock:
+            if self.iterations is not None and self.started >= self.iterations:
+                return False
+            self.started += 1
+            return True
+
+    def _context(self, account, rng, scenario):
+        """Переменные коллекции для одной итерации сценария."""
+        dataset = self.dataset
+        others = [other for other in dataset.accounts
+                  if other.id != account.id] or [account]
+        first, second = rng.sample(dataset.ingredients, 2)
+        context = dict(self.variables)
+        context.update({
+            'userId': str(account.id),
+            'email': json.dumps(account.email),
+            'password': json.dumps(SEED_PASSWORD),
+            'userToken': account.token,
+            'secondUserToken': account.token,
+            'firstRecipeId': str(rng.choice(dataset.recipe_ids)),
+            'secondUserId': str(rng.choice(others).id),
+            'thirdUserId': str(rng.choice(others).id),
+            'firstIndredientId': str(first[0]),
+            'secondIndredientId': str(second[0]),
+            'ingredientNameFirstLatter': quote(first[1][:1]),
+        })
+        if scenario.new_user:
+            name = f'{SEED_PREFIX}new-{uuid.uuid4().hex[:12]}'
+            context.update({
+                'username': json.dumps(name),
+                'email': json.dumps(f'{name}@{SEED_EMAIL_DOMAIN}'),
+                'password': json.dumps(SEED_PASSWORD),
+            })
+        return context
+
+    def _send(self, connection, request, context, save=()):
+        """
+        Выполняет запрос и записывает его в статистику. Возвращает
+        (статус, {переменная: значение} из ответа по save). Ответ без
+        нужных полей считается ошибкой, как и сбой соединения.
+        """
+        url = render(request.url, context)
+        body = render(request.body, context).encode() if request.body else None
+        headers = {name: render(value, context)
+                   for name, value in request.headers}
+        endpoint = f'{request.method} {request.url}'
+        self.pacer.wait()
+        started = time.perf_counter()
+        try:
+            connection.request(
+                request.method, self.prefix + url, body=body, headers=headers
+            )
+            response = connection.getresponse()
+            content = response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            connection.close()
+            status, content = None, b''
+        saved = {}
+        if save and status is not None and status < 400:
+            try:
+                saved = saved_values(content, save)
+            except ValueError:
+                status = None
+        self.stats.record(endpoint, status, time.perf_counter() - started)
+        return status, saved
+
+    def _run_scenario(self, connection, scenario, context):
+        for step in scenario.steps:
+            status, saved = self._send(
+                connection, self.requests[step.request], context, step.save
+            )
+            if status is None or status >= 400:
+                return
+            context.update(saved)
+
+    def _worker(self, number, deadline):
+        account = self.dataset.accounts[
+            number % len(self.dataset.accounts)
+        ]
+        seed = None if self.random_seed is None else self.random_seed + number
+        rng = random.Random(seed)
+        connection = self.connection_class(self.netloc, timeout=self.timeout)
+        try:
+            while not self.stop.is_set() and time.monotonic() < deadline:
+                if not self._next_iteration():
+                    return
+                scenario = rng.choices(self.scenarios, self.weights)[0]
+                with self.stats.lock:
+                    self.stats.scenarios[scenario.name] += 1
+                self._run_scenario(
+                    connection, scenario,
+                    self._context(account, rng, scenario),
+                )
+        finally:
+            connection.close()
+
+    def run(self):
+        """Выполняет прогон и возвращает сводку (см. Stats.summary)."""
+        started = time.monotonic()
+        deadline = started + self.duration
+        threads = [
+            threading.Thread(
+                target=self._worker, args=(number, deadline), daemon=True
+            )
+            for number in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                thread.join()
+        except KeyboardInterrupt:
+            self.stop.set()
+            for thread in threads:
+                thread.join()
+        return self.stats.summary(time.monotonic() - started)
+
+
+def report_lines(summary, baseline=None):
+    """Текстовая таблица по эндпоинтам (с p95 базового прогона)."""
+    header = (f'{"endpoint":<64} {"req":>7} {"rps":>8} {"err%":>6} '
+              f'{"429":>5} {"p50":>8} {"p95":>8} {"p99":>8}')
+    if baseline:
+        header += f' {"p95 was":>8}'
+    lines = [header]
+    rows = list(summary['endpoints'].items()) + [('TOTAL', summary['total'])]
+    for endpoint, row in rows:
+        latency = row['latency_ms']
+        line = (
+            f'{endpoint[:64]:<64} {row["requests"]:>7} {row["rps"]:>8} '
+            f'{row["error_rate"] * 100:>6.1f} {row["throttled"]:>5} '
+            f'{latency["p50"] or 0:>8.1f} {latency["p95"] or 0:>8.1f} '
+            f'{latency["p99"] or 0:>8.1f}'
+        )
+        if baseline:
+            old = (baseline['total'] if endpoint == 'TOTAL'
+                   else baseline['endpoints'].get(endpoint))
+            was = old['latency_ms']['p95'] if old else None
+            line += f' {was:>8.1f}' if was is not None else f' {"-":>8}'
+        lines.append(line)
+    return lines
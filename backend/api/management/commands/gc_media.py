@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand
+
+from api.media_gc import collect
+
+
+class Command(BaseCommand):
+    help = 'Deletes media files no longer referenced by recipes or users'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report what would be deleted',
+        )
+        parser.add_argument(
+            '--grace-hours', type=float, default=24,
+            help='Keep unreferenced files younger than this (in-flight '
+                 'uploads)',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=8,
+            help='Threads used to scan media directories',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        verbose = options['verbosity'] > 1
+
+        def report(name, size):
+            if verbose or dry_run:
+                self.stdout.write(f'  {name} ({size} bytes)')
+
+        self.stdout.write(
+            'Collecting orphaned media' + (' (dry run)...' if dry_run
+                                           else '...')
+        )
+        summary = collect(
+            grace_seconds=options['grace_hours'] * 3600,
+            dry_run=dry_run,
+            workers=options['workers'],
+            on_orphan=report,
+        )
+        action = 'Would delete' if dry_run else 'Deleted'
+        self.stdout.write(
+            f'Scanned {summary.scanned} files: {summary.referenced} '
+            f'referenced, {summary.orphaned} orphaned, {summary.recent} '
+            f'within grace period.'
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {summary.deleted} files, reclaimed '
+            f'{summary.reclaimed_bytes} bytes.'
+        ))
@@ -0,0 +1,155 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api import loadtest
+
+DEFAULT_COLLECTION = (
+    settings.BASE_DIR.parent / 'postman_collection'
+    / 'foodgram.postman_collection.json'
+)
+
+
+def scenario_weight(value):
+    name, _, weight = value.partition('=')
+    try:
+        return name, int(weight)
+    except ValueError:
+        raise ValueError(f'Expected name=weight, got {value!r}')
+
+
+class Command(BaseCommand):
+    help = ('Replays the Postman collection flows as weighted scenarios '
+            'against a running instance and reports latency per endpoint')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--base-url', default='http://127.0.0.1:8000',
+            help='Instance to load (must use the same database)',
+        )
+        parser.add_argument(
+            '--collection', default=str(DEFAULT_COLLECTION),
+            help='Path to the Postman collection',
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=10,
+            help='Parallel virtual users',
+        )
+        parser.add_argument(
+            '--rate', type=float, default=0,
+            help='Max requests per second across all users (0 = no limit)',
+        )
+        parser.add_argument(
+            '--duration', type=float, default=60,
+            help='Run time in seconds',
+        )
+        parser.add_argument(
+            '--iterations', type=int,
+            help='Stop after this many scenario runs in total',
+        )
+        parser.add_argument(
+            '--scenario', action='append', type=scenario_weight, default=[],
+            metavar='NAME=WEIGHT',
+            help='Override a scenario weight (0 disables it); repeatable',
+        )
+        parser.add_argument(
+            '--users', type=int, default=50,
+            help='Synthetic users to seed (at least --concurrency)',
+        )
+        parser.add_argument(
+            '--recipes', type=int, default=500,
+            help='Synthetic recipes to seed',
+        )
+        parser.add_argument(
+            '--seed', type=int,
+            help='Random seed for data and scenario choice',
+        )
+        parser.add_argument(
+            '--timeout', type=float, default=30,
+            help='Per-request timeout in seconds',
+        )
+        parser.add_argument(
+            '--output', help='Write the JSON summary to this file',
+        )
+        parser.add_argument(
+            '--compare', help='JSON summary of a previous run to compare',
+        )
+        parser.add_argument(
+            '--cleanup', action='store_true',
+            help='Delete the synthetic users and their data, then exit',
+        )
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            deleted = loadtest.cleanup()
+            self.stdout.write(self.style.SUCCESS(
+                f'Deleted {deleted} synthetic objects.'
+            ))
+            return
+
+        weights = dict(options['scenario'])
+        unknown = set(weights) - {s.name for s in loadtest.SCENARIOS}
+        if unknown:
+            raise CommandError(f'Unknown scenarios: {sorted(unknown)}')
+        scenarios = [
+            loadtest.Scenario(
+                s.name, weights.get(s.name, s.weight), s.steps, s.new_user
+            )
+            for s in loadtest.SCENARIOS
+        ]
+        if not any(scenario.weight > 0 for scenario in scenarios):
+            raise CommandError('All scenarios are disabled.')
+
+        requests, variables = loadtest.load_collection(options['collection'])
+        missing = loadtest.check_scenarios(requests, scenarios)
+        if missing:
+            raise CommandError(
+                f'Requests not found in the collection: {missing}'
+            )
+        baseline = None
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as f:
+                baseline = json.load(f)['summary']
+
+        self.stdout.write('Seeding synthetic data...')
+        try:
+            dataset = loadtest.seed(
+                max(options['users'], options['concurrency']),
+                options['recipes'], options['seed'],
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        self.stdout.write(
+            f'Running {options["concurrency"]} users against '
+            f'{options["base_url"]} for {options["duration"]}s...'
+        )
+        runner = loadtest.Runner(
+            options['base_url'], requests, variables, dataset, scenarios,
+            concurrency=options['concurrency'], rate=options['rate'],
+            duration=options['duration'], iterations=options['iterations'],
+            timeout=options['timeout'], random_seed=options['seed'],
+        )
+        summary = runner.run()
+
+        for line in loadtest.report_lines(summary, baseline):
+            self.stdout.write(line)
+        if options['output']:
+            config = {
+                name: options[name]
+                for name in ('base_url', 'concurrency', 'rate', 'duration',
+                             'iterations', 'seed')
+            }
+            config['weights'] = {s.name: s.weight for s in scenarios}
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(
+                    {'config': config, 'summary': summary}, f,
+                    ensure_ascii=False, indent=2,
+                )
+        total = summary['total']
+        self.stdout.write(self.style.SUCCESS(
+            f'{total["requests"]} requests, {total["rps"]} req/s, '
+            f'error rate {total["error_rate"] * 100:.1f}%, '
+            f'{total["throttled"]} throttled.'
+        ))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api.startup import run_steps
+
+
+class Command(BaseCommand):
+    help = ('Runs container startup steps (migrate, collectstatic, '
+            'load_ingredients), skipping those whose inputs are unchanged')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Run every step regardless of fingerprints',
+        )
+        parser.add_argument(
+            '--skip', action='append', default=[],
+            help='Name of a step to skip (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+
+        def report(result):
+            self.stdout.write(
+                f'{result.name:<18} {result.status:<20} '
+                f'{result.seconds:8.3f}s'
+            )
+
+        run_steps(
+            force=options['force'], skip=options['skip'], on_step=report
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Startup finished in {time.monotonic() - started:.3f}s.'
+        ))
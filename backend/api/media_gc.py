@@ -0,0 +1,174 @@
+"""
+Сборка мусора в MEDIA_ROOT.
+
+Для каждого каталога из media_dirs() сравниваются два отсортированных
+потока: файлы на диске и пути из полей моделей, которые на них
+ссылаются. Оба потока идут в одном (побайтовом) порядке, поэтому
+сравнение - это слияние за один проход, и в памяти не держится полный
+список ни с одной стороны. Подкаталоги (шардированные по хешу, см.
+api.storage) сканируются параллельно.
+"""
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.db import connection
+from django.db.models.functions import Collate
+
+from recipes.models import Recipe
+
+from .models import StoredFile
+
+# Побайтовая сортировка строк, совпадающая с порядком str в Python.
+BINARY_COLLATIONS = {'postgresql': 'C', 'sqlite': 'BINARY'}
+ITERATOR_CHUNK_SIZE = 2000
+
+
+def media_dirs():
+    """Пары (каталог в MEDIA_ROOT, модель, поле с путем к файлу)."""
+    return (
+        ('recipes/images', Recipe, 'image'),
+        ('users/avatars', get_user_model(), 'avatar'),
+    )
+
+
+@dataclass
+class Summary:
+    scanned: int = 0
+    referenced: int = 0
+    orphaned: int = 0
+    recent: int = 0
+    deleted: int = 0
+    reclaimed_bytes: int = 0
+
+
+def _sort_key(entry):
+    # Каталог сортируется как "имя/", чтобы порядок совпадал
+    # с порядком полных путей: 'ab.png' < 'ab/...'.
+    return entry.name + '/' if entry.is_dir() else entry.name
+
+
+def _scan(path, prefix):
+    """Рекурсивно возвращает отсортированный список (путь, размер, mtime)."""
+    files = []
+    with os.scandir(path) as entries:
+        for entry in sorted(entries, key=_sort_key):
+            name = f'{prefix}/{entry.name}'
+            if entry.is_dir(follow_symlinks=False):
+                files.extend(_scan(entry.path, name))
+            elif entry.is_file(follow_symlinks=False):
+                stat = entry.stat()
+                files.append((name, stat.st_size, stat.st_mtime))
+    return files
+
+
+def iter_files(directory, workers):
+    """
+    Отсортированный поток файлов каталога. Подкаталоги верхнего уровня
+    сканируются в пуле потоков с ограниченным опережением.
+    """
+    root = os.path.join(settings.MEDIA_ROOT, directory)
+    try:
+        with os.scandir(root) as it:
+            entries = sorted(it, key=_sort_key)
+    except FileNotFoundError:
+        return
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = []
+        index = 0
+        while index < len(entries) or pending:
+            while index < len(entries) and len(pending) < workers * 2:
+                entry = entries[index]
+                name = f'{directory}/{entry.name}'
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(pool.submit(_scan, entry.path, name))
+                elif entry.is_file(follow_symlinks=False):
+                    stat = entry.stat()
+                    pending.append([(name, stat.st_size, stat.st_mtime)])
+                index += 1
+            batch = pending.pop(0)
+            yield from batch if isinstance(batch, list) else batch.result()
+
+
+def iter_references(directory, model, field_name):
+    """Отсортированный поток путей из поля модели внутри каталога."""
+    queryset = model.objects.filter(
+        **{f'{field_name}__startswith': f'{directory}/'}
+    )
+    collation = BINARY_COLLATIONS.get(connection.vendor)
+    ordering = Collate(field_name, collation) if collation else field_name
+    names = queryset.order_by(ordering).values_list(
+        field_name, flat=True
+    ).distinct().iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+    yield from names
+
+
+def _still_orphaned(model, field_name, name, grace_seconds):
+    """Повторная проверка перед удалением: загрузка могла прийти только что."""
+    if model.objects.filter(**{field_name: name}).exists():
+        return False
+    try:
+        mtime = os.path.getmtime(os.path.join(settings.MEDIA_ROOT, name))
+    except FileNotFoundError:
+        return False
+    return time.time() - mtime >= grace_seconds
+
+
+def purge_unreferenced(names):
+    """
+    Сразу удаляет файлы names, на которые не ссылается ни одна модель:
+    например, записанные транзакцией, которая откатилась. Хранилище
+    контентно-адресуемое, поэтому файл с тем же содержимым мог уже
+    использоваться - такие файлы остаются.
+    """
+    for name in names:
+        for directory, model, field_name in media_dirs():
+            if name.startswith(f'{directory}/'):
+                if not model.objects.filter(**{field_name: name}).exists():
+                    default_storage.purge(name)
+                break
+
+
+def collect(grace_seconds, dry_run=False, workers=8, on_orphan=None):
+    """
+    Удаляет файлы без ссылок старше grace_seconds.
+    В режиме dry_run только считает. Возвращает Summary.
+    """
+    summary = Summary()
+    now = time.time()
+    for directory, model, field_name in media_dirs():
+        references = iter_references(directory, model, field_name)
+        reference = next(references, None)
+        purged = []
+        for name, size, mtime in iter_files(directory, workers):
+            summary.scanned += 1
+            while reference is not None and reference < name:
+                reference = next(references, None)
+            if reference == name:
+                summary.referenced += 1
+                continue
+            summary.orphaned += 1
+            if now - mtime < grace_seconds:
+                summary.recent += 1
+                continue
+            if on_orphan is not None:
+                on_orphan(name, size)
+            if dry_run:
+                summary.deleted += 1
+                summary.reclaimed_bytes += size
+                continue
+            if not _still_orphaned(model, field_name, name, grace_seconds):
+                continue
+            default_storage.purge(name)
+            summary.deleted += 1
+            summary.reclaimed_bytes += size
+            purged.append(name)
+            if len(purged) >= ITERATOR_CHUNK_SIZE:
+                StoredFile.objects.filter(name__in=purged).delete()
+                purged = []
+        StoredFile.objects.filter(name__in=purged).delete()
+    return summary
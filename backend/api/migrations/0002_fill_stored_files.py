@@ -0,0 +1,43 @@
+import os
+from collections import Counter
+
+from django.conf import settings
+from django.db import migrations
+
+
+def fill_stored_files(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    User = apps.get_model('users', 'User')
+    StoredFile = apps.get_model('api', 'StoredFile')
+    counts = Counter(
+        Recipe.objects.exclude(image='').values_list('image', flat=True)
+    )
+    counts.update(
+        User.objects.exclude(avatar='').exclude(
+            avatar__isnull=True
+        ).values_list('avatar', flat=True)
+    )
+
+    def size(name):
+        try:
+            return os.path.getsize(os.path.join(settings.MEDIA_ROOT, name))
+        except OSError:
+            return 0
+
+    StoredFile.objects.bulk_create([
+        StoredFile(name=name, size=size(name), refcount=refcount)
+        for name, refcount in counts.items()
+    ], batch_size=1000, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+        ('recipes', '0008_short_links'),
+        ('users', '0002_data_exports'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_stored_files, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-19 09:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_fill_stored_files'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StartupStep',
+            fields=[
+                ('name', models.CharField(max_length=64, primary_key=True, serialize=False, verbose_name='Шаг')),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='Отпечаток')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Выполнен')),
+            ],
+            options={
+                'verbose_name': 'Шаг запуска',
+                'verbose_name_plural': 'Шаги запуска',
+            },
+        ),
+    ]
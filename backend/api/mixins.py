@@ -0,0 +1,102 @@
+from rest_framework import serializers
+from rest_framework.response import Response
+
+MAX_IDS = 100
+
+
+def get_query_list(request, name):
+    """
+    Разбирает параметр запроса вида ?name=a,b,c в множество строк.
+    Повторяющиеся параметры (?name=a&name=b) объединяются.
+    """
+    if request is None:
+        return set()
+    params = getattr(request, 'query_params', request.GET)
+    values = set()
+    for value in params.getlist(name):
+        values.update(
+            part.strip() for part in value.split(',') if part.strip()
+        )
+    return values
+
+
+def get_query_ids(request, name='ids', limit=MAX_IDS):
+    """
+    Разбирает ?name=3,1,2 в список целых id без повторов, сохраняя
+    порядок. Не больше limit id.
+    """
+    ids = {}
+    for value in request.query_params.getlist(name):
+        for part in value.split(','):
+            part = part.strip()
+            if not part:
+                continue
+            if not part.isdigit():
+                raise serializers.ValidationError(
+                    {name: 'Ожидается список целых чисел через запятую.'}
+                )
+            ids[int(part)] = None
+    if len(ids) > limit:
+        raise serializers.ValidationError(
+            {name: f'Не более {limit} id в одном запросе.'}
+        )
+    return list(ids)
+
+
+class MultiGetMixin:
+    """
+    Миксин ViewSet: ?ids=3,1,2 в списке отдает объекты с этими id
+    в том же порядке, без пагинации и фильтров (несуществующие
+    пропускаются). Подкласс задает read_many(ids, request) - быстрое
+    чтение многих объектов одним проходом; его же использует /api/batch/
+    для объединения запросов отдельных объектов, поэтому read_many
+    не должен требовать прав сверх тех, что нужны для retrieve.
+    С ?fields= используется обычный сериализатор.
+    """
+    read_many = None
+
+    def multi_get(self, request):
+        ids = get_query_ids(request)
+        if get_query_list(request, 'fields'):
+            objects = self.get_queryset().in_bulk(ids)
+            serializer = self.get_serializer(
+                [objects[pk] for pk in ids if pk in objects], many=True
+            )
+            return Response(serializer.data)
+        return Response(self.read_many(ids, request))
+
+
+class SparseFieldsetMixin:
+    """
+    Миксин сериализатора для разреженных выборок полей.
+    ?fields=a,b - оставить в ответе только перечисленные поля.
+    ?expand=x,y - вложенные объекты, которые нужно отдать целиком;
+    остальные поля из collapsed_fields при заданном ?fields= заменяются
+    компактным представлением (обычно id).
+    Без ?fields= ответ не меняется. Действует только на сериализатор
+    верхнего уровня, вложенные сериализаторы отдаются как обычно.
+    """
+    collapsed_fields = {}
+
+    def _is_top_level(self):
+        parent = self.parent
+        if parent is None:
+            return True
+        return (isinstance(parent, serializers.ListSerializer)
+                and parent.parent is None)
+
+    def get_fields(self):
+        fields = super().get_fields()
+        request = self.context.get('request')
+        if request is None or not self._is_top_level():
+            return fields
+        requested = get_query_list(request, 'fields')
+        if not requested:
+            return fields
+        expand = get_query_list(request, 'expand')
+        for name in list(fields):
+            if name not in requested:
+                fields.pop(name)
+            elif name in self.collapsed_fields and name not in expand:
+                fields[name] = self.collapsed_fields[name]()
+        return fields
@@ -0,0 +1,63 @@
+from django.db import models
+from django.utils.translation import gettext_lazy as _
+
+
+class StoredFile(models.Model):
+    """
+    Файл в контентно-адресуемом хранилище (см. api.storage).
+    refcount - сколько полей моделей ссылается на файл; файлы с нулевым
+    счетчиком удаляются сборщиком gc_media.
+    """
+    name = models.CharField(
+        _('Путь'),
+        max_length=255,
+        unique=True,
+    )
+    size = models.PositiveBigIntegerField(
+        _('Размер (байт)'),
+        default=0,
+    )
+    refcount = models.PositiveIntegerField(
+        _('Количество ссылок'),
+        default=0,
+        db_index=True,
+    )
+    created_at = models.DateTimeField(
+        _('Загружен'),
+        auto_now_add=True,
+    )
+
+    class Meta:
+        verbose_name = _('Файл хранилища')
+        verbose_name_plural = _('Файлы хранилища')
+        ordering = ('name',)
+
+    def __str__(self):
+        return f'{self.name} ({self.refcount})'
+
+
+class StartupStep(models.Model):
+    """
+    Отпечаток входных данных шага запуска контейнера (см. api.startup):
+    шаг пропускается, если отпечаток не изменился.
+    """
+    name = models.CharField(
+        _('Шаг'),
+        max_length=64,
+        primary_key=True,
+    )
+    fingerprint = models.CharField(
+        _('Отпечаток'),
+        max_length=64,
+    )
+    updated_at = models.DateTimeField(
+        _('Выполнен'),
+        auto_now=True,
+    )
+
+    class Meta:
+        verbose_name = _('Шаг запуска')
+        verbose_name_plural = _('Шаги запуска')
+
+    def __str__(self):
+        return f'{self.name}: {self.fingerprint[:12]}'
@@ -0,0 +1,97 @@
+"""
+Поиск последовательных сканирований в планах запросов.
+
+Используется тестами: запросы эндпоинта перехватываются
+CaptureQueriesContext, для каждого SELECT строится план (EXPLAIN), и
+проверяется, что большие таблицы читаются по индексу. На PostgreSQL план
+строится с enable_seqscan = off: на тестовом объеме данных планировщик
+честно выбрал бы Seq Scan, а так Seq Scan в плане остается только
+там, где подходящего индекса нет вовсе. На SQLite разбирается вывод
+EXPLAIN QUERY PLAN ('SCAN таблица' без 'USING INDEX').
+"""
+import re
+
+from django.db import connection
+
+# Таблицы, которые растут вместе с числом пользователей и рецептов.
+HOT_TABLES = frozenset({
+    'recipes_recipe',
+    'recipes_recipeingredient',
+    'recipes_ingredient',
+    'recipes_favorite',
+    'recipes_shoppingcart',
+    'users_user',
+    'users_subscription',
+})
+
+SQLITE_ALIAS = re.compile(r'"(\w+)"\s+(?:AS\s+)?"?([A-Z]\d+)"?')
+SQLITE_SCAN = re.compile(r'^SCAN (\w+)(?: AS (\w+))?$')
+
+
+def _walk(node):
+    yield node
+    for child in node.get('Plans', ()):
+        yield from _walk(child)
+
+
+def _postgresql_scans(sql):
+    with connection.cursor() as cursor:
+        cursor.execute('SET enable_seqscan = off')
+        try:
+            cursor.execute('EXPLAIN (FORMAT JSON) ' + sql)
+            plan = cursor.fetchone()[0]
+        finally:
+            cursor.execute('RESET enable_seqscan')
+    return [
+        node['Relation Name']
+        for node in _walk(plan[0]['Plan'])
+        if node['Node Type'] == 'Seq Scan'
+    ]
+
+
+def _sqlite_scans(sql):
+    aliases = dict(
+        (alias, table) for table, alias in SQLITE_ALIAS.findall(sql)
+    )
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+        details = [row[-1] for row in cursor.fetchall()]
+    tables = []
+    for detail in details:
+        match = SQLITE_SCAN.match(detail)
+        if match:
+            name = match.group(2) or match.group(1)
+            tables.append(aliases.get(name, match.group(1)))
+    return tables
+
+
+def sequential_scans(sql, tables=HOT_TABLES):
+    """
+    Таблицы из tables, которые запрос sql (с подставленными
+    параметрами, как в connection.queries) читает целиком.
+    """
+    if connection.vendor == 'postgresql':
+        scanned = _postgresql_scans(sql)
+    elif connection.vendor == 'sqlite':
+        scanned = _sqlite_scans(sql)
+    else:
+        raise NotImplementedError(
+            f'EXPLAIN не поддерживается для {connection.vendor}'
+        )
+    return sorted({table for table in scanned if table in tables})
+
+
+def find_sequential_scans(queries, tables=HOT_TABLES):
+    """
+    [(sql, [таблицы])] для SELECT-запросов из captured_queries
+    CaptureQueriesContext, в планах которых есть полное сканирование.
+    """
+    found = []
+    for query in queries:
+        sql = query['sql']
+        if not sql.lstrip().upper().startswith('SELECT'):
+            continue
+        scanned = sequential_scans(sql, tables)
+        if scanned:
+            found.append((sql, scanned))
+    return found
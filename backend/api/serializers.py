@@ -0,0 +1,15 @@
+from rest_framework import serializers
+
+from .batch import MAX_REQUESTS
+
+
+class BatchItemSerializer(serializers.Serializer):
+    """Один подзапрос пакета: только GET по пути API."""
+    method = serializers.ChoiceField(choices=['GET'], default='GET')
+    path = serializers.CharField(max_length=2048)
+
+
+class BatchSerializer(serializers.Serializer):
+    requests = BatchItemSerializer(
+        many=True, allow_empty=False, max_length=MAX_REQUESTS
+    )
@@ -0,0 +1,62 @@
+"""
+Учет ссылок на файлы контентно-адресуемого хранилища
+для Recipe.image и User.avatar.
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_save
+
+from recipes.models import Recipe
+
+from .storage import acquire, release
+
+FILE_FIELDS = (
+    (Recipe, 'image'),
+    (get_user_model(), 'avatar'),
+)
+
+
+def _tracked(sender, update_fields, field_name):
+    return update_fields is None or field_name in update_fields
+
+
+def _connect(model, field_name):
+    attr = f'_stored_{field_name}'
+
+    def remember_old_name(sender, instance, update_fields=None, **kwargs):
+        if not _tracked(sender, update_fields, field_name):
+            return
+        old_name = None
+        if instance.pk is not None:
+            old_name = sender.objects.filter(pk=instance.pk).values_list(
+                field_name, flat=True
+            ).first()
+        setattr(instance, attr, old_name or '')
+
+    def update_refcounts(sender, instance, update_fields=None, **kwargs):
+        if not _tracked(sender, update_fields, field_name):
+            return
+        old_name = getattr(instance, attr, '')
+        field_file = getattr(instance, field_name)
+        new_name = field_file.name or ''
+        if new_name != old_name:
+            acquire(new_name, field_file.storage)
+            release(old_name)
+        setattr(instance, attr, new_name)
+
+    def release_on_delete(sender, instance, **kwargs):
+        release(getattr(instance, field_name).name)
+
+    uid = f'{model._meta.label}.{field_name}'
+    pre_save.connect(
+        remember_old_name, sender=model, weak=False, dispatch_uid=uid
+    )
+    post_save.connect(
+        update_refcounts, sender=model, weak=False, dispatch_uid=uid
+    )
+    post_delete.connect(
+        release_on_delete, sender=model, weak=False, dispatch_uid=uid
+    )
+
+
+for model, field_name in FILE_FIELDS:
+    _connect(model, field_name)
@@ -0,0 +1,204 @@
+"""
+Шаги запуска контейнера с пропуском неизмененных.
+
+Для каждого шага считается отпечаток его входных данных (файлы миграций,
+исходники статики, файл ингредиентов). Если отпечаток совпадает с
+сохраненным после прошлого успешного запуска, шаг пропускается.
+Отпечатки миграций и данных хранятся в БД (StartupStep), отпечаток
+статики - в STATIC_ROOT, так как том со статикой может быть пересоздан
+независимо от базы. Шаги выполняются под advisory-блокировкой
+PostgreSQL: параллельно стартующие реплики не выполняют миграции
+одновременно, вторая дождется первой и пропустит выполненные шаги.
+"""
+import hashlib
+import os
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.staticfiles.finders import get_finders
+from django.core.management import call_command
+from django.db import DatabaseError, connection
+
+from .models import StartupStep
+
+LOCK_NAME = 'foodgram-startup'
+STATIC_FINGERPRINT_FILE = '.startup-fingerprint'
+
+
+def _lock_key(name):
+    digest = hashlib.blake2b(name.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+@contextmanager
+def advisory_lock(name=LOCK_NAME):
+    """Сессионная advisory-блокировка PostgreSQL (на других СУБД - нет)."""
+    if connection.vendor != 'postgresql':
+        yield
+        return
+    key = _lock_key(name)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_lock(%s)', [key])
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [key])
+
+
+def _update_with_file(digest, name, path, content):
+    digest.update(name.encode())
+    if content:
+        with open(path, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    else:
+        stat = os.stat(path)
+        digest.update(f'{stat.st_size}:{stat.st_mtime_ns}'.encode())
+
+
+def migrations_fingerprint():
+    """Имена и содержимое файлов миграций всех приложений."""
+    digest = hashlib.sha256()
+    for app_config in sorted(apps.get_app_configs(), key=lambda a: a.label):
+        directory = os.path.join(app_config.path, 'migrations')
+        if not os.path.isdir(directory):
+            continue
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.py'):
+                _update_with_file(
+                    digest, f'{app_config.label}/{name}',
+                    os.path.join(directory, name), content=True
+                )
+    return digest.hexdigest()
+
+
+def static_fingerprint():
+    """
+    Пути, размеры и mtime исходников статики (без чтения содержимого:
+    файлов много, а в образе они меняются только при пересборке).
+    """
+    digest = hashlib.sha256()
+    files = {}
+    for finder in get_finders():
+        for path, storage in finder.list([]):
+            files.setdefault(path, storage.path(path))
+    for path in sorted(files):
+        _update_with_file(digest, path, files[path], content=False)
+    return digest.hexdigest()
+
+
+def ingredients_fingerprint():
+    from recipes.management.commands.load_ingredients import Command
+
+    digest = hashlib.sha256()
+    if os.path.exists(Command.FILE_PATH):
+        _update_with_file(
+            digest, 'ingredients.json', Command.FILE_PATH, content=True
+        )
+    return digest.hexdigest()
+
+
+class DatabaseStore:
+    """Хранит отпечаток шага в таблице StartupStep."""
+
+    def load(self, name):
+        try:
+            return StartupStep.objects.filter(pk=name).values_list(
+                'fingerprint', flat=True
+            ).first()
+        except DatabaseError:
+            # До первой миграции таблицы еще нет.
+            return None
+
+    def save(self, name, fingerprint):
+        StartupStep.objects.update_or_create(
+            name=name, defaults={'fingerprint': fingerprint}
+        )
+
+
+class StaticRootStore:
+    """Хранит отпечаток в файле внутри STATIC_ROOT."""
+
+    def path(self):
+        return os.path.join(settings.STATIC_ROOT, STATIC_FINGERPRINT_FILE)
+
+    def load(self, name):
+        try:
+            with open(self.path(), encoding='utf-8') as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+
+    def save(self, name, fingerprint):
+        os.makedirs(settings.STATIC_ROOT, exist_ok=True)
+        with open(self.path(), 'w', encoding='utf-8') as f:
+            f.write(fingerprint)
+
+
+@dataclass
+class Step:
+    name: str
+    fingerprint: Callable[[], str]
+    run: Callable[[], None]
+    store: object
+
+
+@dataclass
+class StepResult:
+    name: str
+    status: str
+    seconds: float
+
+
+def default_steps():
+    return (
+        Step(
+            'migrate', migrations_fingerprint,
+            lambda: call_command('migrate', interactive=False),
+            DatabaseStore(),
+        ),
+        Step(
+            'collectstatic', static_fingerprint,
+            lambda: call_command(
+                'collectstatic', interactive=False, clear=True, verbosity=0
+            ),
+            StaticRootStore(),
+        ),
+        Step(
+            'load_ingredients', ingredients_fingerprint,
+            lambda: call_command('load_ingredients'),
+            DatabaseStore(),
+        ),
+    )
+
+
+def run_steps(steps=None, force=False, skip=(), on_step=None):
+    """
+    Выполняет шаги под блокировкой, пропуская неизмененные.
+    Возвращает список StepResult.
+    """
+    results = []
+    with advisory_lock():
+        for step in steps or default_steps():
+            started = time.monotonic()
+            if step.name in skip:
+                status = 'skipped (disabled)'
+            else:
+                fingerprint = step.fingerprint()
+                if not force and step.store.load(step.name) == fingerprint:
+                    status = 'skipped (unchanged)'
+                else:
+                    step.run()
+                    step.store.save(step.name, fingerprint)
+                    status = 'done'
+            result = StepResult(
+                step.name, status, time.monotonic() - started
+            )
+            results.append(result)
+            if on_step is not None:
+                on_step(result)
+    return results
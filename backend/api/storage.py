@@ -0,0 +1,119 @@
+"""
+Контентно-адресуемое хранилище медиафайлов.
+
+Файл сохраняется под sha256 своего содержимого:
+<каталог upload_to>/<первые 2 символа хеша>/<остаток хеша><расширение>.
+Повторная загрузка той же картинки не пишет новый файл и дает тот же
+адрес, а содержимое по адресу никогда не меняется - поэтому nginx
+отдает /media/ с immutable-кешированием. Ссылки на файлы считаются в
+StoredFile (см. acquire/release и api.signals).
+"""
+import hashlib
+import os
+import uuid
+
+from django.core.files.storage import FileSystemStorage
+from django.db.models import F
+
+from .models import StoredFile
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+
+def content_hash(content):
+    """sha256 содержимого файла; позиция чтения возвращается в начало."""
+    digest = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    content.seek(0)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage, который выбирает имя файла по его содержимому.
+    Запись атомарна (временный файл + os.replace), поэтому параллельные
+    загрузки одинакового файла не мешают друг другу.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Имя определяется содержимым в _save, суффиксы не нужны.
+        return name
+
+    def hashed_name(self, name, content):
+        directory, base = os.path.split(name)
+        extension = os.path.splitext(base)[1].lower()
+        digest = content_hash(content)
+        return os.path.join(directory, digest[:2], digest[2:] + extension)
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        full_path = self.path(name)
+        if os.path.exists(full_path):
+            # Обновляем mtime: файл снова используется, и gc_media не должен
+            # удалить его в течение периода ожидания.
+            os.utime(full_path)
+            return name
+
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        if self.directory_permissions_mode is not None:
+            os.chmod(directory, self.directory_permissions_mode)
+        tmp_path = f'{full_path}.{uuid.uuid4().hex}.tmp'
+        try:
+            with open(tmp_path, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            os.replace(tmp_path, full_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return name
+
+    def delete(self, name):
+        # Один файл может быть общим у нескольких объектов, поэтому
+        # FieldFile.delete() файл не удаляет: это делает gc_media
+        # для файлов, на которые больше нет ссылок.
+        pass
+
+    def purge(self, name):
+        """Физически удаляет файл (используется сборщиком мусора)."""
+        super().delete(name)
+
+
+def acquire(name, storage):
+    """Учитывает новую ссылку на файл name."""
+    if not name:
+        return
+    updated = StoredFile.objects.filter(name=name).update(
+        refcount=F('refcount') + 1
+    )
+    if not updated:
+        try:
+            size = storage.size(name)
+        except OSError:
+            size = 0
+        stored, created = StoredFile.objects.get_or_create(
+            name=name, defaults={'size': size, 'refcount': 1}
+        )
+        if not created:
+            StoredFile.objects.filter(pk=stored.pk).update(
+                refcount=F('refcount') + 1
+            )
+
+
+def release(name):
+    """
+    Снимает ссылку на файл name. Сам файл удаляет gc_media после
+    периода ожидания: за это время та же картинка может быть загружена
+    снова и получит ссылку на существующий файл.
+    """
+    if not name:
+        return
+    StoredFile.objects.filter(name=name, refcount__gt=0).update(
+        refcount=F('refcount') - 1
+    )
@@ -0,0 +1,31 @@
+"""
+Базовые классы тестов, общие для приложений проекта.
+"""
+import tempfile
+
+from django.conf import settings
+from django.core.cache import caches
+from django.test import TestCase
+
+
+class ThrottleResetTestCase(TestCase):
+    """
+    Все запросы тестов приходят с одного IP: бакеты троттлинга
+    сбрасываются перед каждым тестом, чтобы тесты не зависели от порядка.
+    """
+
+    def setUp(self):
+        caches[settings.THROTTLE_CACHE].clear()
+
+
+class TemporaryMediaTestCase(ThrottleResetTestCase):
+    """MEDIA_ROOT во временном каталоге (self.media) на время теста."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.media = directory.name
+        override = self.settings(MEDIA_ROOT=self.media)
+        override.enable()
+        self.addCleanup(override.disable)
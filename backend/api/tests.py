@@ -0,0 +1,652 @@
+import datetime
+import io
+import os
+import runpy
+import tempfile
+import threading
+import time
+from decimal import Decimal
+from unittest import mock, skipUnless
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+from rest_framework.throttling import BaseThrottle
+
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart
+)
+from recipes.permissions import IsAuthorOrAdminOrReadOnly
+from recipes.views import RecipeViewSet
+from users.models import Subscription, User
+from users.views import CustomUserViewSet
+from . import loadtest, startup
+from .management.commands.loadtest import DEFAULT_COLLECTION
+from .models import StartupStep, StoredFile
+from .query_plans import find_sequential_scans
+from .renderers import FastJSONRenderer
+from .testing import TemporaryMediaTestCase, ThrottleResetTestCase
+from .throttling import ConcurrencyLimitMiddleware, TokenBucketThrottle
+
+
+class DenyThrottle(BaseThrottle):
+    def allow_request(self, request, view):
+        return False
+
+    def wait(self):
+        return 5
+
+
+class BatchTest(ThrottleResetTestCase):
+    """
+    ?ids= и /api/batch/ отдают то же, что отдельные запросы.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.org'
+        )
+        ingredient = Ingredient.objects.create(
+            name='ингредиент', measurement_unit='г'
+        )
+        for i in range(4):
+            recipe = Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {i}',
+                image=f'recipes/images/{i}.png', text='Описание',
+                cooking_time=i + 1,
+            )
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=i + 1
+            )
+        Favorite.objects.create(user=cls.user, recipe=recipe)
+
+    def setUp(self):
+        super().setUp()
+        caches['fragments'].clear()
+
+    def test_multi_get(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        ids = list(Recipe.objects.values_list('id', flat=True)[:3])
+        ids.reverse()
+        response = client.get(
+            '/api/recipes/?ids=' + ','.join(map(str, ids + [0, ids[0]]))
+        )
+        self.assertEqual(
+            response.json(),
+            [client.get(f'/api/recipes/{pk}/').json() for pk in ids],
+        )
+        self.assertEqual(client.get('/api/recipes/?ids=x').status_code, 400)
+
+    def test_batch(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        recipe = Recipe.objects.first()
+        paths = [
+            f'/api/recipes/{recipe.pk}/',
+            f'/api/users/{recipe.author_id}/',
+            f'/api/recipes/{recipe.pk}/get-link/',
+            '/api/ingredients/?name=ингредиент',
+            '/api/recipes/0/',
+        ]
+        response = client.post(
+            '/api/batch/', {'requests': [{'path': path} for path in paths]},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        for path, result in zip(paths, response.json()['responses']):
+            direct = client.get(path)
+            self.assertEqual(result['status'], direct.status_code, path)
+            self.assertEqual(result['body'], direct.json(), path)
+
+    def _batch(self, client, paths):
+        response = client.post(
+            '/api/batch/', {'requests': [{'path': path} for path in paths]},
+            format='json',
+        )
+        return [
+            (result['status'], result['body'])
+            for result in response.json()['responses']
+        ]
+
+    def _direct(self, client, paths):
+        return [
+            (response.status_code, response.json())
+            for response in map(client.get, paths)
+        ]
+
+    def test_grouped_reads_are_throttled(self):
+        client = APIClient()
+        paths = [f'/api/recipes/{pk}/' for pk in Recipe.objects.values_list(
+            'pk', flat=True
+        )[:2]]
+        with mock.patch.object(
+            RecipeViewSet, 'throttle_classes', (DenyThrottle,)
+        ):
+            self.assertEqual(
+                self._batch(client, paths), self._direct(client, paths)
+            )
+        self.assertEqual(self._batch(client, paths)[0][0], 200)
+
+    def test_grouped_reads_check_permissions(self):
+        client = APIClient()
+        paths = [f'/api/users/{self.user.pk}/']
+        with mock.patch.object(
+            CustomUserViewSet, 'get_permissions',
+            lambda view: [IsAuthenticated()],
+        ):
+            batched = self._batch(client, paths)
+            self.assertEqual(batched[0][0], 401)
+            self.assertEqual(batched, self._direct(client, paths))
+
+    def test_object_permissions_not_grouped(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        recipe = Recipe.objects.first()
+        paths = [f'/api/recipes/{recipe.pk}/']
+        with mock.patch.object(
+            RecipeViewSet, 'get_permissions',
+            lambda view: [IsAuthorOrAdminOrReadOnly()],
+        ), mock.patch.object(
+            RecipeViewSet, 'read_many', side_effect=AssertionError
+        ):
+            self.assertEqual(
+                self._batch(client, paths), self._direct(client, paths)
+            )
+
+
+@skipUnless(DEFAULT_COLLECTION.exists(), 'нет postman-коллекции')
+class LoadTestScenariosTest(ThrottleResetTestCase):
+    def test_scenarios_match_collection(self):
+        requests, variables = loadtest.load_collection(DEFAULT_COLLECTION)
+        self.assertEqual(
+            loadtest.check_scenarios(requests, loadtest.SCENARIOS), []
+        )
+        request = requests[
+            'recipes/create_recipes/create_first_recipe // Second User'
+        ]
+        self.assertIn(
+            ('Authorization', 'Token {{secondUserToken}}'), request.headers
+        )
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(loadtest.percentile(values, 50), 50)
+        self.assertEqual(loadtest.percentile(values, 99), 99)
+        self.assertEqual(loadtest.percentile([7], 95), 7)
+        self.assertIsNone(loadtest.percentile([], 50))
+
+
+class FakeConnection:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.sent = []
+
+    def request(self, method, url, body=None, headers=None):
+        self.sent.append(url)
+
+    def getresponse(self):
+        return mock.Mock(**self.responses.pop(0))
+
+    def close(self):
+        pass
+
+
+class LoadTestRunnerTest(ThrottleResetTestCase):
+    def test_cleanup_keeps_real_users(self):
+        for username, email in (
+            ('loadtest-0', 'loadtest-0@example.org'),
+            ('loadtest-fan', 'fan@example.org'),
+            ('loadtest-1', 'loadtest-1@mail.example'),
+        ):
+            User.objects.create(username=username, email=email)
+        self.assertEqual(loadtest.cleanup(), 1)
+        self.assertEqual(
+            sorted(User.objects.values_list('username', flat=True)),
+            ['loadtest-1', 'loadtest-fan'],
+        )
+
+    def _run(self, *responses):
+        request = loadtest.CollectionRequest('POST', '/api/login/', '', ())
+        runner = loadtest.Runner(
+            'http://localhost', {'login': request, 'me': request}, {},
+            None, [],
+        )
+        scenario = loadtest.Scenario('login', 1, (
+            loadtest.Step('login', save=(('userToken', 'auth_token'),)),
+            loadtest.Step('me'),
+        ))
+        connection = FakeConnection(
+            {'status': 200, 'read.return_value': content}
+            for content in responses
+        )
+        context = {}
+        runner._run_scenario(connection, scenario, context)
+        return runner.stats.statuses['POST /api/login/'], context
+
+    def test_saved_values(self):
+        statuses, context = self._run(b'{"auth_token": "abc"}', b'{}')
+        self.assertEqual(statuses, {200: 2})
+        self.assertEqual(context, {'userToken': 'abc'})
+
+    def test_unexpected_body_is_an_error(self):
+        for content in (b'<html>', b'[]', b'{"detail": "x"}'):
+            statuses, context = self._run(content)
+            self.assertEqual(statuses, {None: 1}, content)
+            self.assertEqual(context, {})
+
+
+class StoredFileTest(TemporaryMediaTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='keeper', email='keeper@example.org'
+        )
+
+    def _save(self, content):
+        return default_storage.save(
+            'recipes/images/upload.png', ContentFile(content)
+        )
+
+    def _recipe(self, image):
+        return Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            image=image, cooking_time=5,
+        )
+
+    def _refcount(self, name):
+        return StoredFile.objects.get(name=name).refcount
+
+    def test_same_content_same_name(self):
+        first = self._save(b'same')
+        self.assertEqual(first, self._save(b'same'))
+        self.assertNotEqual(first, self._save(b'other'))
+        self.assertTrue(first.startswith('recipes/images/'))
+
+    def test_acquire_and_release(self):
+        name = self._save(b'image')
+        first = self._recipe(name)
+        second = self._recipe(name)
+        self.assertEqual(self._refcount(name), 2)
+
+        other = self._save(b'other')
+        first.image = other
+        first.save()
+        self.assertEqual(self._refcount(name), 1)
+        self.assertEqual(self._refcount(other), 1)
+
+        second.delete()
+        self.assertEqual(self._refcount(name), 0)
+        first.save(update_fields=['name'])
+        self.assertEqual(self._refcount(other), 1)
+
+    def test_delete_keeps_shared_file(self):
+        name = self._save(b'image')
+        self._recipe(name)
+        default_storage.delete(name)
+        self.assertTrue(default_storage.exists(name))
+        default_storage.purge(name)
+        self.assertFalse(default_storage.exists(name))
+
+
+class GarbageCollectMediaTest(TemporaryMediaTestCase):
+    REFERENCED = ('recipes/images/a-b.png', 'recipes/images/a.png')
+    OLD_ORPHAN = 'recipes/images/a/b.png'
+    NEW_ORPHAN = 'users/avatars/new.png'
+    AVATAR = 'users/avatars/avatar.png'
+
+    def setUp(self):
+        super().setUp()
+        old = time.time() - 2 * 3600
+        for name in self.REFERENCED + (
+            self.OLD_ORPHAN, self.NEW_ORPHAN, self.AVATAR
+        ):
+            path = os.path.join(self.media, name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(b'12345')
+            if name != self.NEW_ORPHAN:
+                os.utime(path, (old, old))
+        author = User.objects.create(
+            username='gc', email='gc@example.org', avatar=self.AVATAR
+        )
+        for name in self.REFERENCED:
+            Recipe.objects.create(
+                author=author, name=name, text='Описание', image=name,
+                cooking_time=5,
+            )
+        StoredFile.objects.create(name=self.OLD_ORPHAN, size=5)
+
+    def _gc(self, *args):
+        out = io.StringIO()
+        call_command(
+            'gc_media', '--grace-hours', '1', '--workers', '2', *args,
+            stdout=out,
+        )
+        return out.getvalue()
+
+    def _exists(self, name):
+        return os.path.exists(os.path.join(self.media, name))
+
+    def test_dry_run(self):
+        output = self._gc('--dry-run')
+        self.assertIn('Scanned 5 files: 3 referenced, 2 orphaned, '
+                      '1 within grace period.', output)
+        self.assertIn(self.OLD_ORPHAN, output)
+        self.assertIn('Would delete 1 files, reclaimed 5 bytes.', output)
+        self.assertTrue(self._exists(self.OLD_ORPHAN))
+
+    def test_deletes_only_old_orphans(self):
+        output = self._gc()
+        self.assertIn('Deleted 1 files, reclaimed 5 bytes.', output)
+        self.assertFalse(self._exists(self.OLD_ORPHAN))
+        self.assertFalse(
+            StoredFile.objects.filter(name=self.OLD_ORPHAN).exists()
+        )
+        for name in self.REFERENCED + (self.NEW_ORPHAN, self.AVATAR):
+            self.assertTrue(self._exists(name), name)
+
+
+class BucketThrottle(TokenBucketThrottle):
+    scope = 'test'
+    now = 0.0
+
+    def timer(self):
+        return self.now
+
+    def get_cache_key(self, request, view):
+        return 'throttle:test:1'
+
+
+@override_settings(THROTTLE_BUCKETS={'test': {'capacity': 3, 'refill': 1}})
+class TokenBucketThrottleTest(ThrottleResetTestCase):
+    def _allow(self, now, action='list'):
+        throttle = BucketThrottle()
+        throttle.now = now
+        allowed = throttle.allow_request(None, mock.Mock(action=action))
+        return allowed, throttle.wait()
+
+    def test_bucket_arithmetic(self):
+        self.assertEqual(
+            [self._allow(0) for i in range(3)], [(True, None)] * 3
+        )
+        self.assertEqual(self._allow(0), (False, 1.0))
+        # За 1.5 с вернулось полтора токена: один запрос проходит.
+        self.assertEqual(self._allow(1.5), (True, None))
+        self.assertEqual(self._allow(1.5), (False, 0.5))
+        self.assertEqual(self._allow(10), (True, None))
+
+    def test_cost_above_capacity_is_rejected(self):
+        # create стоит 10 токенов при емкости 3.
+        self.assertEqual(self._allow(0, 'create'), (False, 7.0))
+        self.assertEqual(self._allow(0), (True, None))
+
+    def test_concurrent_requests(self):
+        barrier = threading.Barrier(20)
+        results = []
+
+        def request():
+            barrier.wait()
+            results.append(self._allow(0)[0])
+
+        threads = [threading.Thread(target=request) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results.count(True), 3)
+
+
+class ConcurrencyLimitTest(ThrottleResetTestCase):
+    """
+    Два воркера по threads потоков (как в gunicorn.conf.py), слоты общие:
+    при лимите в один воркер лишние запросы получают 503.
+    """
+    THREADS = runpy.run_path(
+        os.path.join(settings.BASE_DIR, 'gunicorn.conf.py')
+    )['threads']
+
+    def setUp(self):
+        super().setUp()
+        override = self.settings(CONCURRENCY_LIMITS={
+            **settings.CONCURRENCY_LIMITS,
+            'max_requests': self.THREADS,
+            'max_writes': self.THREADS // 2,
+            'queue_timeout': 0.05,
+        })
+        override.enable()
+        self.addCleanup(override.disable)
+        self.release = threading.Event()
+        self.admitted = []
+
+        def get_response(request):
+            self.admitted.append(request.method)
+            self.release.wait(5)
+            return HttpResponse()
+
+        self.middleware = ConcurrencyLimitMiddleware(get_response)
+
+    def _burst(self, *methods):
+        """Параллельные запросы; ответы отказов - до снятия блокировки."""
+        responses = []
+
+        def request(method):
+            request = getattr(RequestFactory(), method)('/api/recipes/')
+            responses.append(self.middleware(request))
+
+        threads = [
+            threading.Thread(target=request, args=(method,))
+            for method in methods
+        ]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while (len(self.admitted) + len(responses) < len(methods)
+               and time.monotonic() < deadline):
+            time.sleep(0.01)
+        rejected = [response.status_code for response in responses]
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        return rejected, [response.status_code for response in responses]
+
+    def test_rejects_requests_over_the_limit(self):
+        rejected, statuses = self._burst(*['get'] * (2 * self.THREADS))
+        self.assertEqual(rejected, [503] * self.THREADS)
+        self.assertEqual(len(self.admitted), self.THREADS)
+        self.assertEqual(statuses.count(200), self.THREADS)
+        # Слоты освобождены: следующий запрос проходит.
+        response = self.middleware(RequestFactory().get('/api/recipes/'))
+        self.assertEqual(response.status_code, 200)
+
+    def test_writes_leave_slots_for_reads(self):
+        rejected, statuses = self._burst(
+            *['post'] * self.THREADS, *['get'] * (self.THREADS // 2)
+        )
+        self.assertEqual(rejected, [503] * (self.THREADS // 2))
+        self.assertEqual(
+            sorted(self.admitted),
+            ['GET'] * (self.THREADS // 2) + ['POST'] * (self.THREADS // 2),
+        )
+        self.assertEqual(statuses.count(200), self.THREADS)
+
+    def test_retry_after(self):
+        self.middleware.max_requests = 0
+        response = self.middleware(RequestFactory().get('/api/recipes/'))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_expired_slots_are_reclaimed(self):
+        self.middleware.slot_ttl = -1
+        for slot in ('first', 'second'):
+            self.assertTrue(
+                self.middleware.try_acquire('concurrency:all', 1, slot)
+            )
+
+
+class StartupStepsTest(ThrottleResetTestCase):
+    def setUp(self):
+        super().setUp()
+        self.inputs = {'db': 'v1', 'static': 'v1'}
+        self.runs = []
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        override = self.settings(STATIC_ROOT=directory.name)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def _steps(self):
+        return [
+            startup.Step(
+                name, lambda name=name: self.inputs[name],
+                lambda name=name: self.runs.append(name), store,
+            )
+            for name, store in (
+                ('db', startup.DatabaseStore()),
+                ('static', startup.StaticRootStore()),
+            )
+        ]
+
+    def _statuses(self, **kwargs):
+        return [
+            result.status
+            for result in startup.run_steps(self._steps(), **kwargs)
+        ]
+
+    def test_unchanged_steps_are_skipped(self):
+        self.assertEqual(self._statuses(), ['done', 'done'])
+        self.assertEqual(self._statuses(), ['skipped (unchanged)'] * 2)
+        self.inputs['static'] = 'v2'
+        self.assertEqual(self._statuses(), ['skipped (unchanged)', 'done'])
+        self.assertEqual(self.runs, ['db', 'static', 'static'])
+        self.assertEqual(StartupStep.objects.get(pk='db').fingerprint, 'v1')
+
+    def test_force_and_skip(self):
+        self._statuses()
+        self.assertEqual(
+            self._statuses(force=True, skip=('db',)),
+            ['skipped (disabled)', 'done'],
+        )
+
+    def test_command(self):
+        out = io.StringIO()
+        with mock.patch.object(startup, 'default_steps', self._steps):
+            call_command('startup', stdout=out)
+        self.assertIn('Startup finished', out.getvalue())
+        self.assertEqual(self.runs, ['db', 'static'])
+
+
+class QueryPlanTest(ThrottleResetTestCase):
+    """
+    Запросы горячих эндпоинтов не должны читать большие таблицы
+    последовательным сканированием (см. api.query_plans).
+    """
+    @classmethod
+    def setUpTestData(cls):
+        users = User.objects.bulk_create(
+            User(
+                username=f'user{i}', email=f'user{i}@example.org',
+                first_name='Имя', last_name='Фамилия',
+            )
+            for i in range(40)
+        )
+        cls.user = users[0]
+        ingredients = Ingredient.objects.bulk_create(
+            Ingredient(name=f'ингредиент {i:03}', measurement_unit='г')
+            for i in range(200)
+        )
+        recipes = Recipe.objects.bulk_create(
+            Recipe(
+                author=users[i % len(users)], name=f'Рецепт {i}',
+                image=f'recipes/images/{i}.png', text='Описание',
+                cooking_time=i % 90 + 1,
+            )
+            for i in range(400)
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=ingredients[(i * 7 + j * 13) % len(ingredients)],
+                amount=j + 1,
+            )
+            for i, recipe in enumerate(recipes)
+            for j in range(6)
+        )
+        for model in (Favorite, ShoppingCart):
+            model.objects.bulk_create(
+                model(user=user, recipe=recipes[(i * 11 + j) % len(recipes)])
+                for i, user in enumerate(users)
+                for j in range(0, 50, 5)
+            )
+        Subscription.objects.bulk_create(
+            Subscription(user=user, author=users[(i + j) % len(users)])
+            for i, user in enumerate(users)
+            for j in range(1, 6)
+        )
+        cls.recipe = recipes[1]
+        cls.ingredient = ingredients[0]
+
+    def setUp(self):
+        super().setUp()
+        caches['fragments'].clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertIndexScans(self, method, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url)
+        self.assertLess(response.status_code, 400, url)
+        scans = find_sequential_scans(queries.captured_queries)
+        self.assertEqual(scans, [], f'{method.upper()} {url}')
+
+    def test_recipe_list(self):
+        ingredient = self.ingredient.pk
+        for query in (
+            '', f'?author={self.user.pk}', f'?ingredients={ingredient}',
+            f'?exclude_ingredients={ingredient}', '?cooking_time_min=30',
+            '?is_favorited=1', '?is_in_shopping_cart=1',
+        ):
+            self.assertIndexScans('get', f'/api/recipes/{query}')
+
+    def test_recipe_retrieve(self):
+        self.assertIndexScans('get', f'/api/recipes/{self.recipe.pk}/')
+
+    def test_favorite_and_shopping_cart_toggles(self):
+        for relation in ('favorite', 'shopping_cart'):
+            url = f'/api/recipes/{self.recipe.pk}/{relation}/'
+            self.assertIndexScans('post', url)
+            self.assertIndexScans('delete', url)
+
+    @skipUnless(
+        connection.vendor == 'postgresql',
+        'LIKE по индексу (varchar_pattern_ops) есть только в PostgreSQL',
+    )
+    def test_ingredient_search(self):
+        self.assertIndexScans('get', '/api/ingredients/?name=ингредиент 01')
+
+
+class FastJSONRendererTest(ThrottleResetTestCase):
+    def test_matches_json_renderer(self):
+        data = {
+            'text': 'Юникод     "кавычки"',
+            'lazy': _('Рецепт'),
+            'datetime': datetime.datetime(
+                2025, 5, 4, 14, 54, 1, 123456, tzinfo=datetime.timezone.utc
+            ),
+            'date': datetime.date(2025, 5, 4),
+            'decimal': Decimal('1.50'),
+            'list': [1, None, True, {'nested': 'значение'}],
+        }
+        self.assertEqual(
+            FastJSONRenderer().render(data), JSONRenderer().render(data)
+        )
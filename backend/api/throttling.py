@@ -0,0 +1,245 @@
+"""
+Ограничение нагрузки на дорогие эндпоинты.
+
+Токен-бакеты (в форме GCRA: на ключ хранится одно число - "теоретическое
+время прихода") на пользователя и на IP. Каждое действие списывает из
+бакета свою стоимость (THROTTLE_COSTS), поэтому выгрузка списка покупок
+или создание рецепта с картинкой расходуют лимит быстрее, чем чтение.
+Состояние хранится в кеше THROTTLE_CACHE (Redis в проде, LocMemCache
+в тестах). Чтение и запись состояния должны быть одной операцией, иначе
+параллельные запросы прочитают одно и то же значение и пройдут все:
+в Redis это Lua-скрипт (GCRA_SCRIPT), для кеша в памяти процесса -
+блокировка.
+
+ConcurrencyLimitMiddleware ограничивает число одновременно
+обрабатываемых запросов на всех воркерах и отдельно - изменяющих
+запросов, чтобы всплеск записей не занимал все потоки и не блокировал
+чтение. Слоты хранятся в том же кеше: в процессе воркера gthread
+одновременно идет не больше threads запросов, и счетчик внутри процесса
+до лимита никогда бы не дошел. Слот живет не дольше slot_ttl секунд,
+поэтому слоты убитого воркера освобождаются сами.
+"""
+import math
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.redis import RedisCache
+from django.http import JsonResponse
+from rest_framework.throttling import BaseThrottle
+
+DEFAULT_COST = 1
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# KEYS[1] - ключ бакета; ARGV - now, стоимость и емкость в секундах.
+# Возвращает превышение в секундах строкой (Lua округляет числа до целых).
+GCRA_SCRIPT = '''
+local now = tonumber(ARGV[1])
+local arrival = tonumber(redis.call('GET', KEYS[1])) or now
+if arrival < now then
+    arrival = now
+end
+local new_arrival = arrival + tonumber(ARGV[2])
+local overflow = new_arrival - now - tonumber(ARGV[3])
+if overflow > 0 then
+    return tostring(overflow)
+end
+redis.call('SET', KEYS[1], tostring(new_arrival),
+           'PX', math.ceil((new_arrival - now) * 1000) + 1000)
+return '0'
+'''
+
+# KEYS[1] - занятые слоты (sorted set: id слота -> срок); ARGV - now,
+# лимит, срок нового слота и его id. 1 - слот занят, 0 - мест нет.
+ACQUIRE_SCRIPT = '''
+local now = tonumber(ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[3], ARGV[4])
+redis.call('EXPIRE', KEYS[1], math.ceil(tonumber(ARGV[3]) - now))
+return 1
+'''
+# Пауза между попытками занять слот в пределах queue_timeout.
+POLL_INTERVAL = 0.02
+
+_local_lock = threading.Lock()
+
+
+def _redis_client(cache, key):
+    """Клиент Redis и полный ключ (с префиксом и версией кеша)."""
+    key = cache.make_and_validate_key(key)
+    return cache._cache.get_client(key, write=True), key
+
+
+def action_cost(request, view):
+    """Стоимость запроса по имени действия viewset (или 1)."""
+    action = getattr(view, 'action', None)
+    return settings.THROTTLE_COSTS.get(action, DEFAULT_COST)
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Базовый токен-бакет. Параметры бакета (capacity - емкость,
+    refill - пополнение в токенах в секунду) берутся из
+    settings.THROTTLE_BUCKETS[scope].
+    """
+    scope = None
+    timer = time.time
+
+    def __init__(self):
+        bucket = settings.THROTTLE_BUCKETS[self.scope]
+        self.capacity = bucket['capacity']
+        self.interval = 1 / bucket['refill']
+        self.cache = caches[settings.THROTTLE_CACHE]
+        self.retry_after = None
+
+    def get_cache_key(self, request, view):
+        raise NotImplementedError('.get_cache_key() must be overridden')
+
+    def allow_request(self, request, view):
+        key = self.get_cache_key(request, view)
+        if key is None:
+            return True
+        cost = action_cost(request, view)
+        overflow = self.consume(
+            key, self.timer(), cost * self.interval,
+            self.capacity * self.interval,
+        )
+        if overflow > 0:
+            self.retry_after = overflow
+            return False
+        return True
+
+    def consume(self, key, now, amount, burst):
+        """
+        Атомарно сдвигает "время прихода" бакета на amount секунд.
+        Возвращает превышение емкости в секундах (> 0 - запрос отклонен,
+        бакет не меняется).
+        """
+        if isinstance(self.cache, RedisCache):
+            client, key = _redis_client(self.cache, key)
+            return float(client.eval(
+                GCRA_SCRIPT, 1, key, repr(now), repr(amount), repr(burst)
+            ))
+        # Кеш в памяти процесса: достаточно блокировки внутри процесса.
+        with _local_lock:
+            arrival = max(self.cache.get(key, now), now)
+            new_arrival = arrival + amount
+            overflow = new_arrival - now - burst
+            if overflow <= 0:
+                self.cache.set(
+                    key, new_arrival, math.ceil(new_arrival - now) + 1
+                )
+            return overflow
+
+    def wait(self):
+        return self.retry_after
+
+
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    """Бакет на аутентифицированного пользователя."""
+    scope = 'user'
+
+    def get_cache_key(self, request, view):
+        if not request.user or not request.user.is_authenticated:
+            return None
+        return f'throttle:{self.scope}:{request.user.pk}'
+
+
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    """Бакет на IP-адрес клиента (для всех запросов)."""
+    scope = 'ip'
+
+    def get_cache_key(self, request, view):
+        return f'throttle:{self.scope}:{self.get_ident(request)}'
+
+
+class ConcurrencyLimitMiddleware:
+    """
+    Глобальный ограничитель параллельных запросов (общий для воркеров).
+    Если все слоты заняты дольше queue_timeout, отвечает 503
+    с Retry-After, не занимая поток воркера надолго.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        limits = settings.CONCURRENCY_LIMITS
+        self.max_requests = limits['max_requests']
+        self.max_writes = limits['max_writes']
+        self.timeout = limits['queue_timeout']
+        self.retry_after = limits['retry_after']
+        self.slot_ttl = limits['slot_ttl']
+        self.exempt = tuple(limits['exempt_paths'])
+        self.read_paths = tuple(limits.get('read_paths', ()))
+        self.cache = caches[settings.THROTTLE_CACHE]
+
+    def __call__(self, request):
+        if request.path.startswith(self.exempt):
+            return self.get_response(request)
+        pools = [('all', self.max_requests)]
+        if (request.method not in SAFE_METHODS
+                and not request.path.startswith(self.read_paths)):
+            pools.insert(0, ('writes', self.max_writes))
+        slot = uuid.uuid4().hex
+        acquired = []
+        try:
+            for name, limit in pools:
+                key = f'concurrency:{name}'
+                if not self.acquire(key, limit, slot):
+                    return self.overloaded()
+                acquired.append(key)
+            return self.get_response(request)
+        finally:
+            for key in acquired:
+                self.release(key, slot)
+
+    def acquire(self, key, limit, slot):
+        """Ждет свободный слот не дольше queue_timeout."""
+        deadline = time.monotonic() + self.timeout
+        while not self.try_acquire(key, limit, slot):
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(POLL_INTERVAL)
+        return True
+
+    def try_acquire(self, key, limit, slot):
+        now = time.time()
+        expires = now + self.slot_ttl
+        if isinstance(self.cache, RedisCache):
+            client, key = _redis_client(self.cache, key)
+            return bool(client.eval(
+                ACQUIRE_SCRIPT, 1, key, repr(now), limit, repr(expires), slot
+            ))
+        with _local_lock:
+            slots = {
+                other: until
+                for other, until in self.cache.get(key, {}).items()
+                if until > now
+            }
+            if len(slots) >= limit:
+                return False
+            slots[slot] = expires
+            self.cache.set(key, slots, self.slot_ttl)
+            return True
+
+    def release(self, key, slot):
+        if isinstance(self.cache, RedisCache):
+            client, key = _redis_client(self.cache, key)
+            client.zrem(key, slot)
+            return
+        with _local_lock:
+            slots = self.cache.get(key, {})
+            if slots.pop(slot, None) is not None:
+                self.cache.set(key, slots, self.slot_ttl)
+
+    def overloaded(self):
+        response = JsonResponse(
+            {'detail': 'Сервер перегружен, повторите запрос позже.'},
+            status=503,
+        )
+        response['Retry-After'] = str(self.retry_after)
+        return response
@@ -3,6 +3,7 @@ from rest_framework.routers import DefaultRouter
 
 from users.views import CustomUserViewSet, SubscriptionListView
 from recipes.views import IngredientViewSet, RecipeViewSet
+from .views import BatchView
 
 
 router = DefaultRouter()
@@ -14,6 +15,7 @@ router.register('recipes', RecipeViewSet, basename='recipes')
 
 
 urlpatterns = [
+    path('batch/', BatchView.as_view(), name='batch'),
     path('users/subscriptions/', SubscriptionListView.as_view(), name='user-subscriptions-list'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -0,0 +1,28 @@
+from rest_framework.permissions import AllowAny
+from rest_framework.renderers import BrowsableAPIRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import batch
+from .renderers import FastJSONRenderer
+from .serializers import BatchSerializer
+
+
+class BatchView(APIView):
+    """
+    Несколько GET-запросов к API за один запрос:
+    {"requests": [{"path": "/api/recipes/1/"}, ...]} ->
+    {"responses": [{"path": ..., "status": 200, "body": {...}}, ...]}.
+    Тело подзапроса отдается, если view вернул данные DRF.
+    Права проверяются у каждого подзапроса.
+    """
+    permission_classes = (AllowAny,)
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        paths = [
+            item['path'] for item in serializer.validated_data['requests']
+        ]
+        return Response({'responses': batch.run(request, paths)})
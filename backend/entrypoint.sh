@@ -14,17 +14,9 @@ done
 echo "PostgreSQL started"
 
 
-echo "Applying database migrations..."
+echo "Running startup steps (migrate, collectstatic, load_ingredients)..."
 
-python manage.py migrate --noinput
-
-echo "Collecting static files..."
-
-python manage.py collectstatic --noinput --clear
-
-echo "Loading ingredients..."
-
-python manage.py load_ingredients
+python manage.py startup
 
 echo "Starting Gunicorn server..."
 exec "$@"
\ No newline at end of file
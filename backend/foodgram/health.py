@@ -0,0 +1,25 @@
+"""
+Проверки для оркестратора: /healthz - процесс жив,
+/readyz - процесс прогрет и база данных доступна.
+"""
+from django.db import connection
+from django.http import JsonResponse
+
+from . import warmup
+
+
+def healthz(request):
+    return JsonResponse({'status': 'ok'})
+
+
+def readyz(request):
+    if not warmup.is_ready():
+        return JsonResponse({'status': 'warming up'}, status=503)
+    try:
+        connection.ensure_connection()
+    except Exception:
+        return JsonResponse({'status': 'database unavailable'}, status=503)
+    return JsonResponse({
+        'status': 'ready',
+        'warmup_seconds': round(warmup.warmup_seconds(), 3),
+    })
@@ -0,0 +1,230 @@
+"""
+Диагностика памяти воркеров.
+
+- MemoryMiddleware замеряет текущий RSS процесса до и после запроса
+  и пишет в лог запросы, после которых RSS вырос больше чем на
+  MEMORY_DIAGNOSTICS['rss_delta_mb']. Пиковый RSS (ru_maxrss) для этого
+  не подходит: он только растет, и после первого большого запроса
+  остальные уже не видны. Память, освобожденная до конца запроса,
+  в прирост не попадает - ищем то, что остается в процессе. В
+  gthread-воркере запросы идут параллельно, поэтому прирост может
+  принадлежать соседнему запросу; повторяющийся в логе адрес - повод
+  снять снимки tracemalloc.
+- Снимки tracemalloc: /debug/memory (только staff; nginx этот адрес
+  наружу не проксирует) или сигнал SIGUSR2
+  конкретному воркеру. Первый снимок включает трассировку, если она не
+  была включена при старте (tracemalloc_frames), каждый следующий
+  возвращает топ аллокаций и разницу с предыдущим снимком. Снимки
+  хранятся в процессе, поэтому ответ содержит pid воркера.
+- should_recycle() сравнивает текущий RSS с лимитом; хук post_request в
+  gunicorn.conf.py по нему мягко завершает воркер.
+"""
+import logging
+import os
+import resource
+import signal
+import threading
+import time
+import tracemalloc
+
+from django.conf import settings
+from rest_framework import status
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+GROUP_BY = ('lineno', 'filename', 'traceback')
+# Аллокации самого tracemalloc и загрузчика модулей - шум в отчете.
+IGNORED = (
+    tracemalloc.Filter(False, tracemalloc.__file__),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+    tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+    tracemalloc.Filter(False, '<unknown>'),
+)
+
+_lock = threading.Lock()
+_snapshots = []
+
+
+def _mb(value):
+    return round(value / (1024 * 1024), 1)
+
+
+def rss_bytes():
+    """Текущий RSS процесса (/proc, иначе пиковый из getrusage)."""
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return peak_rss_bytes()
+    return pages * os.sysconf('SC_PAGE_SIZE')
+
+
+def peak_rss_bytes():
+    # ru_maxrss в Linux - в килобайтах, в macOS - в байтах.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if os.uname().sysname == 'Darwin' else peak * 1024
+
+
+def memory_status():
+    data = {
+        'pid': os.getpid(),
+        'rss_mb': _mb(rss_bytes()),
+        'peak_rss_mb': _mb(peak_rss_bytes()),
+        'tracing': tracemalloc.is_tracing(),
+        'snapshots': len(_snapshots),
+    }
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        data['traced_mb'] = _mb(current)
+        data['traced_peak_mb'] = _mb(peak)
+    return data
+
+
+def start_tracing():
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(
+            settings.MEMORY_DIAGNOSTICS['tracemalloc_frames'] or 1
+        )
+
+
+def stop_tracing():
+    tracemalloc.stop()
+    with _lock:
+        _snapshots.clear()
+
+
+def _location(stat):
+    frame = stat.traceback[0]
+    return f'{frame.filename}:{frame.lineno}'
+
+
+def take_snapshot(group_by='lineno', limit=None):
+    """
+    Снимок аллокаций: топ по размеру и разница с предыдущим снимком
+    (diff - None для первого снимка).
+    """
+    limit = limit or settings.MEMORY_DIAGNOSTICS['top']
+    start_tracing()
+    snapshot = tracemalloc.take_snapshot().filter_traces(IGNORED)
+    with _lock:
+        previous = _snapshots[-1] if _snapshots else None
+        _snapshots[:] = [snapshot]
+    top = [
+        {
+            'location': _location(stat),
+            'size_kb': round(stat.size / 1024, 1),
+            'count': stat.count,
+        }
+        for stat in snapshot.statistics(group_by)[:limit]
+    ]
+    diff = None
+    if previous is not None:
+        diff = [
+            {
+                'location': _location(stat),
+                'size_diff_kb': round(stat.size_diff / 1024, 1),
+                'count_diff': stat.count_diff,
+                'size_kb': round(stat.size / 1024, 1),
+            }
+            for stat in snapshot.compare_to(previous, group_by)[:limit]
+        ]
+    return {'top': top, 'diff': diff}
+
+
+def _log_snapshot(signum, frame):
+    report = take_snapshot()
+    lines = report['diff'] or report['top']
+    logger.warning(
+        'tracemalloc snapshot (pid %s, %s):\n%s', os.getpid(),
+        'diff' if report['diff'] else 'top',
+        '\n'.join(
+            f'{row["location"]}: '
+            + ', '.join(f'{key}={value}' for key, value in row.items()
+                        if key != 'location')
+            for row in lines
+        ),
+    )
+
+
+def install_signal_handler():
+    """SIGUSR2 - снимок в лог; вызывается в воркере (post_worker_init)."""
+    signal.signal(signal.SIGUSR2, _log_snapshot)
+
+
+def should_recycle():
+    """Превышен ли лимит RSS воркера (max_rss_mb, 0 - без лимита)."""
+    limit = settings.MEMORY_DIAGNOSTICS['max_rss_mb']
+    return bool(limit) and rss_bytes() > limit * 1024 * 1024
+
+
+class MemoryMiddleware:
+    """Пишет в лог запросы, после которых заметно вырос RSS процесса."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = (
+            settings.MEMORY_DIAGNOSTICS['rss_delta_mb'] * 1024 * 1024
+        )
+        if settings.MEMORY_DIAGNOSTICS['tracemalloc_frames']:
+            start_tracing()
+
+    def __call__(self, request):
+        if not self.threshold:
+            return self.get_response(request)
+        rss = rss_bytes()
+        started = time.perf_counter()
+        response = self.get_response(request)
+        delta = rss_bytes() - rss
+        if delta >= self.threshold:
+            logger.warning(
+                'RSS +%s MB (%s MB) in %.0f ms: %s %s -> %s',
+                _mb(delta), _mb(rss + delta),
+                (time.perf_counter() - started) * 1000,
+                request.method, request.get_full_path(),
+                response.status_code,
+            )
+        return response
+
+
+class MemoryView(APIView):
+    """
+    GET - состояние памяти воркера; POST action=snapshot|start|stop.
+    snapshot принимает group_by (lineno, filename, traceback) и limit.
+    """
+    permission_classes = (IsAdminUser,)
+    throttle_classes = ()
+
+    def get(self, request):
+        return Response(memory_status())
+
+    def post(self, request):
+        action = request.data.get('action', 'snapshot')
+        if action == 'start':
+            start_tracing()
+        elif action == 'stop':
+            stop_tracing()
+        elif action == 'snapshot':
+            group_by = request.data.get('group_by', 'lineno')
+            if group_by not in GROUP_BY:
+                return Response(
+                    {'group_by': [f'Допустимые значения: {GROUP_BY}']},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            try:
+                limit = int(request.data.get('limit') or 0) or None
+            except (TypeError, ValueError):
+                return Response(
+                    {'limit': ['Ожидается целое число.']},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+            report = take_snapshot(group_by, limit)
+            return Response({**memory_status(), **report})
+        else:
+            return Response(
+                {'action': ['Допустимые значения: snapshot, start, stop.']},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        return Response(memory_status())
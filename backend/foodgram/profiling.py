@@ -0,0 +1,247 @@
+"""
+Профилирование живых воркеров.
+
+По запросу: staff-пользователь добавляет к адресу ?__profile=1
+(или ?__profile=tottime / calls - порядок сортировки), запрос
+выполняется под cProfile, и вместо ответа возвращается текстовый
+отчет: общее время, число и время SQL-запросов, затем статистика
+функций. В отчет входят и view, и рендеринг ответа.
+
+Семплирование: если задан SAMPLING_PROFILER['directory'], в каждом
+процессе работает поток, который с интервалом interval снимает стеки
+потоков, обрабатывающих запросы, и раз в flush_seconds дописывает их
+в файл <каталог>/<host>-<pid>-<время>.collapsed в формате collapsed
+stacks (строка "корень;...;лист число"), который понимают flamegraph.pl
+и speedscope. В каталоге хранится не больше max_files файлов и не
+старше max_age_hours.
+"""
+import atexit
+import cProfile
+import io
+import os
+import pstats
+import socket
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import connection
+from django.http import HttpResponse
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+PROFILE_PARAM = '__profile'
+SORT_KEYS = {'1': 'cumulative', 'tottime': 'tottime', 'calls': 'calls'}
+REPORT_LINES = 60
+SUFFIX = '.collapsed'
+# Подписи кадров кешируются по объекту кода; ограничение на случай
+# кода, который компилируется на лету.
+MAX_LABELS = 50000
+
+_prefixes = []
+_labels = {}
+
+
+def _is_staff(request):
+    """Staff по сессии или по токену (DRF аутентифицирует позже, во view)."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return user.is_staff
+    try:
+        result = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return result is not None and result[0].is_staff
+
+
+class QueryTimer:
+    """Считает SQL-запросы и их суммарное время (execute_wrapper)."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+def profile_response(request, get_response, sort_key):
+    profiler = cProfile.Profile()
+    queries = QueryTimer()
+    started = time.perf_counter()
+    with connection.execute_wrapper(queries):
+        response = profiler.runcall(get_response, request)
+    elapsed = time.perf_counter() - started
+
+    report = io.StringIO()
+    report.write(
+        f'{request.method} {request.get_full_path()} -> '
+        f'{response.status_code}\n'
+        f'total {elapsed * 1000:.1f} ms, {queries.count} SQL queries '
+        f'{queries.seconds * 1000:.1f} ms\n\n'
+    )
+    stats = pstats.Stats(profiler, stream=report)
+    stats.strip_dirs().sort_stats(sort_key).print_stats(REPORT_LINES)
+    return HttpResponse(
+        report.getvalue(), content_type='text/plain; charset=utf-8'
+    )
+
+
+def _frame_label(code):
+    label = _labels.get(code)
+    if label is None:
+        if len(_labels) >= MAX_LABELS:
+            _labels.clear()
+        label = _labels[code] = _build_label(code)
+    return label
+
+
+def _build_label(code):
+    filename = code.co_filename
+    for path in _path_prefixes():
+        if filename.startswith(path):
+            filename = filename[len(path):].lstrip(os.sep)
+            break
+    label = f'{code.co_name} ({filename}:{code.co_firstlineno})'
+    return label.replace(';', ':')
+
+
+def _path_prefixes():
+    if not _prefixes:
+        # Длинные пути первыми: site-packages раньше каталога Python.
+        _prefixes.extend(sorted(
+            {path for path in sys.path if path}, key=len, reverse=True
+        ))
+    return _prefixes
+
+
+def collapse(frame):
+    """Стек кадра в строку collapsed stacks: от корня к листу."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame.f_code))
+        frame = frame.f_back
+    labels.reverse()
+    return ';'.join(labels)
+
+
+class SamplingProfiler:
+    """Семплирующий профайлер потоков, обрабатывающих запросы."""
+
+    def __init__(self, directory, interval, flush_seconds, max_files,
+                 max_age_hours):
+        self.directory = directory
+        self.interval = interval
+        self.flush_seconds = flush_seconds
+        self.max_files = max_files
+        self.max_age = max_age_hours * 3600
+        self.active = set()
+        self.counts = Counter()
+        self.lock = threading.Lock()
+        self.pid = None
+
+    def ensure_started(self):
+        """Запускает поток в текущем процессе (после fork - заново)."""
+        if self.pid == os.getpid():
+            return
+        with self.lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.active = set()
+            self.counts = Counter()
+            os.makedirs(self.directory, exist_ok=True)
+            threading.Thread(
+                target=self._run, name='sampling-profiler', daemon=True
+            ).start()
+            atexit.register(self.flush)
+
+    def sample(self):
+        frames = sys._current_frames()
+        stacks = [
+            collapse(frames[ident])
+            for ident in list(self.active) if ident in frames
+        ]
+        with self.lock:
+            self.counts.update(stacks)
+
+    def _run(self):
+        next_flush = time.monotonic() + self.flush_seconds
+        while True:
+            time.sleep(self.interval)
+            self.sample()
+            if time.monotonic() >= next_flush:
+                self.flush()
+                next_flush = time.monotonic() + self.flush_seconds
+
+    def flush(self):
+        """Дописывает накопленные стеки в файл процесса и чистит каталог."""
+        with self.lock:
+            counts, self.counts = self.counts, Counter()
+        if not counts:
+            return None
+        name = (f'{socket.gethostname()}-{os.getpid()}-'
+                f'{time.strftime("%Y%m%dT%H%M%S")}{SUFFIX}')
+        path = os.path.join(self.directory, name)
+        with open(path, 'a', encoding='utf-8') as f:
+            for stack, count in counts.most_common():
+                f.write(f'{stack} {count}\n')
+        self.prune()
+        return path
+
+    def prune(self):
+        entries = []
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if entry.name.endswith(SUFFIX) and entry.is_file():
+                    entries.append((entry.stat().st_mtime, entry.path))
+        entries.sort(reverse=True)
+        cutoff = time.time() - self.max_age
+        for index, (mtime, path) in enumerate(entries):
+            if index >= self.max_files or mtime < cutoff:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+
+def sampler_from_settings():
+    config = settings.SAMPLING_PROFILER
+    if not config.get('directory'):
+        return None
+    return SamplingProfiler(
+        config['directory'], config['interval'], config['flush_seconds'],
+        config['max_files'], config['max_age_hours'],
+    )
+
+
+class ProfilingMiddleware:
+    """
+    ?__profile= для staff и учет потоков запросов для семплирования.
+    Ставится после AuthenticationMiddleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sampler = sampler_from_settings()
+
+    def __call__(self, request):
+        sort_key = SORT_KEYS.get(request.GET.get(PROFILE_PARAM))
+        if sort_key is not None and _is_staff(request):
+            return profile_response(request, self.get_response, sort_key)
+        if self.sampler is None:
+            return self.get_response(request)
+        self.sampler.ensure_started()
+        ident = threading.get_ident()
+        self.sampler.active.add(ident)
+        try:
+            return self.get_response(request)
+        finally:
+            self.sampler.active.discard(ident)
@@ -37,10 +37,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'foodgram.memory.MemoryMiddleware',
+    'api.throttling.ConcurrencyLimitMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'foodgram.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -94,6 +97,15 @@ STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'mediafiles'
 
+STORAGES = {
+    'default': {
+        'BACKEND': 'api.storage.ContentAddressedStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
@@ -111,6 +123,94 @@ REST_FRAMEWORK = {
     'DEFAULT_FILTER_BACKENDS': (
         'django_filters.rest_framework.DjangoFilterBackend',
     ),
+    'DEFAULT_THROTTLE_CLASSES': (
+        'api.throttling.IPTokenBucketThrottle',
+        'api.throttling.UserTokenBucketThrottle',
+    ),
+    'NUM_PROXIES': int(os.getenv('NUM_PROXIES', '1')),
+}
+
+REDIS_URL = os.getenv('REDIS_URL')
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # Счетчики троттлинга должны быть общими для всех воркеров.
+    'throttle': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'throttle',
+    },
+    # Фрагменты рецептов (recipes.fragments): инвалидация должна быть
+    # видна всем воркерам, поэтому тоже общий кеш.
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': REDIS_URL,
+    } if REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+    },
+}
+
+THROTTLE_CACHE = 'throttle'
+
+# Токен-бакеты: capacity - емкость (всплеск), refill - токенов в секунду.
+THROTTLE_BUCKETS = {
+    'user': {'capacity': 120, 'refill': 2},
+    'ip': {'capacity': 300, 'refill': 5},
+}
+
+# Стоимость действий в токенах; остальные запросы стоят 1.
+THROTTLE_COSTS = {
+    'download_shopping_cart': 20,
+    'create': 10,
+    'update': 10,
+    'partial_update': 10,
+    'avatar': 10,
+    'export': 50,
+    'subscribe': 5,
+    'favorite': 2,
+    'shopping_cart': 2,
+}
+
+# Лимиты параллельных запросов на все воркеры вместе (слоты в
+# THROTTLE_CACHE). Лимит выше workers x threads не сработает никогда.
+# slot_ttl больше таймаута gunicorn: слот убитого воркера освобождается.
+CONCURRENCY_LIMITS = {
+    'max_requests': int(os.getenv('MAX_CONCURRENT_REQUESTS', '32')),
+    'max_writes': int(os.getenv('MAX_CONCURRENT_WRITES', '8')),
+    'queue_timeout': 0.5,
+    'retry_after': 1,
+    'slot_ttl': 60,
+    'exempt_paths': ('/admin/', '/healthz', '/readyz', '/debug/'),
+    # POST-запросы, которые только читают и не занимают слоты записи.
+    'read_paths': ('/api/batch/',),
+}
+
+# Семплирующий профайлер: пустой каталог - выключен. Интервал 0.05 с
+# (20 Гц) дает достаточно семплов за минуту и почти не нагружает воркер.
+SAMPLING_PROFILER = {
+    'directory': os.getenv('PROFILE_SAMPLES_DIR', ''),
+    'interval': float(os.getenv('PROFILE_SAMPLE_INTERVAL', '0.05')),
+    'flush_seconds': 60,
+    'max_files': 200,
+    'max_age_hours': 24,
+}
+
+# Диагностика памяти (foodgram.memory): 0 отключает соответствующую часть.
+MEMORY_DIAGNOSTICS = {
+    # Глубина стеков tracemalloc; >0 - трассировка с запуска процесса.
+    'tracemalloc_frames': int(os.getenv('MEMORY_TRACEMALLOC_FRAMES', '0')),
+    # Прирост текущего RSS (/proc/self/statm) за запрос, после которого
+    # запрос пишется в лог. Память, выделенная и освобожденная до конца
+    # запроса, в прирост не попадает: короткие всплески не видны.
+    'rss_delta_mb': float(os.getenv('MEMORY_RSS_DELTA_MB', '20')),
+    # RSS воркера, после которого gunicorn мягко перезапускает его.
+    'max_rss_mb': int(os.getenv('MEMORY_MAX_RSS_MB', '0')),
+    'top': 20,
 }
 
 DJOSER = {
@@ -0,0 +1,196 @@
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from unittest import mock
+
+from django.db import OperationalError, connection
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.testing import TemporaryMediaTestCase, ThrottleResetTestCase
+from recipes import catalog
+from users.models import User
+from . import memory, profiling, warmup
+from .profiling import SamplingProfiler
+
+
+class ProfilingTest(ThrottleResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create(
+            username='staff', email='staff@example.org', is_staff=True
+        )
+        cls.user = User.objects.create(
+            username='user', email='user@example.org'
+        )
+
+    def test_profile_report_for_staff_only(self):
+        client = APIClient()
+        client.force_login(self.staff)
+        response = client.get('/api/recipes/?__profile=tottime')
+        self.assertEqual(response['Content-Type'], 'text/plain; charset=utf-8')
+        report = response.content.decode()
+        self.assertIn('GET /api/recipes/?__profile=tottime -> 200', report)
+        self.assertIn('SQL queries', report)
+        self.assertIn('tottime', report)
+
+        client.force_login(self.user)
+        response = client.get('/api/recipes/?__profile=1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('results', response.json())
+
+    def test_profile_with_token(self):
+        token = Token.objects.create(user=self.staff)
+        response = APIClient().get(
+            '/api/users/?__profile=1', HTTP_AUTHORIZATION=f'Token {token}'
+        )
+        self.assertIn('cumulative', response.content.decode())
+
+    def test_sampler_flush_and_retention(self):
+        with tempfile.TemporaryDirectory() as directory:
+            sampler = SamplingProfiler(directory, 0.01, 60, 2, 1)
+            ready, done = threading.Event(), threading.Event()
+
+            def busy():
+                ready.set()
+                done.wait()
+
+            thread = threading.Thread(target=busy)
+            thread.start()
+            ready.wait()
+            sampler.active.add(thread.ident)
+            sampler.sample()
+            sampler.sample()
+            done.set()
+            thread.join()
+
+            path = sampler.flush()
+            with open(path, encoding='utf-8') as f:
+                stack, count = f.read().strip().rsplit(' ', 1)
+            self.assertEqual(count, '2')
+            self.assertTrue(any(
+                label.startswith('busy (') for label in stack.split(';')
+            ))
+            self.assertIsNone(sampler.flush())
+
+            stale = os.path.join(directory, 'old.collapsed')
+            open(stale, 'w').close()
+            os.utime(stale, (time.time() - 7200,) * 2)
+            for name in ('a', 'b'):
+                open(os.path.join(directory, f'{name}.collapsed'), 'w').close()
+            sampler.prune()
+            self.assertEqual(len(os.listdir(directory)), 2)
+            self.assertNotIn('old.collapsed', os.listdir(directory))
+
+    def test_frame_labels_cached(self):
+        code = self.test_frame_labels_cached.__code__
+        with mock.patch.dict(profiling._labels, clear=True):
+            label = profiling._frame_label(code)
+            self.assertTrue(label.startswith('test_frame_labels_cached ('))
+            with mock.patch.object(
+                profiling, '_build_label', side_effect=AssertionError
+            ):
+                self.assertIs(profiling._frame_label(code), label)
+            with mock.patch.object(profiling, 'MAX_LABELS', 1):
+                profiling._frame_label(ProfilingTest.setUpTestData.__code__)
+            self.assertEqual(len(profiling._labels), 1)
+
+
+class MemoryDiagnosticsTest(ThrottleResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create(
+            username='staff', email='staff@example.org', is_staff=True
+        )
+        cls.user = User.objects.create(
+            username='user', email='user@example.org'
+        )
+
+    def tearDown(self):
+        memory.stop_tracing()
+
+    def test_snapshots_staff_only(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/debug/memory').status_code, 403)
+
+        client.force_authenticate(self.staff)
+        self.assertFalse(client.get('/debug/memory').json()['tracing'])
+        first = client.post('/debug/memory').json()
+        self.assertTrue(first['tracing'])
+        self.assertIsNone(first['diff'])
+        self.assertIsInstance(first['top'], list)
+
+        retained = [bytearray(1024) for _ in range(1000)]
+        second = client.post(
+            '/debug/memory', {'group_by': 'filename', 'limit': 5}
+        ).json()
+        self.assertLessEqual(len(second['diff']), 5)
+        self.assertIn(__file__, [row['location'].rsplit(':', 1)[0]
+                                 for row in second['diff']])
+        del retained
+
+        response = client.post('/debug/memory', {'action': 'stop'})
+        self.assertFalse(response.json()['tracing'])
+        self.assertFalse(tracemalloc.is_tracing())
+        response = client.post('/debug/memory', {'group_by': 'x'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_rss_outliers_logged_and_recycle(self):
+        with self.settings(MEMORY_DIAGNOSTICS={
+            'tracemalloc_frames': 0, 'rss_delta_mb': 0.001,
+            'max_rss_mb': 1, 'top': 20,
+        }):
+            with mock.patch.object(
+                memory, 'rss_bytes', side_effect=[
+                    100 * 1024 * 1024, 104 * 1024 * 1024,
+                    104 * 1024 * 1024, 104 * 1024 * 1024,
+                ]
+            ), mock.patch.object(
+                memory, 'peak_rss_bytes', return_value=200 * 1024 * 1024
+            ), self.assertLogs('foodgram.memory', 'WARNING') as logs:
+                APIClient().get('/api/ingredients/')
+                # Пик процесса выше текущего RSS, но второй запрос
+                # память не добавил и в лог не попадает.
+                APIClient().get('/api/ingredients/')
+            self.assertEqual(len(logs.output), 1)
+            self.assertIn('RSS +4.0 MB (104.0 MB)', logs.output[0])
+            self.assertIn('GET /api/ingredients/', logs.output[0])
+            self.assertTrue(memory.should_recycle())
+        self.assertFalse(memory.should_recycle())
+
+
+class HealthCheckTest(TemporaryMediaTestCase):
+    def setUp(self):
+        super().setUp()
+        state = mock.patch.dict(warmup._state, ready=False, seconds=None)
+        state.start()
+        self.addCleanup(state.stop)
+
+    def test_healthz(self):
+        response = self.client.get('/healthz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'status': 'ok'})
+
+    def test_readyz_after_warmup(self):
+        self.assertEqual(self.client.get('/readyz').status_code, 503)
+        with mock.patch.object(warmup.connections, 'close_all'):
+            warmup.run()
+        response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['status'], 'ready')
+        self.assertIn('warmup_seconds', response.json())
+        self.assertTrue(os.path.exists(os.path.join(
+            self.media, catalog.CATALOG_DIR, catalog.MANIFEST_NAME
+        )))
+
+    def test_readyz_without_database(self):
+        warmup._state['ready'] = True
+        with mock.patch.object(
+            connection, 'ensure_connection', side_effect=OperationalError
+        ):
+            response = self.client.get('/readyz')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json(), {'status': 'database unavailable'})
@@ -19,12 +19,21 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from .health import healthz, readyz
+from .memory import MemoryView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
 
     path('api/', include('api.urls')),
 
     path('api/auth/', include('djoser.urls.authtoken')),
+
+    path('s/', include('recipes.urls')),
+
+    path('healthz', healthz, name='healthz'),
+    path('readyz', readyz, name='readyz'),
+    path('debug/memory', MemoryView.as_view(), name='debug-memory'),
 ]
 
 if settings.DEBUG:
@@ -0,0 +1,75 @@
+"""
+Прогрев процесса перед приемом запросов.
+
+Вызывается из хуков gunicorn (см. gunicorn.conf.py): в мастере до
+fork, чтобы прогретые структуры были общими для воркеров (copy-on-write),
+и еще раз в каждом воркере (без preload_app только там). После прогрева
+/readyz начинает отвечать 200.
+"""
+import logging
+import time
+
+from django.db import connections
+from django.urls import get_resolver
+
+logger = logging.getLogger(__name__)
+
+_state = {'ready': False, 'seconds': None}
+
+# Адреса, разрешение которых заполняет кеши резолвера для всех роутов API.
+WARMUP_PATHS = (
+    '/api/recipes/',
+    '/api/recipes/1/',
+    '/api/users/',
+    '/api/users/me/',
+    '/api/ingredients/',
+    '/s/1/',
+)
+
+
+def _prime_urls():
+    resolver = get_resolver()
+    for path in WARMUP_PATHS:
+        resolver.resolve(path)
+
+
+def _prime_serializers():
+    # Импорт модулей строит планы полей быстрого пути (FieldPlan);
+    # обращение к .fields разворачивает объявленные поля сериализаторов.
+    from recipes import readers  # noqa: F401
+    from recipes.serializers import RecipeReadSerializer
+    from users.serializers import CustomUserSerializer
+
+    RecipeReadSerializer().fields
+    CustomUserSerializer().fields
+
+
+def _prime_catalog():
+    from recipes.catalog import current_manifest
+
+    current_manifest()
+
+
+def run():
+    """Прогревает процесс; повторные вызовы ничего не делают."""
+    if _state['ready']:
+        return
+    started = time.monotonic()
+    for step in (_prime_urls, _prime_serializers, _prime_catalog):
+        try:
+            step()
+        except Exception:
+            logger.exception('Шаг прогрева %s завершился ошибкой', step)
+    # Соединения с БД не должны переживать fork в воркеры.
+    connections.close_all()
+    _state['seconds'] = time.monotonic() - started
+    _state['ready'] = True
+    logger.info('Прогрев завершен за %.3f с', _state['seconds'])
+
+
+def is_ready():
+    return _state['ready']
+
+
+def warmup_seconds():
+    return _state['seconds']
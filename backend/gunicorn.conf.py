@@ -0,0 +1,104 @@
+"""
+Конфигурация gunicorn для foodgram.
+
+Читается gunicorn автоматически из рабочего каталога (/app в образе).
+Число воркеров выбирается по CPU и памяти контейнера, приложение
+загружается в мастере (preload_app) и прогревается до fork, воркеры
+перезапускаются со случайным разбросом, чтобы не рестартовать разом.
+Любой параметр можно переопределить переменной окружения GUNICORN_*.
+"""
+import multiprocessing
+import os
+
+CONFIG_VERSION = 1
+
+# Оценка памяти одного воркера (МБ) и запас под мастер и nginx-буферы.
+WORKER_MEMORY_MB = int(os.getenv('GUNICORN_WORKER_MEMORY_MB', '160'))
+RESERVED_MEMORY_MB = 128
+
+
+def _memory_limit_mb():
+    """Лимит памяти cgroup (v2, затем v1), иначе физическая память."""
+    for path in ('/sys/fs/cgroup/memory.max',
+                 '/sys/fs/cgroup/memory/memory.limit_in_bytes'):
+        try:
+            with open(path) as f:
+                value = f.read().strip()
+        except OSError:
+            continue
+        if value.isdigit() and int(value) < 1 << 60:
+            return int(value) // (1024 * 1024)
+    try:
+        pages = os.sysconf('SC_PHYS_PAGES')
+        page_size = os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError):
+        return None
+    return pages * page_size // (1024 * 1024)
+
+
+def _default_workers():
+    by_cpu = multiprocessing.cpu_count() * 2 + 1
+    memory = _memory_limit_mb()
+    if memory is None:
+        return by_cpu
+    by_memory = (memory - RESERVED_MEMORY_MB) // WORKER_MEMORY_MB
+    return max(1, min(by_cpu, by_memory))
+
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+
+# gthread: запросы в основном ждут БД, потоки дешевле процессов,
+# а ConcurrencyLimitMiddleware ограничивает нагрузку на все воркеры вместе.
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+workers = int(os.getenv('GUNICORN_WORKERS', _default_workers()))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+preload_app = True
+
+# Перезапуск воркеров против роста памяти; jitter разносит рестарты.
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '2000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '200'))
+
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+# nginx держит соединения к бэкенду открытыми недолго.
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+
+# Heartbeat-файлы воркеров в памяти, а не на диске контейнера.
+worker_tmp_dir = '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+loglevel = os.getenv('GUNICORN_LOG_LEVEL', 'info')
+
+
+def when_ready(server):
+    """Мастер: прогрев до fork, воркеры наследуют прогретую память."""
+    from foodgram import warmup
+
+    warmup.run()
+    server.log.info(
+        'Config v%s: %s workers x %s threads (%s), warm-up %.3fs',
+        CONFIG_VERSION, workers, threads, worker_class,
+        warmup.warmup_seconds(),
+    )
+
+
+def post_worker_init(worker):
+    """Воркер: без preload_app прогрев выполняется здесь."""
+    from foodgram import memory, warmup
+
+    warmup.run()
+    memory.install_signal_handler()
+
+
+def post_request(worker, req, environ, resp):
+    """Воркер сверх MEMORY_MAX_RSS_MB дообслуживает запросы и выходит."""
+    from foodgram import memory
+
+    if worker.alive and memory.should_recycle():
+        worker.log.warning(
+            'Worker %s: RSS %.0f MB over the limit, recycling',
+            worker.pid, memory.rss_bytes() / (1024 * 1024),
+        )
+        worker.alive = False
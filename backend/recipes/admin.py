@@ -1,14 +1,32 @@
 from django.contrib import admin
+from django.template.response import TemplateResponse
+from django.urls import path
+from api.admin import AutocompleteFilter, LargeTableAdminMixin, count_subquery
+from . import cart, composition, duplicates
+from .catalog import build_snapshot
 from .models import (Ingredient, Recipe, RecipeIngredient,
-                     Favorite, ShoppingCart)
+                     Favorite, ShoppingCart, ShortLink)
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
+    """ После любых изменений пересобирается снимок каталога. """
     list_display = ('id', 'name', 'measurement_unit')
     search_fields = ('name',)
     list_filter = ('measurement_unit',)
     ordering = ('name',)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        build_snapshot()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        build_snapshot()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        build_snapshot()
+
 class RecipeIngredientInline(admin.TabularInline):
     """ Инлайн для отображения ингредиентов внутри рецепта. """
     model = RecipeIngredient
@@ -16,41 +34,109 @@ class RecipeIngredientInline(admin.TabularInline):
     min_num = 1
     autocomplete_fields = ('ingredient',)
 
+class AuthorFilter(AutocompleteFilter):
+    title = 'автору'
+    field_name = 'author'
+
+
+class UserFilter(AutocompleteFilter):
+    title = 'пользователю'
+    field_name = 'user'
+
+
+class RecipeFilter(AutocompleteFilter):
+    title = 'рецепту'
+    field_name = 'recipe'
+
+
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'name', 'author', 'get_favorite_count', 'cooking_time', 'pub_date')
-    list_filter = ('author__username', 'name')
+    list_filter = (AuthorFilter,)
+    list_select_related = ('author',)
     search_fields = ('name', 'author__username', 'text')
     readonly_fields = ('pub_date', 'get_favorite_count_display')
     inlines = (RecipeIngredientInline,)
     ordering = ('-pub_date',)
+    change_list_template = 'admin/recipes/recipe/change_list.html'
+
+    def get_urls(self):
+        return [
+            path(
+                'duplicates/',
+                self.admin_site.admin_view(self.duplicates_view),
+                name='recipes_recipe_duplicates',
+            ),
+        ] + super().get_urls()
+
+    def duplicates_view(self, request):
+        """ Отчет: группы рецептов с одинаковыми ингредиентами. """
+        groups = duplicates.duplicate_groups()
+        context = {
+            **self.admin_site.each_context(request),
+            'opts': self.model._meta,
+            'title': 'Дубликаты рецептов',
+            'groups': groups,
+            'recipes_count': sum(len(g['recipes']) for g in groups),
+        }
+        return TemplateResponse(
+            request, 'admin/recipes/recipe/duplicates.html', context
+        )
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            favorite_count=count_subquery(Favorite.objects.all(), 'recipe')
+        )
 
     @admin.display(description='В избранном (кол-во)')
     def get_favorite_count(self, obj):
-        return obj.favorited_by.count()
+        return obj.favorite_count
 
     @admin.display(description='Добавлений в избранное')
     def get_favorite_count_display(self, obj):
          return self.get_favorite_count(obj)
 
+    def save_related(self, request, form, formsets, change):
+        """ Обновляет производные данные рецепта после правки инлайнов. """
+        recipe = form.instance
+        old_amounts = cart.recipe_amounts(recipe.pk)
+        super().save_related(request, form, formsets, change)
+        composition.ingredients_changed(recipe, old_amounts, list(
+            recipe.recipe_ingredients.values_list('ingredient_id', 'amount')
+        ))
+
 @admin.register(RecipeIngredient)
-class RecipeIngredientAdmin(admin.ModelAdmin):
+class RecipeIngredientAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'recipe', 'ingredient', 'amount')
+    list_filter = (RecipeFilter,)
+    list_select_related = ('recipe__author', 'ingredient')
     search_fields = ('recipe__name', 'ingredient__name')
     autocomplete_fields = ('recipe', 'ingredient') # Удобный поиск
+    ordering = ('-id',)
 
 @admin.register(Favorite)
-class FavoriteAdmin(admin.ModelAdmin):
+class FavoriteAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe', 'added_at')
+    list_select_related = ('user', 'recipe__author')
     search_fields = ('user__username', 'recipe__name')
-    list_filter = ('added_at',)
-    ordering = ('-added_at',)
+    list_filter = (UserFilter, RecipeFilter, 'added_at')
+    ordering = ('-id',)
     autocomplete_fields = ('user', 'recipe')
 
 @admin.register(ShoppingCart)
-class ShoppingCartAdmin(admin.ModelAdmin):
+class ShoppingCartAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'user', 'recipe', 'added_at')
+    list_select_related = ('user', 'recipe__author')
     search_fields = ('user__username', 'recipe__name')
-    list_filter = ('added_at',)
-    ordering = ('-added_at',)
-    autocomplete_fields = ('user', 'recipe')
\ No newline at end of file
+    list_filter = (UserFilter, RecipeFilter, 'added_at')
+    ordering = ('-id',)
+    autocomplete_fields = ('user', 'recipe')
+
+
+@admin.register(ShortLink)
+class ShortLinkAdmin(admin.ModelAdmin):
+    list_display = ('id', 'code', 'recipe', 'clicks', 'created_at')
+    list_select_related = ('recipe__author',)
+    search_fields = ('code', 'recipe__name')
+    readonly_fields = ('clicks', 'created_at')
+    autocomplete_fields = ('recipe',)
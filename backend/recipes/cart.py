@@ -0,0 +1,130 @@
+"""
+Инкрементальное поддержание итогов списка покупок.
+
+Для каждого пользователя хранится сумма по каждому ингредиенту (в его
+единице измерения: у ингредиента она одна, поэтому приводить нечего).
+Итоги меняются на дельту при добавлении/удалении рецепта из списка
+покупок и при изменении ингредиентов рецепта, который уже лежит в
+чьих-то списках.
+
+Дельта применяется без чтения текущих строк: недостающие строки
+вставляются с нулем (ON CONFLICT DO NOTHING), затем количество
+увеличивается UPDATE ... SET amount = amount + дельта. Так два
+одновременных добавления одного ингредиента не пытаются вставить одну
+и ту же строку дважды и не теряют ни одну из дельт.
+"""
+from django.db import transaction
+from django.db.models import F
+
+from .models import RecipeIngredient, ShoppingCart, ShoppingCartTotal
+
+
+def format_amount(amount):
+    """Форматирует Decimal без лишних нулей: 1500.000 -> '1500'."""
+    return f'{amount.normalize():f}'
+
+
+def recipe_amounts(recipe_id):
+    """Возвращает {ingredient_id: количество} для рецепта."""
+    return dict(
+        RecipeIngredient.objects.filter(recipe_id=recipe_id).values_list(
+            'ingredient_id', 'amount'
+        )
+    )
+
+
+def _diff(old_amounts, new_amounts):
+    deltas = {}
+    for ingredient_id in old_amounts.keys() | new_amounts.keys():
+        delta = (new_amounts.get(ingredient_id, 0)
+                 - old_amounts.get(ingredient_id, 0))
+        if delta:
+            deltas[ingredient_id] = delta
+    return deltas
+
+
+@transaction.atomic
+def apply_deltas(user_ids, deltas):
+    """
+    Прибавляет дельты {ingredient_id: дельта} к итогам каждого
+    пользователя из user_ids и удаляет обнулившиеся строки.
+    """
+    user_ids = list(user_ids)
+    if not user_ids or not deltas:
+        return
+    ShoppingCartTotal.objects.bulk_create([
+        ShoppingCartTotal(
+            user_id=user_id, ingredient_id=ingredient_id, amount=0
+        )
+        for ingredient_id, delta in sorted(deltas.items()) if delta > 0
+        for user_id in user_ids
+    ], ignore_conflicts=True)
+    totals = ShoppingCartTotal.objects.filter(user_id__in=user_ids)
+    # Один порядок блокировок строк во всех транзакциях - без deadlock.
+    for ingredient_id, delta in sorted(deltas.items()):
+        totals.filter(ingredient_id=ingredient_id).update(
+            amount=F('amount') + delta
+        )
+    totals.filter(
+        ingredient_id__in=deltas.keys(), amount__lte=0
+    ).delete()
+
+
+def add_recipe(user_id, recipe_id):
+    """Учитывает рецепт, добавленный в список покупок пользователя."""
+    apply_deltas([user_id], _diff({}, recipe_amounts(recipe_id)))
+
+
+def remove_recipe(user_id, recipe_id):
+    """Вычитает рецепт, удаленный из списка покупок пользователя."""
+    apply_deltas([user_id], _diff(recipe_amounts(recipe_id), {}))
+
+
+def recipe_ingredients_changed(recipe_id, old_amounts):
+    """
+    Переносит изменение состава рецепта в итоги всех пользователей,
+    у которых рецепт лежит в списке покупок.
+    old_amounts - результат recipe_amounts() до изменения.
+    """
+    deltas = _diff(old_amounts, recipe_amounts(recipe_id))
+    if not deltas:
+        return
+    user_ids = ShoppingCart.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('user_id', flat=True)
+    apply_deltas(user_ids, deltas)
+
+
+@transaction.atomic
+def rebuild_totals(user_ids=None):
+    """
+    Полностью пересчитывает итоги по таблице ShoppingCart.
+    Если user_ids не передан, пересчитываются итоги всех пользователей.
+    Возвращает количество записанных строк.
+    """
+    carts = ShoppingCart.objects.all()
+    totals = ShoppingCartTotal.objects.all()
+    if user_ids is not None:
+        carts = carts.filter(user_id__in=user_ids)
+        totals = totals.filter(user_id__in=user_ids)
+    totals.delete()
+
+    rows = carts.filter(
+        recipe__recipe_ingredients__isnull=False
+    ).values_list(
+        'user_id',
+        'recipe__recipe_ingredients__ingredient_id',
+        'recipe__recipe_ingredients__amount',
+    )
+    amounts = {}
+    for user_id, ingredient_id, amount in rows:
+        key = (user_id, ingredient_id)
+        amounts[key] = amounts.get(key, 0) + amount
+
+    ShoppingCartTotal.objects.bulk_create([
+        ShoppingCartTotal(
+            user_id=user_id, ingredient_id=ingredient_id, amount=amount
+        )
+        for (user_id, ingredient_id), amount in amounts.items()
+    ], batch_size=1000)
+    return len(amounts)
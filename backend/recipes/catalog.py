@@ -0,0 +1,114 @@
+"""
+Статический снимок каталога ингредиентов.
+
+Полный список ингредиентов (те же поля, что отдает /api/ingredients/,
+но по алфавиту) сохраняется в MEDIA_ROOT/catalog/ingredients.<версия>.json
+вместе с .gz и .br копиями; версия - хеш содержимого, поэтому файл
+неизменяем и nginx отдает его с immutable-кешированием через gzip_static.
+Текущая версия записывается в catalog/current.json.
+"""
+import gzip
+import hashlib
+import json
+import os
+
+from django.conf import settings
+from rest_framework.renderers import JSONRenderer
+
+from .models import Ingredient
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+CATALOG_DIR = 'catalog'
+MANIFEST_NAME = 'current.json'
+KEEP_VERSIONS = 3
+
+_manifest_cache = {'mtime': None, 'data': None}
+
+
+def catalog_root():
+    return os.path.join(settings.MEDIA_ROOT, CATALOG_DIR)
+
+
+def catalog_url(name):
+    return f'{settings.MEDIA_URL}{CATALOG_DIR}/{name}'
+
+
+def _write_atomic(path, content):
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _cleanup(root, keep):
+    """Удаляет старые версии, оставляя keep последних."""
+    versions = sorted(
+        (entry for entry in os.scandir(root)
+         if entry.name.startswith('ingredients.')
+         and entry.name.endswith('.json')),
+        key=lambda entry: entry.stat().st_mtime,
+        reverse=True,
+    )
+    for entry in versions[keep:]:
+        for suffix in ('', '.gz', '.br'):
+            try:
+                os.remove(entry.path + suffix)
+            except FileNotFoundError:
+                pass
+
+
+def build_snapshot():
+    """
+    Пишет снимок каталога, если содержимое изменилось.
+    Возвращает манифест: {'version', 'url', 'count'}.
+    """
+    # Те же поля и порядок, что у IngredientSerializer.
+    data = list(Ingredient.objects.order_by('name').values(
+        'id', 'name', 'measurement_unit'
+    ))
+    content = JSONRenderer().render(data)
+    version = hashlib.sha256(content).hexdigest()[:16]
+    name = f'ingredients.{version}.json'
+    root = catalog_root()
+    os.makedirs(root, exist_ok=True)
+    path = os.path.join(root, name)
+
+    if not os.path.exists(path):
+        _write_atomic(path + '.gz', gzip.compress(content, compresslevel=9))
+        if brotli is not None:
+            _write_atomic(path + '.br', brotli.compress(content))
+        _write_atomic(path, content)
+
+    manifest = {
+        'version': version,
+        'url': catalog_url(name),
+        'count': len(data),
+    }
+    _write_atomic(
+        os.path.join(root, MANIFEST_NAME),
+        json.dumps(manifest).encode()
+    )
+    os.utime(path)
+    _cleanup(root, KEEP_VERSIONS)
+    return manifest
+
+
+def current_manifest():
+    """
+    Возвращает манифест текущей версии (перечитывается при изменении
+    файла), при отсутствии снимка создает его.
+    """
+    path = os.path.join(catalog_root(), MANIFEST_NAME)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return build_snapshot()
+    if _manifest_cache['mtime'] != mtime:
+        with open(path, 'rb') as f:
+            _manifest_cache['data'] = json.load(f)
+        _manifest_cache['mtime'] = mtime
+    return _manifest_cache['data']
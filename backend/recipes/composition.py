@@ -0,0 +1,27 @@
+"""
+Производные данные состава рецепта.
+
+После любой смены ингредиентов рецепта (API, админка) обновляются:
+число ингредиентов и отпечатки дубликатов в самом рецепте, LSH-индекс
+похожих рецептов, счетчики использования ингредиентов и итоги списков
+покупок, где лежит рецепт. Массовый импорт делает то же пачками
+(см. import_recipes).
+"""
+from . import cart, duplicates, usage
+from .similarity import update_recipe_index
+
+
+def ingredients_changed(recipe, old_amounts, amounts):
+    """
+    old_amounts - cart.recipe_amounts() до изменения,
+    amounts - новый состав парами (ingredient_id, количество).
+    """
+    ingredient_ids = [ingredient_id for ingredient_id, amount in amounts]
+    recipe.ingredients_count = len(ingredient_ids)
+    duplicates.fingerprint(recipe, amounts)
+    recipe.save(update_fields=[
+        'ingredients_count', 'ingredients_fingerprint', 'name_fingerprint'
+    ])
+    update_recipe_index(recipe, ingredient_ids)
+    usage.ingredients_changed(old_amounts.keys(), ingredient_ids)
+    cart.recipe_ingredients_changed(recipe.pk, old_amounts)
@@ -0,0 +1,98 @@
+"""
+Поиск повторно опубликованных рецептов.
+
+При сохранении рецепта считаются два отпечатка (blake2b, 32 hex-символа):
+- ingredients_fingerprint - по отсортированным парам (id ингредиента,
+  количество), не зависит от порядка ингредиентов в запросе;
+- name_fingerprint - по названию, приведенному к нижнему регистру,
+  с ё -> е, без пунктуации и лишних пробелов.
+
+Дубликатом считается рецепт с тем же набором ингредиентов и количеств
+или рецепт того же автора с тем же названием. Оба поиска идут по
+индексам, попарного сравнения списков ингредиентов нет. Найденные при
+записи дубликаты не запрещают сохранение: API сообщает о них заголовками
+ответа (см. warning_headers). Отчет для админки (duplicate_groups)
+выбирает все группы одним запросом с оконным COUNT по отпечатку.
+"""
+import hashlib
+import re
+from itertools import groupby
+
+from django.db.models import Count, F, Q, Window
+
+from .models import Recipe
+
+MAX_WARNINGS = 10
+_SEPARATORS = re.compile(r'[\W_]+')
+
+
+def _digest(value):
+    return hashlib.blake2b(value.encode(), digest_size=16).hexdigest()
+
+
+def normalize_name(name):
+    name = name.casefold().replace('ё', 'е')
+    return ' '.join(_SEPARATORS.sub(' ', name).split())
+
+
+def name_fingerprint(name):
+    return _digest(normalize_name(name))
+
+
+def ingredients_fingerprint(amounts):
+    """Отпечаток по парам (ingredient_id, amount) в любом порядке."""
+    return _digest(';'.join(
+        f'{ingredient_id}:{amount}'
+        for ingredient_id, amount in sorted(amounts)
+    ))
+
+
+def fingerprint(recipe, amounts):
+    """Заполняет отпечатки рецепта (без сохранения)."""
+    recipe.ingredients_fingerprint = ingredients_fingerprint(amounts)
+    recipe.name_fingerprint = name_fingerprint(recipe.name)
+
+
+def find_duplicates(recipe, limit=MAX_WARNINGS):
+    """id рецептов, дублирующих recipe (по отпечаткам)."""
+    return list(
+        Recipe.objects.filter(
+            Q(ingredients_fingerprint=recipe.ingredients_fingerprint)
+            | Q(author_id=recipe.author_id,
+                name_fingerprint=recipe.name_fingerprint)
+        ).exclude(pk=recipe.pk).order_by('pk').values_list(
+            'pk', flat=True
+        )[:limit]
+    )
+
+
+def warning_headers(duplicate_ids):
+    """Заголовки ответа API о возможных дубликатах."""
+    ids = ', '.join(map(str, duplicate_ids))
+    return {
+        'Warning': f'199 - "Possible duplicate of recipes: {ids}"',
+        'X-Duplicate-Recipes': ids,
+    }
+
+
+def duplicate_groups():
+    """
+    Группы рецептов с одинаковым набором ингредиентов и количеств:
+    [{'fingerprint', 'recipes', 'same_name'}], крупные группы первыми.
+    """
+    rows = Recipe.objects.exclude(ingredients_fingerprint='').annotate(
+        group_size=Window(
+            Count('pk'), partition_by=F('ingredients_fingerprint')
+        ),
+    ).filter(group_size__gt=1).select_related('author').order_by(
+        '-group_size', 'ingredients_fingerprint', 'pk'
+    )
+    groups = []
+    for key, recipes in groupby(rows, key=lambda r: r.ingredients_fingerprint):
+        recipes = list(recipes)
+        groups.append({
+            'fingerprint': key,
+            'recipes': recipes,
+            'same_name': len({r.name_fingerprint for r in recipes}) == 1,
+        })
+    return groups
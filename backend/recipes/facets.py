@@ -0,0 +1,147 @@
+"""
+Счетчики для вариантов фильтров списка рецептов (фасеты).
+
+Для текущего набора фильтров RecipeFilter считаются: общее число
+рецептов и корзины времени приготовления - одним агрегатом с FILTER
+(на СУБД без FILTER Django строит CASE), самые частые авторы и
+ингредиенты - по одному GROUP BY. Число запросов не зависит от числа
+вариантов фильтра. Результат кешируется ненадолго по нормализованным
+параметрам фильтра; фильтры по избранному и списку покупок зависят от
+пользователя, и тогда в ключ входит его id.
+
+Три запроса вместо одного - сознательно. Счетчики по рецептам и по
+ингредиентам считаются по разным строкам: соединение с
+RecipeIngredient умножает рецепты на число ингредиентов. Один проход
+(GROUPING SETS по соединению) заставил бы и общий счетчик с корзинами
+читать соединение и считать COUNT(DISTINCT), а топ авторов
+и ингредиентов пришлось бы выбирать окном по всем группам вместо
+ORDER BY ... LIMIT. Каждый из трех запросов читает отфильтрованный
+набор по индексам, так что лишние два обращения к БД дешевле.
+"""
+import datetime
+import hashlib
+import json
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db.models import Count, Model, Q
+
+from .models import RecipeIngredient
+
+CACHE_PREFIX = 'recipe-facets:'
+TIMEOUT = 60
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+USER_FILTERS = ('is_favorited', 'is_in_shopping_cart')
+
+# Корзины времени приготовления (минуты, границы включительно).
+COOKING_TIME_BUCKETS = (
+    ('0-15', None, 15),
+    ('16-30', 16, 30),
+    ('31-60', 31, 60),
+    ('60+', 61, None),
+)
+
+
+def _normalize(value):
+    if isinstance(value, Model):
+        return value.pk
+    if isinstance(value, slice):
+        return [_normalize(value.start), _normalize(value.stop)]
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, (list, tuple, set)):
+        return sorted({_normalize(item) for item in value})
+    return value
+
+
+def cache_key(cleaned_data, user, limit):
+    """Ключ кеша по очищенным данным формы фильтра."""
+    params = {
+        name: _normalize(value)
+        for name, value in cleaned_data.items()
+        if value not in (None, '', [], ())
+    }
+    if any(name in params for name in USER_FILTERS):
+        params['user'] = user.pk if user.is_authenticated else None
+    params['limit'] = limit
+    digest = hashlib.sha256(
+        json.dumps(params, sort_keys=True).encode()
+    ).hexdigest()
+    return f'{CACHE_PREFIX}{digest}'
+
+
+def _bucket_filter(low, high):
+    condition = Q()
+    if low is not None:
+        condition &= Q(cooking_time__gte=low)
+    if high is not None:
+        condition &= Q(cooking_time__lte=high)
+    return condition
+
+
+def compute(queryset, limit=DEFAULT_LIMIT):
+    """Фасеты для отфильтрованного queryset рецептов."""
+    queryset = queryset.order_by()
+    totals = queryset.aggregate(
+        total=Count('id'),
+        **{
+            f'bucket_{index}': Count('id', filter=_bucket_filter(low, high))
+            for index, (key, low, high) in enumerate(COOKING_TIME_BUCKETS)
+        },
+    )
+    cooking_time = [
+        {'key': key, 'min': low, 'max': high,
+         'count': totals[f'bucket_{index}']}
+        for index, (key, low, high) in enumerate(COOKING_TIME_BUCKETS)
+    ]
+    authors = [
+        {
+            'id': row['author_id'],
+            'username': row['author__username'],
+            'first_name': row['author__first_name'],
+            'last_name': row['author__last_name'],
+            'count': row['count'],
+        }
+        for row in queryset.values(
+            'author_id', 'author__username', 'author__first_name',
+            'author__last_name',
+        ).annotate(count=Count('id')).order_by('-count', 'author_id')[:limit]
+    ]
+    ingredients = [
+        {
+            'id': row['ingredient_id'],
+            'name': row['ingredient__name'],
+            'measurement_unit': row['ingredient__measurement_unit'],
+            'count': row['count'],
+        }
+        for row in RecipeIngredient.objects.filter(
+            recipe__in=queryset.values('id')
+        ).values(
+            'ingredient_id', 'ingredient__name',
+            'ingredient__measurement_unit',
+        ).annotate(
+            count=Count('recipe_id')
+        ).order_by('-count', 'ingredient__name')[:limit]
+    ]
+    return {
+        'count': totals['total'],
+        'cooking_time': cooking_time,
+        'authors': authors,
+        'ingredients': ingredients,
+    }
+
+
+def facets(filterset, limit=DEFAULT_LIMIT):
+    """
+    Фасеты для валидного RecipeFilter с кешированием на TIMEOUT секунд.
+    """
+    user = filterset.request.user
+    key = cache_key(filterset.form.cleaned_data, user, limit)
+    data = cache.get(key)
+    if data is None:
+        data = compute(filterset.qs, limit)
+        cache.set(key, data, TIMEOUT)
+    return data
@@ -1,6 +1,9 @@
 import django_filters
 from django.contrib.auth import get_user_model
-from .models import Ingredient, Recipe
+from django.db.models import Exists, OuterRef
+from .models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart
+)
 
 User = get_user_model()
 
@@ -19,9 +22,71 @@ class IngredientFilter(django_filters.FilterSet):
         fields = ('name',)
 
 
+class NumberInFilter(django_filters.BaseInFilter, django_filters.NumberFilter):
+    """ Фильтр по списку чисел через запятую: ?param=1,2,3. """
+
+
 class RecipeFilter(django_filters.FilterSet):
+    """
+    Фильтр для модели Recipe.
+    Все условия по связанным таблицам записаны как полусоединения (Exists),
+    поэтому рецепты в выдаче не дублируются.
+    """
     author = django_filters.ModelChoiceFilter(queryset=User.objects.all())
+    ingredients = NumberInFilter(method='filter_ingredients')
+    exclude_ingredients = NumberInFilter(method='filter_exclude_ingredients')
+    cooking_time = django_filters.RangeFilter()
+    pub_date = django_filters.IsoDateTimeFromToRangeFilter()
+    is_favorited = django_filters.BooleanFilter(
+        method='filter_is_favorited',
+        widget=django_filters.widgets.BooleanWidget(),
+    )
+    is_in_shopping_cart = django_filters.BooleanFilter(
+        method='filter_is_in_shopping_cart',
+        widget=django_filters.widgets.BooleanWidget(),
+    )
 
     class Meta:
         model = Recipe
-        fields = ['author']
\ No newline at end of file
+        fields = [
+            'author', 'ingredients', 'exclude_ingredients', 'cooking_time',
+            'pub_date', 'is_favorited', 'is_in_shopping_cart',
+        ]
+
+    def filter_ingredients(self, queryset, name, value):
+        """ Рецепты, в которых есть все перечисленные ингредиенты. """
+        for ingredient_id in set(value):
+            queryset = queryset.filter(Exists(
+                RecipeIngredient.objects.filter(
+                    recipe=OuterRef('pk'), ingredient_id=ingredient_id
+                )
+            ))
+        return queryset
+
+    def filter_exclude_ingredients(self, queryset, name, value):
+        """ Рецепты без перечисленных ингредиентов. """
+        if not value:
+            return queryset
+        return queryset.exclude(Exists(
+            RecipeIngredient.objects.filter(
+                recipe=OuterRef('pk'), ingredient_id__in=value
+            )
+        ))
+
+    def _filter_user_relation(self, queryset, model, value):
+        """
+        Только ?...=1 (true) сужает выдачу; 0/false, как и раньше,
+        означает "без фильтра", а не "кроме отмеченных".
+        """
+        user = getattr(self.request, 'user', None)
+        if not value or user is None or not user.is_authenticated:
+            return queryset
+        return queryset.filter(Exists(
+            model.objects.filter(user=user, recipe=OuterRef('pk'))
+        ))
+
+    def filter_is_favorited(self, queryset, name, value):
+        return self._filter_user_relation(queryset, Favorite, value)
+
+    def filter_is_in_shopping_cart(self, queryset, name, value):
+        return self._filter_user_relation(queryset, ShoppingCart, value)
@@ -0,0 +1,134 @@
+"""
+Кеш общих для всех пользователей частей ответа о рецепте.
+
+Для рецепта кешируется строка его колонок вместе с уже отрендеренным
+списком ингредиентов, для автора - строка его колонок. Флаги
+is_favorited, is_in_shopping_cart и is_subscribed зависят от
+пользователя и в кеш не попадают: они вычисляются на запрос по
+множествам id (см. readers.read_recipes), а абсолютные адреса картинок
+строятся из имен файлов уже под конкретный запрос.
+
+Ключ записи содержит поколение объекта - случайный токен, который
+меняется после коммита транзакции, изменившей рецепт, его ингредиенты
+или автора (см. signals). Читатель узнает поколение до чтения из БД,
+поэтому значение, построенное параллельно с изменением, сохраняется
+под старым ключом и больше не читается (простое удаление ключа тут не
+помогает: запись могла прийти уже после него). TTL ограничивает
+устаревание, если изменение прошло мимо сигналов (queryset.update()).
+"""
+import uuid
+
+from django.core.cache import caches
+from django.db import transaction
+
+from users.readers import user_rows
+
+from .models import Recipe, RecipeIngredient
+
+CACHE_ALIAS = 'fragments'
+RECIPE_PREFIX = 'recipe-fragment:'
+USER_PREFIX = 'user-fragment:'
+TIMEOUT = 60 * 60
+# Поколения живут без TTL: потерянное поколение (вытеснение из кеша)
+# заменяется новым токеном, и старые записи просто перестают читаться.
+GENERATION_TIMEOUT = None
+
+RECIPE_COLUMNS = ('id', 'author_id', 'name', 'image', 'text',
+                  'cooking_time')
+INGREDIENT_COLUMNS = ('recipe_id', 'ingredient_id', 'ingredient__name',
+                      'ingredient__measurement_unit', 'amount')
+
+
+def _cache():
+    return caches[CACHE_ALIAS]
+
+
+def _generation_key(prefix, pk):
+    return f'{prefix}{pk}:generation'
+
+
+def _new_generation():
+    return uuid.uuid4().hex
+
+
+def _generations(cache, prefix, ids):
+    """{id: поколение}; недостающие поколения создаются."""
+    keys = {_generation_key(prefix, pk): pk for pk in ids}
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    for key in missing:
+        cache.add(key, _new_generation(), GENERATION_TIMEOUT)
+    if missing:
+        found.update(cache.get_many(missing))
+    return {keys[key]: generation for key, generation in found.items()}
+
+
+def _cached(prefix, ids, build):
+    """
+    Возвращает {id: значение} из кеша, недостающие строит build(ids)
+    и сохраняет одним set_many под текущими поколениями.
+    """
+    cache = _cache()
+    generations = _generations(cache, prefix, ids)
+    keys = {
+        f'{prefix}{pk}:{generations.get(pk, "")}': pk for pk in ids
+    }
+    found = {keys[key]: value for key, value in cache.get_many(keys).items()}
+    missing = [pk for pk in ids if pk not in found]
+    if missing:
+        built = build(missing)
+        cache.set_many({
+            f'{prefix}{pk}:{generations.get(pk, "")}': value
+            for pk, value in built.items()
+        }, TIMEOUT)
+        found.update(built)
+    return found
+
+
+def _build_recipes(recipe_ids):
+    from .readers import INGREDIENT_PLAN
+
+    rows = {
+        row['id']: dict(row, ingredients=[])
+        for row in Recipe.objects.filter(id__in=recipe_ids).order_by().values(
+            *RECIPE_COLUMNS
+        )
+    }
+    for row in RecipeIngredient.objects.filter(
+        recipe_id__in=rows.keys()
+    ).order_by('id').values(*INGREDIENT_COLUMNS):
+        rows[row['recipe_id']]['ingredients'].append(
+            INGREDIENT_PLAN.render(row, None)
+        )
+    return rows
+
+
+def recipe_rows(recipe_ids):
+    """
+    {id: строка рецепта с ключом 'ingredients'} для существующих рецептов.
+    """
+    return _cached(RECIPE_PREFIX, recipe_ids, _build_recipes)
+
+
+def author_rows(author_ids):
+    """{id: строка пользователя для USER_PLAN}."""
+    return _cached(USER_PREFIX, author_ids, user_rows)
+
+
+def _forget(prefix, ids):
+    """Меняет поколения объектов после коммита текущей транзакции."""
+    keys = [_generation_key(prefix, pk) for pk in ids]
+    if keys:
+        transaction.on_commit(lambda: _cache().set_many(
+            dict.fromkeys(keys, _new_generation()), GENERATION_TIMEOUT
+        ))
+
+
+def forget_recipes(recipe_ids):
+    """Сбрасывает фрагменты рецептов после коммита текущей транзакции."""
+    _forget(RECIPE_PREFIX, recipe_ids)
+
+
+def forget_user(user_id):
+    """Сбрасывает фрагмент пользователя после коммита текущей транзакции."""
+    _forget(USER_PREFIX, [user_id])
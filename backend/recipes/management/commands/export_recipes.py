@@ -0,0 +1,89 @@
+import base64
+import json
+import sys
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Streams recipes with authors, ingredients and images as JSONL'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='-',
+            help='Output file path, "-" for stdout (default)',
+        )
+        parser.add_argument(
+            '--after-id', type=int, default=0,
+            help='Export only recipes with id greater than this (to resume)',
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Rows fetched per server-side cursor round trip',
+        )
+        parser.add_argument(
+            '--embed-images', action='store_true',
+            help='Inline image contents as base64 instead of references',
+        )
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.filter(
+            pk__gt=options['after_id']
+        ).select_related('author').prefetch_related(
+            'recipe_ingredients__ingredient'
+        ).order_by('pk')
+
+        if options['output'] == '-':
+            stream = sys.stdout
+        else:
+            stream = open(options['output'], 'w', encoding='utf-8')
+
+        exported = 0
+        last_id = options['after_id']
+        try:
+            # iterator() на PostgreSQL использует серверный курсор,
+            # поэтому в памяти держится только одна порция строк.
+            for recipe in recipes.iterator(chunk_size=options['chunk_size']):
+                record = self._serialize(recipe, options['embed_images'])
+                stream.write(json.dumps(record, ensure_ascii=False) + '\n')
+                exported += 1
+                last_id = recipe.pk
+        finally:
+            if stream is not sys.stdout:
+                stream.close()
+
+        self.stderr.write(self.style.SUCCESS(
+            f'Exported {exported} recipes (last id: {last_id}).'
+        ))
+
+    def _serialize(self, recipe, embed_images):
+        author = recipe.author
+        image = {'name': recipe.image.name}
+        if embed_images and recipe.image.name:
+            with default_storage.open(recipe.image.name, 'rb') as f:
+                image['data'] = base64.b64encode(f.read()).decode()
+        return {
+            'id': recipe.pk,
+            'author': {
+                'email': author.email,
+                'username': author.username,
+                'first_name': author.first_name,
+                'last_name': author.last_name,
+            },
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'pub_date': recipe.pub_date.isoformat(),
+            'image': image,
+            'ingredients': [
+                {
+                    'name': item.ingredient.name,
+                    'measurement_unit': item.ingredient.measurement_unit,
+                    'amount': item.amount,
+                }
+                for item in recipe.recipe_ingredients.all()
+            ],
+        }
@@ -0,0 +1,319 @@
+import base64
+import io
+import json
+import os
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+from PIL import Image, UnidentifiedImageError
+
+from api.media_gc import purge_unreferenced
+from api.storage import acquire
+from recipes import duplicates
+from recipes.catalog import build_snapshot
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from recipes.similarity import index_new_recipes
+from recipes.usage import recipes_added
+
+User = get_user_model()
+
+IMAGE_DIR = 'recipes/images/'
+
+
+def decode_image(data):
+    """
+    Декодирует и проверяет base64-картинку. Выполняется в дочернем
+    процессе, поэтому принимает и возвращает только простые типы.
+    Возвращает (байты, расширение) или None, если картинка битая.
+    """
+    try:
+        content = base64.b64decode(data)
+        image = Image.open(io.BytesIO(content))
+        image.verify()
+    except (ValueError, UnidentifiedImageError, OSError):
+        return None
+    return content, (image.format or 'png').lower()
+
+
+class Command(BaseCommand):
+    help = 'Imports recipes from a JSONL file produced by export_recipes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the JSONL file')
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Recipes inserted per transaction',
+        )
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count() or 1,
+            help='Processes used to decode embedded images',
+        )
+        parser.add_argument(
+            '--state',
+            help='Checkpoint file; the import resumes from the stored offset',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        if batch_size < 1:
+            raise CommandError('--batch-size must be positive')
+        state_path = options['state']
+        offset = self._load_offset(state_path)
+
+        imported = skipped = 0
+        self.new_ingredients = 0
+        with open(options['path'], 'rb') as f, ProcessPoolExecutor(
+            max_workers=options['workers']
+        ) as pool:
+            f.seek(offset)
+            if offset:
+                self.stdout.write(f'Resuming from byte offset {offset}...')
+            while True:
+                records = []
+                for line in iter(f.readline, b''):
+                    if line.strip():
+                        records.append(json.loads(line))
+                    if len(records) >= batch_size:
+                        break
+                if not records:
+                    break
+                created = self._import_batch(
+                    records, pool, options['workers']
+                )
+                imported += created
+                skipped += len(records) - created
+                self._save_offset(state_path, f.tell())
+                self.stdout.write(f'Imported {imported} recipes...')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully imported {imported} recipes '
+            f'(skipped {skipped} already present or invalid).'
+        ))
+        if self.new_ingredients:
+            self._build_snapshot()
+
+    def _build_snapshot(self):
+        """Новые ингредиенты должны попасть в снимок каталога."""
+        try:
+            manifest = build_snapshot()
+        except OSError as e:
+            self.stdout.write(self.style.ERROR(
+                f'Error writing catalog snapshot: {e}'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Created {self.new_ingredients} ingredients, catalog snapshot: '
+            f'{manifest["url"]} ({manifest["count"]} items)'
+        ))
+
+    def _load_offset(self, state_path):
+        if not state_path or not os.path.exists(state_path):
+            return 0
+        with open(state_path, encoding='utf-8') as f:
+            return json.load(f)['offset']
+
+    def _save_offset(self, state_path, offset):
+        if not state_path:
+            return
+        tmp_path = f'{state_path}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'offset': offset}, f)
+        os.replace(tmp_path, state_path)
+
+    def _import_batch(self, records, pool, workers):
+        images = list(pool.map(
+            decode_image,
+            [record['image'].get('data', '') for record in records],
+            chunksize=max(1, len(records) // (workers * 4)),
+        ))
+        # Картинки пишутся в хранилище до коммита: при откате транзакции
+        # файлы без ссылок удаляются сразу, не дожидаясь gc_media.
+        stored = []
+        try:
+            with transaction.atomic():
+                created = self._insert_batch(records, images, stored)
+        except BaseException:
+            purge_unreferenced(stored)
+            raise
+        return created
+
+    def _insert_batch(self, records, images, stored):
+        """Создает рецепты пачки; имена новых файлов картинок - в stored."""
+        authors = self._resolve_authors(records)
+        ingredients = self._resolve_ingredients(records)
+
+        existing = set(Recipe.objects.filter(
+            author_id__in=set(authors.values()),
+            name__in={record['name'] for record in records},
+        ).values_list('author_id', 'name', 'pub_date'))
+
+        recipes, batch = [], []
+        for record, image in zip(records, images):
+            author_id = authors[record['author']['email']]
+            pub_date = parse_datetime(record['pub_date'])
+            key = (author_id, record['name'], pub_date)
+            if key in existing or not self._units_match(record, ingredients):
+                continue
+            image_name = self._store_image(record['image'], image, stored)
+            if not image_name:
+                continue
+            existing.add(key)
+            recipe = Recipe(
+                author_id=author_id,
+                name=record['name'],
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+                image=image_name,
+                pub_date=pub_date,
+                ingredients_count=len(record['ingredients']),
+            )
+            duplicates.fingerprint(recipe, [
+                (ingredients[item['name']][0], item['amount'])
+                for item in record['ingredients']
+            ])
+            recipes.append(recipe)
+            batch.append(record)
+
+        # bulk_create ставит pub_date текущим временем (auto_now_add),
+        # дата из выгрузки записывается следом одним UPDATE.
+        pub_dates = [recipe.pub_date for recipe in recipes]
+        Recipe.objects.bulk_create(recipes)
+        for recipe, pub_date in zip(recipes, pub_dates):
+            recipe.pub_date = pub_date
+        Recipe.objects.bulk_update(recipes, ['pub_date'])
+
+        links, index = [], {}
+        for recipe, record in zip(recipes, batch):
+            ids = index[recipe.pk] = []
+            for item in record['ingredients']:
+                ingredient_id = ingredients[item['name']][0]
+                ids.append(ingredient_id)
+                links.append(RecipeIngredient(
+                    recipe_id=recipe.pk,
+                    ingredient_id=ingredient_id,
+                    amount=item['amount'],
+                ))
+        RecipeIngredient.objects.bulk_create(links)
+        index_new_recipes(index)
+        recipes_added(index)
+        # bulk_create не шлет сигналы, ссылки на картинки учитываем сами.
+        for recipe in recipes:
+            acquire(recipe.image.name, recipe.image.storage)
+        return len(recipes)
+
+    def _store_image(self, image_record, decoded, stored):
+        if decoded is not None:
+            content, extension = decoded
+            name = default_storage.save(
+                f'{IMAGE_DIR}{uuid.uuid4().hex}.{extension}',
+                ContentFile(content),
+            )
+            stored.append(name)
+            return name
+        name = image_record.get('name')
+        if name and default_storage.exists(name):
+            return name
+        return None
+
+    def _resolve_authors(self, records):
+        """Возвращает {email: id}, создавая недостающих пользователей."""
+        people = {record['author']['email']: record['author']
+                  for record in records}
+        found = dict(User.objects.filter(
+            email__in=people.keys()
+        ).values_list('email', 'id'))
+        missing = []
+        taken = set(User.objects.filter(username__in={
+            data['username'] for email, data in people.items()
+            if email not in found
+        }).values_list('username', flat=True))
+        for email, data in people.items():
+            if email in found:
+                continue
+            username = self._free_username(data['username'], taken)
+            taken.add(username)
+            user = User(
+                email=email,
+                username=username,
+                first_name=data['first_name'],
+                last_name=data['last_name'],
+            )
+            user.set_unusable_password()
+            missing.append(user)
+        if missing:
+            User.objects.bulk_create(missing)
+            found.update(User.objects.filter(
+                email__in=[user.email for user in missing]
+            ).values_list('email', 'id'))
+        return found
+
+    def _free_username(self, username, taken):
+        """
+        username, занятый другим пользователем (с другим email), получает
+        суффикс: cook -> cook-2, cook-3...
+        """
+        if username not in taken:
+            return username
+        taken.update(User.objects.filter(
+            username__startswith=f'{username[:140]}-'
+        ).values_list('username', flat=True))
+        suffix = 2
+        while True:
+            candidate = f'{username[:140]}-{suffix}'
+            if candidate not in taken:
+                return candidate
+            suffix += 1
+
+    def _units_match(self, record, ingredients):
+        """
+        Название ингредиента уникально: рецепт, где ингредиент указан
+        в другой единице измерения, пропускается с предупреждением.
+        """
+        for item in record['ingredients']:
+            unit = ingredients[item['name']][1]
+            if unit != item['measurement_unit']:
+                self.stdout.write(self.style.WARNING(
+                    f'Skipped "{record["name"]}" '
+                    f'({record["author"]["email"]}): ingredient '
+                    f'"{item["name"]}" is measured in "{unit}", '
+                    f'not "{item["measurement_unit"]}".'
+                ))
+                return False
+        return True
+
+    def _resolve_ingredients(self, records):
+        """
+        Возвращает {название: (id, единица)}, создавая недостающие
+        ингредиенты. Новый ингредиент получает единицу из первого
+        рецепта пачки, где он встретился.
+        """
+        wanted = {}
+        for record in records:
+            for item in record['ingredients']:
+                wanted.setdefault(item['name'], item['measurement_unit'])
+        found = {
+            name: (pk, unit)
+            for pk, name, unit in Ingredient.objects.filter(
+                name__in=wanted.keys()
+            ).values_list('id', 'name', 'measurement_unit')
+        }
+        missing = [
+            Ingredient(name=name, measurement_unit=unit)
+            for name, unit in wanted.items() if name not in found
+        ]
+        if missing:
+            Ingredient.objects.bulk_create(missing)
+            self.new_ingredients += len(missing)
+            found.update(
+                (name, (pk, unit))
+                for pk, name, unit in Ingredient.objects.filter(
+                    name__in={item.name for item in missing}
+                ).values_list('id', 'name', 'measurement_unit')
+            )
+        return found
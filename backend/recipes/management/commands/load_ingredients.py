@@ -2,6 +2,7 @@ import json
 import os
 from django.core.management.base import BaseCommand
 from django.conf import settings
+from recipes.catalog import build_snapshot
 from recipes.models import Ingredient
 
 
@@ -58,6 +59,7 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS('No new ingredients to load.'))
             if skipped_count > 0:
                 self.stdout.write(self.style.WARNING(f'Skipped {skipped_count} items (invalid or existing).'))
+            self._build_snapshot()
             return
 
         try:
@@ -70,4 +72,22 @@ class Command(BaseCommand):
                 self.stdout.write(self.style.WARNING(f'Skipped {skipped_count} items (invalid or existing).'))
 
         except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Error during bulk create: {e}'))
\ No newline at end of file
+            self.stdout.write(
+                self.style.ERROR(f'Error during bulk create: {e}')
+            )
+            return
+
+        self._build_snapshot()
+
+    def _build_snapshot(self):
+        try:
+            manifest = build_snapshot()
+        except OSError as e:
+            self.stdout.write(self.style.ERROR(
+                f'Error writing catalog snapshot: {e}'
+            ))
+            return
+        self.stdout.write(self.style.SUCCESS(
+            f'Ingredient catalog snapshot: {manifest["url"]} '
+            f'({manifest["count"]} items)'
+        ))
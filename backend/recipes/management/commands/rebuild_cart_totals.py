@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from recipes.cart import rebuild_totals
+
+
+class Command(BaseCommand):
+    help = 'Recalculates per-user shopping cart totals from ShoppingCart'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='Only rebuild totals of the given user id (repeatable)',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding shopping cart totals...')
+        written = rebuild_totals(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully wrote {written} shopping cart total rows.'
+        ))
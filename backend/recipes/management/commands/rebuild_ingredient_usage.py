@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from recipes.usage import rebuild_usage_counts
+
+
+class Command(BaseCommand):
+    help = ('Reconciles Ingredient.usage_count with RecipeIngredient '
+            '(run periodically, e.g. from cron)')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Recalculating ingredient usage counts...')
+        updated = rebuild_usage_counts()
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully updated {updated} ingredients.'
+        ))
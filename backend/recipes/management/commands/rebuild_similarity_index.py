@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from recipes.similarity import rebuild_index
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds MinHash/LSH index used for similar recipes lookup'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of recipes written per bulk insert',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rebuilding similar recipes index...')
+        indexed = rebuild_index(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Successfully indexed {indexed} recipes.'
+        ))
@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-19 08:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeMinHash',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='minhash', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('signature', models.JSONField(verbose_name='Сигнатура')),
+            ],
+            options={
+                'verbose_name': 'MinHash-сигнатура рецепта',
+                'verbose_name_plural': 'MinHash-сигнатуры рецептов',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeLSHBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.BigIntegerField(db_index=True, verbose_name='Хеш корзины')),
+                ('recipe', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lsh_buckets', to='recipes.recipe', verbose_name='Рецепт')),
+            ],
+            options={
+                'verbose_name': 'LSH-корзина рецепта',
+                'verbose_name_plural': 'LSH-корзины рецептов',
+            },
+        ),
+    ]
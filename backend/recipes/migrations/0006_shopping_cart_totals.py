@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-19 08:57
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_filter_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UnitConversion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('unit', models.CharField(max_length=64, unique=True, verbose_name='Единица измерения')),
+                ('base_unit', models.CharField(max_length=64, verbose_name='Базовая единица')),
+                ('factor', models.DecimalField(decimal_places=4, help_text='Сколько базовых единиц в одной единице измерения', max_digits=12, verbose_name='Множитель')),
+            ],
+            options={
+                'verbose_name': 'Перевод единиц измерения',
+                'verbose_name_plural': 'Переводы единиц измерения',
+                'ordering': ('unit',),
+            },
+        ),
+        migrations.CreateModel(
+            name='ShoppingCartTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.DecimalField(decimal_places=3, max_digits=14, verbose_name='Количество')),
+                ('measurement_unit', models.CharField(max_length=64, verbose_name='Единица измерения')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Итог списка покупок',
+                'verbose_name_plural': 'Итоги списков покупок',
+                'constraints': [models.UniqueConstraint(fields=('user', 'ingredient'), name='unique_user_shopping_cart_total')],
+            },
+        ),
+    ]
@@ -0,0 +1,66 @@
+from decimal import Decimal
+
+from django.db import migrations
+
+UNIT_CONVERSIONS = (
+    ('кг', 'г', Decimal('1000')),
+    ('мг', 'г', Decimal('0.001')),
+    ('л', 'мл', Decimal('1000')),
+    ('стакан', 'мл', Decimal('250')),
+    ('ст. л.', 'мл', Decimal('15')),
+    ('ч. л.', 'мл', Decimal('5')),
+    ('капля', 'мл', Decimal('0.05')),
+)
+
+
+def fill_unit_conversions(apps, schema_editor):
+    UnitConversion = apps.get_model('recipes', 'UnitConversion')
+    UnitConversion.objects.bulk_create([
+        UnitConversion(unit=unit, base_unit=base_unit, factor=factor)
+        for unit, base_unit, factor in UNIT_CONVERSIONS
+    ], ignore_conflicts=True)
+
+
+def fill_cart_totals(apps, schema_editor):
+    UnitConversion = apps.get_model('recipes', 'UnitConversion')
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    conversions = {
+        unit: (base_unit, factor)
+        for unit, base_unit, factor in UnitConversion.objects.values_list(
+            'unit', 'base_unit', 'factor'
+        )
+    }
+    rows = ShoppingCart.objects.filter(
+        recipe__recipe_ingredients__isnull=False
+    ).values_list(
+        'user_id',
+        'recipe__recipe_ingredients__ingredient_id',
+        'recipe__recipe_ingredients__amount',
+        'recipe__recipe_ingredients__ingredient__measurement_unit',
+    )
+    totals = {}
+    for user_id, ingredient_id, amount, unit in rows:
+        base_unit, factor = conversions.get(unit, (unit, Decimal(1)))
+        key = (user_id, ingredient_id)
+        value = totals.get(key, (Decimal(0), base_unit))[0]
+        totals[key] = (value + amount * factor, base_unit)
+    ShoppingCartTotal.objects.bulk_create([
+        ShoppingCartTotal(
+            user_id=user_id, ingredient_id=ingredient_id,
+            amount=amount, measurement_unit=unit,
+        )
+        for (user_id, ingredient_id), (amount, unit) in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_shopping_cart_totals'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_unit_conversions, migrations.RunPython.noop),
+        migrations.RunPython(fill_cart_totals, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2 on 2026-10-19 09:14
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_usage_count(apps, schema_editor):
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    counts = RecipeIngredient.objects.filter(
+        ingredient=OuterRef('pk')
+    ).order_by().values('ingredient').annotate(
+        total=Count('id')
+    ).values('total')
+    Ingredient.objects.update(usage_count=Coalesce(Subquery(counts), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0008_short_links'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='usage_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='Используется в рецептах'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['-usage_count', 'name'], name='ingredient_usage_name'),
+        ),
+        migrations.RunPython(fill_usage_count, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2 on 2026-10-19 09:19
+
+from django.conf import settings
+from django.db import migrations, models
+
+from api.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции.
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0009_ingredient_usage_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='favorite',
+            index=models.Index(fields=['recipe', 'user'], name='favorite_recipe_user'),
+        ),
+        AddIndexConcurrently(
+            model_name='favorite',
+            index=models.Index(fields=['user', '-added_at'], name='favorite_user_added_at'),
+        ),
+        AddIndexConcurrently(
+            model_name='ingredient',
+            index=models.Index(fields=['name'], name='ingredient_name_prefix', opclasses=['varchar_pattern_ops']),
+        ),
+        AddIndexConcurrently(
+            model_name='shoppingcart',
+            index=models.Index(fields=['recipe', 'user'], name='shoppingcart_recipe_user'),
+        ),
+        AddIndexConcurrently(
+            model_name='shoppingcart',
+            index=models.Index(fields=['user', '-added_at'], name='shoppingcart_user_added_at'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 5.2 on 2026-10-19 09:32
+
+import hashlib
+import re
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 1000
+_SEPARATORS = re.compile(r'[\W_]+')
+
+
+# Копии функций recipes.duplicates на момент миграции: миграция не должна
+# меняться вместе с кодом приложения.
+def _digest(value):
+    return hashlib.blake2b(value.encode(), digest_size=16).hexdigest()
+
+
+def name_fingerprint(name):
+    name = name.casefold().replace('ё', 'е')
+    return _digest(' '.join(_SEPARATORS.sub(' ', name).split()))
+
+
+def ingredients_fingerprint(amounts):
+    return _digest(';'.join(
+        f'{ingredient_id}:{amount}'
+        for ingredient_id, amount in sorted(amounts)
+    ))
+
+
+def fill_fingerprints(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeIngredient = apps.get_model('recipes', 'RecipeIngredient')
+    ids = list(Recipe.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(ids), BATCH_SIZE):
+        batch = ids[start:start + BATCH_SIZE]
+        amounts = defaultdict(list)
+        for recipe_id, ingredient_id, amount in (
+            RecipeIngredient.objects.filter(recipe_id__in=batch)
+            .values_list('recipe_id', 'ingredient_id', 'amount')
+        ):
+            amounts[recipe_id].append((ingredient_id, amount))
+        recipes = list(Recipe.objects.filter(pk__in=batch).only('pk', 'name'))
+        for recipe in recipes:
+            recipe.ingredients_fingerprint = ingredients_fingerprint(
+                amounts[recipe.pk]
+            )
+            recipe.name_fingerprint = name_fingerprint(recipe.name)
+        Recipe.objects.bulk_update(
+            recipes, ['ingredients_fingerprint', 'name_fingerprint']
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_concurrent_hot_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='ingredients_fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=32, verbose_name='Отпечаток ингредиентов'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='name_fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=32, verbose_name='Отпечаток названия'),
+        ),
+        migrations.RunPython(fill_fingerprints, migrations.RunPython.noop),
+    ]
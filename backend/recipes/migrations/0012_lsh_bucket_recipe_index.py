@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-19 10:05
+
+from django.db import migrations, models
+
+from api.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции.
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0011_recipe_fingerprints'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipelshbucket',
+            index=models.Index(fields=['bucket', '-recipe'], name='lshbucket_bucket_recipe'),
+        ),
+    ]
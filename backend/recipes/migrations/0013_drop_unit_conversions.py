@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-19 09:43
+
+from django.db import migrations
+
+
+def rebuild_cart_totals(apps, schema_editor):
+    """ Итоги хранились в базовых единицах - пересчитываем в исходных. """
+    ShoppingCart = apps.get_model('recipes', 'ShoppingCart')
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    rows = ShoppingCart.objects.filter(
+        recipe__recipe_ingredients__isnull=False
+    ).values_list(
+        'user_id',
+        'recipe__recipe_ingredients__ingredient_id',
+        'recipe__recipe_ingredients__amount',
+    )
+    totals = {}
+    for user_id, ingredient_id, amount in rows:
+        key = (user_id, ingredient_id)
+        totals[key] = totals.get(key, 0) + amount
+    ShoppingCartTotal.objects.all().delete()
+    ShoppingCartTotal.objects.bulk_create([
+        ShoppingCartTotal(
+            user_id=user_id, ingredient_id=ingredient_id, amount=amount
+        )
+        for (user_id, ingredient_id), amount in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_lsh_bucket_recipe_index'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='UnitConversion',
+        ),
+        migrations.RemoveField(
+            model_name='shoppingcarttotal',
+            name='measurement_unit',
+        ),
+        migrations.RunPython(rebuild_cart_totals, migrations.RunPython.noop),
+    ]
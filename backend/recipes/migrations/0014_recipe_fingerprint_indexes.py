@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-19 14:10
+
+from django.db import migrations, models
+
+from api.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции.
+    atomic = False
+
+    dependencies = [
+        ('recipes', '0013_drop_unit_conversions'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['ingredients_fingerprint'], name='recipe_ingredients_fp'),
+        ),
+        AddIndexConcurrently(
+            model_name='recipe',
+            index=models.Index(fields=['author', 'name_fingerprint'], name='recipe_author_name_fp'),
+        ),
+    ]
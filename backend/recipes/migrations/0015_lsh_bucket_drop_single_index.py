@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-19 10:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0014_recipe_fingerprint_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='recipelshbucket',
+            name='bucket',
+            field=models.BigIntegerField(verbose_name='Хеш корзины'),
+        ),
+    ]
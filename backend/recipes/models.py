@@ -19,11 +19,28 @@ class Ingredient(models.Model):
         _('Единица измерения'),
         max_length=64,
     )
+    usage_count = models.PositiveIntegerField(
+        _('Используется в рецептах'),
+        default=0,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = _('Ингредиент')
         verbose_name_plural = _('Ингредиенты')
         ordering = ('name',)
+        indexes = [
+            models.Index(
+                fields=['-usage_count', 'name'], name='ingredient_usage_name'
+            ),
+            # Поиск по началу названия (name__startswith -> LIKE 'x%'):
+            # индекс unique использует правила сортировки локали и для
+            # LIKE не подходит.
+            models.Index(
+                fields=['name'], name='ingredient_name_prefix',
+                opclasses=['varchar_pattern_ops'],
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
@@ -66,6 +83,24 @@ class Recipe(models.Model):
         ],
         help_text=_('Укажите время в минутах')
     )
+    ingredients_count = models.PositiveIntegerField(
+        _('Количество ингредиентов'),
+        default=0,
+        editable=False,
+    )
+    # Отпечатки для поиска дубликатов (см. recipes.duplicates).
+    ingredients_fingerprint = models.CharField(
+        _('Отпечаток ингредиентов'),
+        max_length=32,
+        blank=True,
+        editable=False,
+    )
+    name_fingerprint = models.CharField(
+        _('Отпечаток названия'),
+        max_length=32,
+        blank=True,
+        editable=False,
+    )
     pub_date = models.DateTimeField(
         _('Дата публикации'),
         auto_now_add=True,
@@ -76,6 +111,23 @@ class Recipe(models.Model):
         verbose_name = _('Рецепт')
         verbose_name_plural = _('Рецепты')
         ordering = ('-pub_date',)
+        indexes = [
+            models.Index(
+                fields=['author', '-pub_date'], name='recipe_author_pub_date'
+            ),
+            models.Index(
+                fields=['cooking_time', '-pub_date'],
+                name='recipe_cooking_time_pub_date'
+            ),
+            models.Index(
+                fields=['ingredients_fingerprint'],
+                name='recipe_ingredients_fp'
+            ),
+            models.Index(
+                fields=['author', 'name_fingerprint'],
+                name='recipe_author_name_fp'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name} (Автор: {self.author.username})'
@@ -113,6 +165,12 @@ class RecipeIngredient(models.Model):
                 fields=['recipe', 'ingredient'], name='unique_recipe_ingredient'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['ingredient', 'recipe'],
+                name='recipeingredient_ingr_recipe'
+            ),
+        ]
 
     def __str__(self):
         return (f'{self.ingredient.name} - {self.amount} '
@@ -148,6 +206,14 @@ class Favorite(models.Model):
                 fields=['user', 'recipe'], name='unique_user_favorite_recipe'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'], name='favorite_recipe_user'
+            ),
+            models.Index(
+                fields=['user', '-added_at'], name='favorite_user_added_at'
+            ),
+        ]
         ordering = ('-added_at',)
 
     def __str__(self):
@@ -183,7 +249,133 @@ class ShoppingCart(models.Model):
                 fields=['user', 'recipe'], name='unique_user_shopping_cart_recipe'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'], name='shoppingcart_recipe_user'
+            ),
+            models.Index(
+                fields=['user', '-added_at'], name='shoppingcart_user_added_at'
+            ),
+        ]
         ordering = ('-added_at',)
 
     def __str__(self):
-        return f'"{self.recipe.name}" в списке покупок у {self.user.username}'
\ No newline at end of file
+        return f'"{self.recipe.name}" в списке покупок у {self.user.username}'
+
+
+class RecipeMinHash(models.Model):
+    """
+    MinHash-сигнатура набора ингредиентов рецепта.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='minhash',
+        verbose_name=_('Рецепт'),
+    )
+    signature = models.JSONField(_('Сигнатура'))
+
+    class Meta:
+        verbose_name = _('MinHash-сигнатура рецепта')
+        verbose_name_plural = _('MinHash-сигнатуры рецептов')
+
+    def __str__(self):
+        return f'MinHash рецепта {self.recipe_id}'
+
+
+class RecipeLSHBucket(models.Model):
+    """
+    LSH-корзина: рецепты с совпадающей полосой сигнатуры попадают
+    в одну корзину и считаются кандидатами в похожие.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='lsh_buckets',
+        verbose_name=_('Рецепт'),
+    )
+    # Отдельный индекс не нужен: bucket - первая колонка
+    # составного индекса lshbucket_bucket_recipe.
+    bucket = models.BigIntegerField(_('Хеш корзины'))
+
+    class Meta:
+        verbose_name = _('LSH-корзина рецепта')
+        verbose_name_plural = _('LSH-корзины рецептов')
+        indexes = [
+            models.Index(
+                fields=['bucket', '-recipe'], name='lshbucket_bucket_recipe'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id} -> {self.bucket}'
+
+
+class ShoppingCartTotal(models.Model):
+    """
+    Суммарное количество ингредиента в списке покупок пользователя.
+    Поддерживается инкрементально (см. recipes.cart).
+    """
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name=_('Пользователь'),
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name=_('Ингредиент'),
+    )
+    amount = models.DecimalField(
+        _('Количество'),
+        max_digits=14,
+        decimal_places=3,
+    )
+
+    class Meta:
+        verbose_name = _('Итог списка покупок')
+        verbose_name_plural = _('Итоги списков покупок')
+        constraints = [
+            UniqueConstraint(
+                fields=['user', 'ingredient'],
+                name='unique_user_shopping_cart_total'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.ingredient_id}: {self.amount} у {self.user_id}'
+
+
+class ShortLink(models.Model):
+    """
+    Короткая ссылка на рецепт: base62-код и счетчик переходов.
+    """
+    code = models.CharField(
+        _('Код'),
+        max_length=16,
+        unique=True,
+    )
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='short_link',
+        verbose_name=_('Рецепт'),
+    )
+    clicks = models.PositiveBigIntegerField(
+        _('Переходов'),
+        default=0,
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name=_('Дата создания')
+    )
+
+    class Meta:
+        verbose_name = _('Короткая ссылка')
+        verbose_name_plural = _('Короткие ссылки')
+
+    def __str__(self):
+        return f'/s/{self.code} -> {self.recipe_id}'
@@ -0,0 +1,59 @@
+from api.fast import FieldPlan, ReadContext, column
+from users.readers import USER_PLAN, subscribed_author_ids
+from . import fragments
+from .models import Favorite, ShoppingCart
+from .serializers import RecipeIngredientSerializer, RecipeReadSerializer
+
+INGREDIENT_PLAN = FieldPlan(RecipeIngredientSerializer, {
+    'id': column('ingredient_id'),
+    'name': column('ingredient__name'),
+    'measurement_unit': column('ingredient__measurement_unit'),
+    'amount': column('amount'),
+})
+
+RECIPE_PLAN = FieldPlan(RecipeReadSerializer, {
+    'id': column('id'),
+    'author': lambda row, context: context.authors[row['author_id']],
+    'ingredients': column('ingredients'),
+    'is_favorited': lambda row, context: row['id'] in context.favorited,
+    'is_in_shopping_cart': (
+        lambda row, context: row['id'] in context.in_shopping_cart
+    ),
+    'name': column('name'),
+    'image': lambda row, context: context.file_url(row['image']),
+    'text': column('text'),
+    'cooking_time': column('cooking_time'),
+})
+
+
+def _user_recipe_ids(model, user, recipe_ids):
+    if user is None or not user.is_authenticated or not recipe_ids:
+        return set()
+    return set(model.objects.filter(
+        user=user, recipe_id__in=recipe_ids
+    ).values_list('recipe_id', flat=True))
+
+
+def read_recipes(recipe_ids, request):
+    """
+    Быстрый аналог RecipeReadSerializer(..., many=True).data для рецептов
+    recipe_ids (в том же порядке; несуществующие пропускаются).
+    Общие части берутся из кеша фрагментов (см. fragments), флаги
+    пользователя - тремя запросами по id страницы.
+    """
+    recipe_ids = list(recipe_ids)
+    context = ReadContext(request)
+    rows = fragments.recipe_rows(recipe_ids)
+    rows = [rows[pk] for pk in recipe_ids if pk in rows]
+    author_ids = list({row['author_id'] for row in rows})
+
+    context.subscribed = subscribed_author_ids(context.user, author_ids)
+    context.favorited = _user_recipe_ids(Favorite, context.user, recipe_ids)
+    context.in_shopping_cart = _user_recipe_ids(
+        ShoppingCart, context.user, recipe_ids
+    )
+    context.authors = {
+        author_id: USER_PLAN.render(row, context)
+        for author_id, row in fragments.author_rows(author_ids).items()
+    }
+    return RECIPE_PLAN.render_many(rows, context)
@@ -2,7 +2,9 @@ from rest_framework import serializers
 from django.contrib.auth import get_user_model
 from django.db import transaction
 
-from .models import Ingredient, Recipe, RecipeIngredient
+from . import cart, composition, duplicates
+from .models import Ingredient, Recipe, RecipeIngredient, ShoppingCartTotal
+from api.mixins import SparseFieldsetMixin
 from users.serializers import CustomUserSerializer
 
 try:
@@ -23,6 +25,15 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = fields
 
 
+class PopularIngredientSerializer(IngredientSerializer):
+    """
+    Ингредиент с количеством рецептов, в которых он используется.
+    """
+    class Meta(IngredientSerializer.Meta):
+        fields = IngredientSerializer.Meta.fields + ('usage_count',)
+        read_only_fields = fields
+
+
 class RecipeIngredientSerializer(serializers.ModelSerializer):
     """
     Сериализатор для ингредиентов внутри рецепта (для чтения).
@@ -38,10 +49,21 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+class RecipeReadSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Сериализатор для чтения рецептов (список и детальная страница).
+    Поддерживает ?fields= и ?expand= (см. SparseFieldsetMixin):
+    без expand автор отдается как id, ингредиенты - как список id.
     """
+    collapsed_fields = {
+        'author': lambda: serializers.PrimaryKeyRelatedField(read_only=True),
+        'ingredients': lambda: serializers.SlugRelatedField(
+            slug_field='ingredient_id',
+            many=True,
+            read_only=True,
+            source='recipe_ingredients',
+        ),
+    }
     author = CustomUserSerializer(read_only=True)
     ingredients = RecipeIngredientSerializer(
         many=True,
@@ -123,6 +145,7 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
     def _set_ingredients(self, recipe, ingredients_data):
         """ Создает связи RecipeIngredient для рецепта. """
+        old_amounts = cart.recipe_amounts(recipe.pk)
         recipe.recipe_ingredients.all().delete()
         RecipeIngredient.objects.bulk_create([
             RecipeIngredient(
@@ -131,6 +154,10 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
                 amount=item['amount']
             ) for item in ingredients_data
         ])
+        composition.ingredients_changed(recipe, old_amounts, [
+            (item['id'].id, item['amount']) for item in ingredients_data
+        ])
+        self.duplicate_ids = duplicates.find_duplicates(recipe)
 
 
     @transaction.atomic
@@ -170,3 +197,37 @@ class RecipeMinifiedSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ('id', 'name', 'image', 'cooking_time')
         read_only_fields = fields
+
+
+class CookableRecipeSerializer(RecipeMinifiedSerializer):
+    """
+    Рецепт в выдаче поиска по имеющимся ингредиентам.
+    """
+    matched_count = serializers.IntegerField(read_only=True)
+    missing_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeMinifiedSerializer.Meta):
+        fields = RecipeMinifiedSerializer.Meta.fields + (
+            'matched_count', 'missing_count',
+        )
+        read_only_fields = fields
+
+
+class ShoppingCartTotalSerializer(serializers.ModelSerializer):
+    """
+    Итоговое количество ингредиента в списке покупок.
+    """
+    id = serializers.ReadOnlyField(source='ingredient.id')
+    name = serializers.ReadOnlyField(source='ingredient.name')
+    measurement_unit = serializers.ReadOnlyField(
+        source='ingredient.measurement_unit'
+    )
+    amount = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ShoppingCartTotal
+        fields = ('id', 'name', 'measurement_unit', 'amount')
+        read_only_fields = fields
+
+    def get_amount(self, obj):
+        return cart.format_amount(obj.amount)
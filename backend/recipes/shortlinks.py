@@ -0,0 +1,160 @@
+"""
+Короткие ссылки на рецепты.
+
+Код - это id рецепта в base62. Соответствие код -> адрес кешируется,
+поэтому редирект не обращается к БД. Переходы копятся в памяти процесса
+и сбрасываются в БД пачками: фоновым потоком раз в FLUSH_INTERVAL секунд
+(поток запускается в каждом процессе при первом переходе, в том числе
+после fork), сразу при накоплении FLUSH_THRESHOLD переходов и при
+выходе процесса. Если процесс убит (SIGKILL, OOM), теряются переходы
+не больше чем за FLUSH_INTERVAL секунд.
+"""
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import F
+
+from .models import ShortLink
+
+ALPHABET = '0123456789abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+BASE = len(ALPHABET)
+CACHE_PREFIX = 'short-link:'
+CACHE_TIMEOUT = 60 * 60 * 24
+FLUSH_INTERVAL = 30
+FLUSH_THRESHOLD = 500
+
+logger = logging.getLogger(__name__)
+
+_clicks = Counter()
+_clicks_lock = threading.Lock()
+_flusher = {'pid': None, 'lock': threading.Lock()}
+
+
+def encode(number):
+    """Кодирует неотрицательное целое в base62."""
+    if number == 0:
+        return ALPHABET[0]
+    digits = []
+    while number:
+        number, remainder = divmod(number, BASE)
+        digits.append(ALPHABET[remainder])
+    return ''.join(reversed(digits))
+
+
+def decode(code):
+    """Декодирует base62-строку в целое. ValueError при неверном коде."""
+    number = 0
+    for char in code:
+        index = ALPHABET.find(char)
+        if index < 0:
+            raise ValueError(f'Недопустимый символ в коде: {char!r}')
+        number = number * BASE + index
+    return number
+
+
+def recipe_path(recipe_id):
+    """Адрес страницы рецепта во фронтенде."""
+    return f'/recipes/{recipe_id}'
+
+
+def get_or_create_code(recipe_id):
+    """Возвращает код короткой ссылки, создавая ее при необходимости."""
+    code = encode(recipe_id)
+    ShortLink.objects.get_or_create(
+        recipe_id=recipe_id, defaults={'code': code}
+    )
+    cache.set(CACHE_PREFIX + code, recipe_path(recipe_id), CACHE_TIMEOUT)
+    return code
+
+
+def resolve(code):
+    """Возвращает адрес для кода или None, если ссылки нет."""
+    key = CACHE_PREFIX + code
+    path = cache.get(key)
+    if path is None:
+        recipe_id = ShortLink.objects.filter(code=code).values_list(
+            'recipe_id', flat=True
+        ).first()
+        if recipe_id is None:
+            return None
+        path = recipe_path(recipe_id)
+        cache.set(key, path, CACHE_TIMEOUT)
+    return path
+
+
+def forget(code):
+    """Удаляет код из кеша (при удалении ссылки)."""
+    cache.delete(CACHE_PREFIX + code)
+
+
+def register_click(code):
+    """Учитывает переход по ссылке в буфере процесса."""
+    _ensure_flusher()
+    with _clicks_lock:
+        _clicks[code] += 1
+        due = sum(_clicks.values()) >= FLUSH_THRESHOLD
+    if due:
+        flush_clicks()
+
+
+def flush_clicks():
+    """
+    Сбрасывает накопленные переходы в БД одной транзакцией. Если запись
+    не удалась, переходы возвращаются в буфер до следующего сброса.
+    """
+    with _clicks_lock:
+        pending = Counter(_clicks)
+        _clicks.clear()
+    if not pending:
+        return
+    try:
+        with transaction.atomic():
+            for code, count in sorted(pending.items()):
+                ShortLink.objects.filter(code=code).update(
+                    clicks=F('clicks') + count
+                )
+    except BaseException:
+        with _clicks_lock:
+            _clicks.update(pending)
+        raise
+
+
+def _flush_periodically():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        try:
+            flush_clicks()
+        except Exception:
+            logger.exception('Не удалось сохранить переходы по ссылкам')
+        finally:
+            # Соединение потока не должно висеть между сбросами.
+            connection.close()
+
+
+def _ensure_flusher():
+    """Запускает поток периодического сброса в текущем процессе."""
+    if _flusher['pid'] == os.getpid():
+        return
+    with _flusher['lock']:
+        if _flusher['pid'] == os.getpid():
+            return
+        _flusher['pid'] = os.getpid()
+        threading.Thread(
+            target=_flush_periodically, name='short-link-clicks', daemon=True
+        ).start()
+
+
+def _flush_at_exit():
+    try:
+        flush_clicks()
+    except Exception:
+        pass
+
+
+atexit.register(_flush_at_exit)
@@ -0,0 +1,71 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from . import cart, fragments, shortlinks, usage
+from .models import (
+    Ingredient, Recipe, RecipeIngredient, ShoppingCart, ShortLink
+)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_added(sender, instance, created, **kwargs):
+    """ Добавляет ингредиенты рецепта в итоги списка покупок. """
+    if created:
+        cart.add_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_removed(sender, instance, **kwargs):
+    """
+    Вычитает ингредиенты рецепта из итогов списка покупок.
+    pre_delete срабатывает и при каскадном удалении рецепта, пока его
+    строки RecipeIngredient еще существуют.
+    """
+    cart.remove_recipe(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """ Уменьшает счетчики использования ингредиентов рецепта. """
+    usage.ingredients_changed(
+        instance.recipe_ingredients.values_list('ingredient_id', flat=True),
+        ()
+    )
+
+
+@receiver(post_delete, sender=ShortLink)
+def short_link_deleted(sender, instance, **kwargs):
+    """ Убирает удаленную ссылку из кеша редиректов. """
+    shortlinks.forget(instance.code)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(sender, instance, **kwargs):
+    """ Сбрасывает кешированный фрагмент рецепта. """
+    fragments.forget_recipes([instance.pk])
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(sender, instance, **kwargs):
+    """ Правка состава напрямую (например, в админке). """
+    fragments.forget_recipes([instance.recipe_id])
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_changed(sender, instance, created, **kwargs):
+    """ Название или единица ингредиента входят во фрагменты рецептов. """
+    if not created:
+        fragments.forget_recipes(
+            RecipeIngredient.objects.filter(
+                ingredient=instance
+            ).values_list('recipe_id', flat=True)
+        )
+
+
+@receiver(post_save, sender=get_user_model())
+def author_changed(sender, instance, **kwargs):
+    """ Сбрасывает кешированную карточку автора. """
+    fragments.forget_user(instance.pk)
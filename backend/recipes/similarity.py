@@ -0,0 +1,196 @@
+"""
+Индекс похожих рецептов на основе MinHash/LSH.
+
+Для каждого рецепта считается MinHash-сигнатура множества его ингредиентов,
+сигнатура режется на полосы, и каждая полоса хешируется в LSH-корзину.
+Рецепты, попавшие хотя бы в одну общую корзину, считаются кандидатами;
+итоговое сходство оценивается по доле совпадающих значений сигнатур.
+Из каждой корзины берется не больше MAX_BUCKET_POSTINGS самых новых
+рецептов (индекс bucket, -recipe), поэтому стоимость поиска ограничена
+BANDS * MAX_BUCKET_POSTINGS строками и не растет с наполнением корзин.
+"""
+import hashlib
+import random
+
+from collections import Counter
+
+from django.db import connection, transaction
+
+from .models import Recipe, RecipeIngredient, RecipeLSHBucket, RecipeMinHash
+
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+MAX_CANDIDATES = 200
+MAX_BUCKET_POSTINGS = 100
+REBUILD_BATCH_SIZE = 1000
+
+_PRIME = (1 << 61) - 1
+_random = random.Random(20250504)
+_PERMUTATIONS = tuple(
+    (_random.randrange(1, _PRIME), _random.randrange(0, _PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+)
+
+
+def compute_signature(ingredient_ids):
+    """Возвращает MinHash-сигнатуру для набора id ингредиентов."""
+    ids = set(ingredient_ids)
+    if not ids:
+        return [_PRIME] * NUM_PERMUTATIONS
+    return [
+        min((a * x + b) % _PRIME for x in ids)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def band_buckets(signature):
+    """Режет сигнатуру на полосы и возвращает хеш корзины для каждой."""
+    buckets = []
+    for band in range(BANDS):
+        rows = signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND]
+        key = f'{band}:' + ','.join(map(str, rows))
+        digest = hashlib.blake2b(key.encode(), digest_size=8).digest()
+        buckets.append(int.from_bytes(digest, 'big', signed=True))
+    return buckets
+
+
+def estimate_similarity(first, second):
+    """Оценка коэффициента Жаккара по двум сигнатурам."""
+    matches = sum(1 for a, b in zip(first, second) if a == b)
+    return matches / NUM_PERMUTATIONS
+
+
+def _index_objects(recipe_id, ingredient_ids):
+    signature = compute_signature(ingredient_ids)
+    minhash = RecipeMinHash(recipe_id=recipe_id, signature=signature)
+    buckets = [
+        RecipeLSHBucket(recipe_id=recipe_id, bucket=bucket)
+        for bucket in band_buckets(signature)
+    ]
+    return minhash, buckets
+
+
+@transaction.atomic
+def update_recipe_index(recipe, ingredient_ids):
+    """
+    Пересчитывает сигнатуру и корзины одного рецепта.
+    Вызывается при сохранении ингредиентов рецепта.
+    """
+    minhash, buckets = _index_objects(recipe.pk, ingredient_ids)
+    minhash.save()
+    RecipeLSHBucket.objects.filter(recipe_id=recipe.pk).delete()
+    RecipeLSHBucket.objects.bulk_create(buckets)
+
+
+def index_new_recipes(ingredients_by_recipe):
+    """
+    Индексирует пачку новых рецептов: {recipe_id: [ingredient_id, ...]}.
+    Используется при массовом импорте вместо update_recipe_index.
+    """
+    minhashes, buckets = [], []
+    for recipe_id, ingredient_ids in ingredients_by_recipe.items():
+        minhash, recipe_buckets = _index_objects(recipe_id, ingredient_ids)
+        minhashes.append(minhash)
+        buckets.extend(recipe_buckets)
+    RecipeMinHash.objects.bulk_create(minhashes)
+    RecipeLSHBucket.objects.bulk_create(buckets)
+
+
+@transaction.atomic
+def rebuild_index(batch_size=REBUILD_BATCH_SIZE):
+    """
+    Полностью перестраивает индекс по таблице RecipeIngredient.
+    Возвращает количество проиндексированных рецептов.
+    """
+    RecipeLSHBucket.objects.all().delete()
+    RecipeMinHash.objects.all().delete()
+
+    rows = RecipeIngredient.objects.order_by('recipe_id').values_list(
+        'recipe_id', 'ingredient_id'
+    ).iterator(chunk_size=batch_size)
+
+    minhashes, buckets = [], []
+    indexed = 0
+    current_id, current_ingredients = None, []
+
+    def flush(force=False):
+        if minhashes and (force or len(minhashes) >= batch_size):
+            RecipeMinHash.objects.bulk_create(minhashes)
+            RecipeLSHBucket.objects.bulk_create(buckets)
+            minhashes.clear()
+            buckets.clear()
+
+    for recipe_id, ingredient_id in rows:
+        if recipe_id != current_id and current_id is not None:
+            minhash, recipe_buckets = _index_objects(
+                current_id, current_ingredients
+            )
+            minhashes.append(minhash)
+            buckets.extend(recipe_buckets)
+            indexed += 1
+            current_ingredients = []
+            flush()
+        current_id = recipe_id
+        current_ingredients.append(ingredient_id)
+
+    if current_id is not None:
+        minhash, recipe_buckets = _index_objects(
+            current_id, current_ingredients
+        )
+        minhashes.append(minhash)
+        buckets.extend(recipe_buckets)
+        indexed += 1
+    flush(force=True)
+    return indexed
+
+
+def _bucket_postings(buckets, recipe_id):
+    """
+    id рецептов из корзин buckets: по MAX_BUCKET_POSTINGS самых новых
+    из каждой. На PostgreSQL - один UNION ALL, иначе запрос на корзину.
+    """
+    querysets = [
+        RecipeLSHBucket.objects.filter(bucket=bucket).exclude(
+            recipe_id=recipe_id
+        ).order_by('-recipe_id').values_list('recipe_id', flat=True)[
+            :MAX_BUCKET_POSTINGS
+        ]
+        for bucket in buckets
+    ]
+    if connection.features.supports_slicing_ordering_in_compound:
+        return list(querysets[0].union(*querysets[1:], all=True))
+    return [pk for queryset in querysets for pk in queryset]
+
+
+def find_similar(recipe_id, limit=6, min_similarity=0.1):
+    """
+    Возвращает список рецептов, похожих на рецепт recipe_id,
+    отсортированных по убыванию оценки сходства.
+    """
+    signature = RecipeMinHash.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('signature', flat=True).first()
+    if signature is None:
+        return []
+
+    shared = Counter(_bucket_postings(band_buckets(signature), recipe_id))
+    candidate_ids = [
+        candidate_id
+        for candidate_id, _ in shared.most_common(MAX_CANDIDATES)
+    ]
+    if not candidate_ids:
+        return []
+
+    scored = []
+    for candidate_id, candidate_signature in RecipeMinHash.objects.filter(
+        recipe_id__in=candidate_ids
+    ).values_list('recipe_id', 'signature'):
+        score = estimate_similarity(signature, candidate_signature)
+        if score >= min_similarity:
+            scored.append((score, candidate_id))
+    scored.sort(key=lambda item: (-item[0], item[1]))
+    top_ids = [candidate_id for _, candidate_id in scored[:limit]]
+
+    recipes = Recipe.objects.in_bulk(top_ids)
+    return [recipes[pk] for pk in top_ids if pk in recipes]
@@ -1,3 +1,941 @@
-from django.test import TestCase
+import base64
+import datetime
+import io
+import json
+import os
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import OperationalError
+from PIL import Image
+from rest_framework import viewsets
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api import loadtest
+from api.admin import EstimatedCountPaginator
+from api.testing import TemporaryMediaTestCase, ThrottleResetTestCase
+from users.models import Subscription, User
+from . import (
+    cart, catalog, duplicates, fragments, shortlinks, similarity, usage
+)
+from .models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, RecipeMinHash,
+    ShoppingCart, ShoppingCartTotal, ShortLink
+)
+from .views import RecipeViewSet
+
+
+class FastReadPathParityTest(ThrottleResetTestCase):
+    """
+    Быстрый путь списка рецептов должен отдавать те же байты,
+    что RecipeReadSerializer + JSONRenderer.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='reader', email='reader@example.org',
+            first_name='Читатель', last_name='Тестовый',
+        )
+        authors = [
+            User.objects.create(
+                username=f'author{i}', email=f'author{i}@example.org',
+                first_name=f'Автор {i}', last_name='Тестовый',
+                avatar=f'users/avatars/author {i}.png' if i % 2 else None,
+            )
+            for i in range(3)
+        ]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {i}', measurement_unit='г'
+            )
+            for i in range(5)
+        ]
+        for i in range(8):
+            recipe = Recipe.objects.create(
+                author=authors[i % 3],
+                name=f'Рецепт "{i}"  ',
+                image=f'recipes/images/рецепт {i}.png',
+                text=f'Описание {i}\nс переносом',
+                cooking_time=i + 1,
+            )
+            for j, ingredient in enumerate(ingredients[:i % 5 + 1]):
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=j + 1
+                )
+            if i % 2:
+                Favorite.objects.create(user=cls.user, recipe=recipe)
+            if i % 3:
+                ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        Subscription.objects.create(user=cls.user, author=authors[1])
+
+    def setUp(self):
+        super().setUp()
+        caches['fragments'].clear()
+
+    def _compare(self, client, url, action='list'):
+        fast = client.get(url)
+        with mock.patch.object(
+            RecipeViewSet, action, getattr(viewsets.ModelViewSet, action)
+        ), mock.patch.object(
+            RecipeViewSet, 'renderer_classes', (JSONRenderer,)
+        ):
+            slow = client.get(url)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+
+    def test_anonymous_list(self):
+        self._compare(APIClient(), '/api/recipes/?limit=100')
+
+    def test_authenticated_list(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self._compare(client, '/api/recipes/?limit=3&page=2')
+        self._compare(client, '/api/recipes/?is_favorited=1')
+
+    def test_retrieve(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for recipe in Recipe.objects.all()[:3]:
+            self._compare(
+                client, f'/api/recipes/{recipe.pk}/', action='retrieve'
+            )
+        self.assertEqual(client.get('/api/recipes/0/').status_code, 404)
+
+    def test_fragments_invalidated(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = '/api/recipes/?limit=100'
+        client.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.first()
+            recipe.name = 'Новое название'
+            recipe.save()
+            ingredient = Ingredient.objects.first()
+            ingredient.name = 'переименованный ингредиент'
+            ingredient.save()
+            author = User.objects.get(username='author1')
+            author.first_name = 'Переименованный'
+            author.save()
+        self._compare(client, url)
+
+    def test_stale_build_not_cached(self):
+        # Изменение коммитится, пока читатель строит фрагмент по старым
+        # данным: построенное значение не должно читаться после коммита.
+        recipe = Recipe.objects.first()
+        build = fragments._build_recipes
+
+        def build_during_update(recipe_ids):
+            rows = build(recipe_ids)
+            with self.captureOnCommitCallbacks(execute=True):
+                recipe.name = 'Новое название'
+                recipe.save()
+            return rows
+
+        with mock.patch.object(
+            fragments, '_build_recipes', build_during_update
+        ):
+            stale = fragments.recipe_rows([recipe.pk])
+        self.assertNotEqual(stale[recipe.pk]['name'], 'Новое название')
+        self.assertEqual(
+            fragments.recipe_rows([recipe.pk])[recipe.pk]['name'],
+            'Новое название',
+        )
+
+
+class FacetsTest(ThrottleResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create(
+                username=f'author{i}', email=f'author{i}@example.org'
+            )
+            for i in range(3)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'ингредиент {i}', measurement_unit='г'
+            )
+            for i in range(4)
+        ]
+        for i in range(12):
+            recipe = Recipe.objects.create(
+                author=cls.authors[i % 3], name=f'Рецепт {i}',
+                image=f'recipes/images/{i}.png', text='Описание',
+                cooking_time=i * 7 + 1,
+            )
+            for ingredient in cls.ingredients[:i % 4 + 1]:
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=1
+                )
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+
+    def test_counts_match_filters(self):
+        client = APIClient()
+        author = self.authors[1]
+        url = f'/api/recipes/facets/?ingredients={self.ingredients[1].pk}'
+        with self.assertNumQueries(3):
+            data = client.get(url).json()
+        recipes = Recipe.objects.filter(
+            recipe_ingredients__ingredient=self.ingredients[1]
+        )
+        self.assertEqual(data['count'], recipes.count())
+        for bucket in data['cooking_time']:
+            expected = recipes
+            if bucket['min'] is not None:
+                expected = expected.filter(cooking_time__gte=bucket['min'])
+            if bucket['max'] is not None:
+                expected = expected.filter(cooking_time__lte=bucket['max'])
+            self.assertEqual(bucket['count'], expected.count(), bucket)
+        authors = {row['id']: row['count'] for row in data['authors']}
+        self.assertEqual(
+            authors[author.pk], recipes.filter(author=author).count()
+        )
+        ingredients = {row['id']: row['count'] for row in data['ingredients']}
+        self.assertEqual(
+            ingredients[self.ingredients[3].pk],
+            recipes.filter(
+                recipe_ingredients__ingredient=self.ingredients[3]
+            ).count(),
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get(url).json(), data)
+
+    def test_invalid_filter(self):
+        response = APIClient().get('/api/recipes/facets/?author=x')
+        self.assertEqual(response.status_code, 400)
+
+
+class SimilarityTest(ThrottleResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            username='author', email='author@example.org'
+        )
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'продукт {i}', measurement_unit='г'
+            )
+            for i in range(12)
+        ]
+        sets = {
+            'base': range(0, 8),
+            'close': list(range(0, 7)) + [11],
+            'far': range(6, 12),
+        }
+        cls.recipes = {}
+        for name, indexes in sets.items():
+            recipe = Recipe.objects.create(
+                author=author, name=name, image='recipes/images/1.png',
+                text='Описание', cooking_time=1,
+            )
+            ids = [ingredients[index].pk for index in indexes]
+            for ingredient_id in ids:
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient_id=ingredient_id, amount=1
+                )
+            similarity.update_recipe_index(recipe, ids)
+            cls.recipes[name] = recipe
+
+    def test_signature_and_bands(self):
+        first = similarity.compute_signature([3, 1, 2])
+        self.assertEqual(first, similarity.compute_signature([1, 2, 3, 3]))
+        self.assertEqual(len(first), similarity.NUM_PERMUTATIONS)
+        self.assertEqual(similarity.estimate_similarity(first, first), 1)
+        self.assertLess(similarity.estimate_similarity(
+            first, similarity.compute_signature([100, 200, 300])
+        ), 0.2)
+        buckets = similarity.band_buckets(first)
+        self.assertEqual(len(buckets), similarity.BANDS)
+        self.assertEqual(buckets, similarity.band_buckets(list(first)))
+
+    def test_similar_endpoint(self):
+        base = self.recipes['base']
+        data = APIClient().get(f'/api/recipes/{base.pk}/similar/').json()
+        ids = [item['id'] for item in data]
+        self.assertEqual(ids[0], self.recipes['close'].pk)
+        self.assertNotIn(base.pk, ids)
+
+    def test_bucket_postings_capped(self):
+        base = self.recipes['base']
+        buckets = similarity.band_buckets(
+            RecipeMinHash.objects.get(recipe=base).signature
+        )
+        with mock.patch.object(similarity, 'MAX_BUCKET_POSTINGS', 1):
+            postings = similarity._bucket_postings(buckets, base.pk)
+        self.assertLessEqual(len(postings), similarity.BANDS)
+        self.assertIn(self.recipes['close'].pk, postings)
+
+
+class CartTotalsTest(ThrottleResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='user', email='user@example.org'
+        )
+        cls.other = User.objects.create(
+            username='other', email='other@example.org'
+        )
+        cls.salt, cls.sugar, cls.milk = (
+            Ingredient.objects.create(name=name, measurement_unit=unit)
+            for name, unit in (('соль', 'г'), ('сахар', 'г'),
+                               ('молоко', 'мл'))
+        )
+        cls.first = cls.recipe('Первый', {cls.salt: 5, cls.sugar: 100})
+        cls.second = cls.recipe('Второй', {cls.salt: 10, cls.milk: 200})
+
+    @classmethod
+    def recipe(cls, name, amounts):
+        recipe = Recipe.objects.create(
+            author=cls.user, name=name, image='recipes/images/1.png',
+            text='Описание', cooking_time=1,
+        )
+        for ingredient, amount in amounts.items():
+            RecipeIngredient.objects.create(
+                recipe=recipe, ingredient=ingredient, amount=amount
+            )
+        return recipe
+
+    def totals(self, user):
+        return {
+            name: int(amount)
+            for name, amount in ShoppingCartTotal.objects.filter(
+                user=user
+            ).values_list('ingredient__name', 'amount')
+        }
+
+    def test_add_remove_and_edit(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.first)
+        ShoppingCart.objects.create(user=self.user, recipe=self.second)
+        ShoppingCart.objects.create(user=self.other, recipe=self.second)
+        self.assertEqual(
+            self.totals(self.user),
+            {'соль': 15, 'сахар': 100, 'молоко': 200},
+        )
+
+        old_amounts = cart.recipe_amounts(self.second.pk)
+        self.second.recipe_ingredients.filter(ingredient=self.milk).delete()
+        RecipeIngredient.objects.filter(
+            recipe=self.second, ingredient=self.salt
+        ).update(amount=1)
+        RecipeIngredient.objects.create(
+            recipe=self.second, ingredient=self.sugar, amount=50
+        )
+        cart.recipe_ingredients_changed(self.second.pk, old_amounts)
+        self.assertEqual(
+            self.totals(self.user), {'соль': 6, 'сахар': 150}
+        )
+        self.assertEqual(self.totals(self.other), {'соль': 1, 'сахар': 50})
+
+        ShoppingCart.objects.get(user=self.user, recipe=self.first).delete()
+        self.assertEqual(self.totals(self.user), {'соль': 1, 'сахар': 50})
+        users = (self.user, self.other)
+        expected = [self.totals(user) for user in users]
+        cart.rebuild_totals()
+        self.assertEqual([self.totals(user) for user in users], expected)
+
+    def test_apply_deltas_when_row_appears_concurrently(self):
+        # Строку уже вставил параллельный запрос: вставка пропускается,
+        # дельта прибавляется к существующему количеству.
+        ShoppingCartTotal.objects.create(
+            user=self.user, ingredient=self.salt, amount=5
+        )
+        cart.apply_deltas([self.user.pk], {self.salt.pk: 10})
+        self.assertEqual(self.totals(self.user), {'соль': 15})
+        cart.apply_deltas([self.user.pk], {self.salt.pk: -15})
+        self.assertEqual(self.totals(self.user), {})
+
+    def test_preview_and_download(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.second)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(
+            client.get('/api/recipes/shopping_cart_preview/').json(),
+            [
+                {'id': self.milk.pk, 'name': 'молоко',
+                 'measurement_unit': 'мл', 'amount': '200'},
+                {'id': self.salt.pk, 'name': 'соль',
+                 'measurement_unit': 'г', 'amount': '10'},
+            ],
+        )
+        content = client.get(
+            '/api/recipes/download_shopping_cart/'
+        ).content.decode()
+        self.assertIn('• молоко (мл) — 200', content)
+
+
+class ShortLinkTest(ThrottleResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            username='author', email='author@example.org'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', image='recipes/images/1.png',
+            text='Описание', cooking_time=1,
+        )
+
+    def setUp(self):
+        super().setUp()
+        caches['default'].clear()
+        shortlinks.flush_clicks()
+
+    def test_encode_decode(self):
+        for number in (0, 1, 61, 62, 3843, 3844, 2 ** 63):
+            self.assertEqual(
+                shortlinks.decode(shortlinks.encode(number)), number
+            )
+        self.assertEqual(shortlinks.encode(62), '10')
+        self.assertEqual(shortlinks.encode(61), 'Z')
+        with self.assertRaises(ValueError):
+            shortlinks.decode('a-b')
+
+    def test_get_link_redirect_and_clicks(self):
+        client = APIClient()
+        data = client.get(f'/api/recipes/{self.recipe.pk}/get-link/').json()
+        code = shortlinks.encode(self.recipe.pk)
+        self.assertTrue(data['short-link'].endswith(f'/s/{code}'))
+
+        with mock.patch.object(shortlinks, '_ensure_flusher') as flusher:
+            with self.assertNumQueries(0):
+                response = client.get(f'/s/{code}/')
+                client.get(f'/s/{code}')
+        flusher.assert_called()
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response['Location'], f'/recipes/{self.recipe.pk}')
+        self.assertEqual(ShortLink.objects.get(code=code).clicks, 0)
+        shortlinks.flush_clicks()
+        self.assertEqual(ShortLink.objects.get(code=code).clicks, 2)
+
+        self.assertEqual(client.get('/s/zzzz/').status_code, 404)
+
+    def test_failed_flush_keeps_clicks(self):
+        code = shortlinks.get_or_create_code(self.recipe.pk)
+        with mock.patch.object(shortlinks, '_ensure_flusher'):
+            shortlinks.register_click(code)
+        with mock.patch.object(
+            ShortLink.objects, 'filter', side_effect=OperationalError
+        ):
+            with self.assertRaises(OperationalError):
+                shortlinks.flush_clicks()
+        with mock.patch.object(shortlinks, '_ensure_flusher'):
+            shortlinks.register_click(code)
+        shortlinks.flush_clicks()
+        self.assertEqual(ShortLink.objects.get(code=code).clicks, 2)
+
+
+class RecipeFilterTest(ThrottleResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='user', email='user@example.org'
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.user, name=f'Рецепт {i}',
+                image='recipes/images/1.png', text='Описание',
+                cooking_time=i + 1,
+            )
+            for i in range(3)
+        ]
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[0])
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[1])
+
+    def ids(self, query):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        return {
+            item['id']
+            for item in client.get(f'/api/recipes/?{query}').json()['results']
+        }
+
+    def test_user_relation_flags(self):
+        everything = {recipe.pk for recipe in self.recipes}
+        self.assertEqual(self.ids('is_favorited=1'), {self.recipes[0].pk})
+        self.assertEqual(
+            self.ids('is_in_shopping_cart=true'), {self.recipes[1].pk}
+        )
+        for value in ('0', 'false'):
+            self.assertEqual(self.ids(f'is_favorited={value}'), everything)
+            self.assertEqual(
+                self.ids(f'is_in_shopping_cart={value}'), everything
+            )
+
+
+class CookableTest(ThrottleResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create(
+            username='author', email='author@example.org'
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'продукт {i}', measurement_unit='г'
+            )
+            for i in range(5)
+        ]
+        cls.recipes = {}
+        for name, indexes in (('full', (0, 1)), ('one_missing', (0, 1, 2)),
+                              ('two_missing', (0, 3, 4)),
+                              ('small', (0,))):
+            recipe = Recipe.objects.create(
+                author=author, name=name, image='recipes/images/1.png',
+                text='Описание', cooking_time=1,
+                ingredients_count=len(indexes),
+            )
+            for index in indexes:
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=cls.ingredients[index],
+                    amount=1,
+                )
+            cls.recipes[name] = recipe
+
+    def get(self, query):
+        response = APIClient().get(f'/api/recipes/cookable/?{query}')
+        self.assertEqual(response.status_code, 200, response.content)
+        return [
+            (item['name'], item['matched_count'], item['missing_count'])
+            for item in response.json()['results']
+        ]
+
+    def test_max_missing_and_ordering(self):
+        have = f'{self.ingredients[0].pk},{self.ingredients[1].pk}'
+        self.assertEqual(
+            self.get(f'ingredients={have}'),
+            [('full', 2, 0), ('small', 1, 0)],
+        )
+        self.assertEqual(
+            self.get(f'ingredients={have}&max_missing=1'),
+            [('full', 2, 0), ('small', 1, 0), ('one_missing', 2, 1)],
+        )
+        self.assertEqual(
+            [row[0] for row in self.get(f'ingredients={have}&max_missing=2')],
+            ['full', 'small', 'one_missing', 'two_missing'],
+        )
+
+    def test_invalid_and_too_many(self):
+        client = APIClient()
+        self.assertEqual(
+            client.get('/api/recipes/cookable/').status_code, 400
+        )
+        self.assertEqual(
+            client.get('/api/recipes/cookable/?ingredients=x').status_code,
+            400,
+        )
+        ids = ','.join(map(str, range(1, 52)))
+        response = client.get(f'/api/recipes/cookable/?ingredients={ids}')
+        self.assertEqual(response.status_code, 400)
+
+
+class SparseFieldsetTest(ThrottleResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='sparse', email='sparse@example.org',
+            first_name='Автор', last_name='Тестовый',
+        )
+        cls.ingredient = Ingredient.objects.create(
+            name='мука', measurement_unit='г'
+        )
+        cls.recipe = Recipe.objects.create(
+            author=cls.author, name='Блины', image='recipes/images/b.png',
+            text='Описание', cooking_time=10,
+        )
+        RecipeIngredient.objects.create(
+            recipe=cls.recipe, ingredient=cls.ingredient, amount=200
+        )
+
+    def test_fields(self):
+        response = APIClient().get('/api/recipes/?fields=id,name')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.json()['results'],
+            [{'id': self.recipe.pk, 'name': 'Блины'}],
+        )
+
+    def test_collapsed_without_expand(self):
+        response = APIClient().get(
+            f'/api/recipes/{self.recipe.pk}/?fields=id,author,ingredients'
+        )
+        self.assertEqual(response.json(), {
+            'id': self.recipe.pk,
+            'author': self.author.pk,
+            'ingredients': [self.ingredient.pk],
+        })
+
+    def test_expand(self):
+        response = APIClient().get(
+            f'/api/recipes/{self.recipe.pk}/'
+            '?fields=id,author,ingredients&expand=author,ingredients'
+        )
+        data = response.json()
+        self.assertEqual(data['author']['username'], 'sparse')
+        self.assertEqual(data['ingredients'][0]['amount'], 200)
+        self.assertEqual(data['ingredients'][0]['name'], 'мука')
+
+    def test_nested_serializer_ignores_fields(self):
+        response = APIClient().get(
+            f'/api/recipes/{self.recipe.pk}/?fields=author&expand=author'
+        )
+        self.assertIn('email', response.json()['author'])
+
+    def test_users(self):
+        response = APIClient().get('/api/users/?fields=id,username')
+        self.assertEqual(
+            response.json()['results'],
+            [{'id': self.author.pk, 'username': 'sparse'}],
+        )
+
+
+class AdminChangelistTest(ThrottleResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(
+            username='admin', email='admin@example.org',
+            is_staff=True, is_superuser=True,
+        )
+        cls.recipes = [
+            Recipe.objects.create(
+                author=cls.admin, name=f'Рецепт {i}', text='Описание',
+                image='recipes/images/r.png', cooking_time=5,
+            )
+            for i in range(3)
+        ]
+        Favorite.objects.create(user=cls.admin, recipe=cls.recipes[0])
+
+    def _paginator(self, queryset, vendor, row):
+        cursor = mock.MagicMock()
+        cursor.fetchone.return_value = row
+        db = mock.MagicMock(vendor=vendor)
+        db.cursor.return_value.__enter__.return_value = cursor
+        paginator = EstimatedCountPaginator(queryset, 10)
+        with mock.patch('api.admin.connections', {'default': db}):
+            return paginator.count, cursor
+
+    def test_exact_count_outside_postgresql(self):
+        count, cursor = self._paginator(Recipe.objects.all(), 'sqlite', None)
+        self.assertEqual(count, 3)
+        cursor.execute.assert_not_called()
+
+    def test_reltuples_estimate(self):
+        count, cursor = self._paginator(
+            Recipe.objects.all(), 'postgresql', (2000000,)
+        )
+        self.assertEqual(count, 2000000)
+        self.assertIn('pg_class', cursor.execute.call_args[0][0])
+
+    def test_explain_estimate_for_filtered_list(self):
+        count, cursor = self._paginator(
+            Recipe.objects.filter(cooking_time=5), 'postgresql',
+            ('[{"Plan": {"Plan Rows": 50000}}]',),
+        )
+        self.assertEqual(count, 50000)
+        self.assertTrue(
+            cursor.execute.call_args[0][0].startswith('EXPLAIN')
+        )
+
+    def test_small_estimate_counts_exactly(self):
+        count, _ = self._paginator(
+            Recipe.objects.all(), 'postgresql', (100,)
+        )
+        self.assertEqual(count, 3)
+
+    def test_inline_save_updates_derived_data(self):
+        salt = Ingredient.objects.create(name='соль', measurement_unit='г')
+        recipe = self.recipes[1]
+        prefix = 'recipe_ingredients'
+        self.client.force_login(self.admin)
+        response = self.client.post(
+            f'/admin/recipes/recipe/{recipe.pk}/change/', {
+                'author': self.admin.pk, 'name': recipe.name,
+                'text': recipe.text, 'cooking_time': 5,
+                f'{prefix}-TOTAL_FORMS': 1, f'{prefix}-INITIAL_FORMS': 0,
+                f'{prefix}-MIN_NUM_FORMS': 1, f'{prefix}-MAX_NUM_FORMS': 1000,
+                f'{prefix}-0-ingredient': salt.pk, f'{prefix}-0-amount': 3,
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        recipe.refresh_from_db()
+        self.assertEqual(recipe.ingredients_count, 1)
+        self.assertEqual(
+            recipe.ingredients_fingerprint,
+            duplicates.ingredients_fingerprint([(salt.pk, 3)]),
+        )
+        salt.refresh_from_db()
+        self.assertEqual(salt.usage_count, 1)
+        self.assertTrue(
+            RecipeMinHash.objects.filter(recipe=recipe).exists()
+        )
+
+    def test_recipe_changelist(self):
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            f'/admin/recipes/recipe/?author__id__exact={self.admin.pk}'
+        )
+        self.assertEqual(response.status_code, 200)
+        counts = {
+            recipe.pk: recipe.favorite_count
+            for recipe in response.context['cl'].result_list
+        }
+        self.assertEqual(counts, {
+            self.recipes[0].pk: 1,
+            self.recipes[1].pk: 0,
+            self.recipes[2].pk: 0,
+        })
+
+
+class IngredientUsageTest(ThrottleResetTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create(
+            username='usage', email='usage@example.org'
+        )
+        cls.salt, cls.flour, cls.sugar = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('соль', 'мука', 'сахар')
+        )
+        cls.recipes = []
+        for ingredients in ((cls.salt, cls.flour), (cls.salt,)):
+            recipe = Recipe.objects.create(
+                author=cls.author, name='Рецепт', text='Описание',
+                image='recipes/images/r.png', cooking_time=5,
+            )
+            for ingredient in ingredients:
+                RecipeIngredient.objects.create(
+                    recipe=recipe, ingredient=ingredient, amount=1
+                )
+            cls.recipes.append(recipe)
+        usage.rebuild_usage_counts()
+
+    def _names(self, url):
+        return [item['name'] for item in APIClient().get(url).json()]
+
+    def test_ranking(self):
+        self.assertEqual(
+            self._names('/api/ingredients/'), ['соль', 'мука', 'сахар']
+        )
+        response = APIClient().get('/api/ingredients/popular/?limit=5')
+        self.assertEqual(
+            [(item['name'], item['usage_count']) for item in response.json()],
+            [('соль', 2), ('мука', 1)],
+        )
+        self.assertEqual(
+            self._names('/api/ingredients/popular/?name=му'), ['мука']
+        )
+
+    def test_deltas(self):
+        usage.ingredients_changed(
+            [self.salt.pk, self.flour.pk], [self.flour.pk, self.sugar.pk]
+        )
+        usage.recipes_added({0: [self.sugar.pk, self.sugar.pk]})
+        # сахар 2, мука и соль по 1 - при равенстве по названию.
+        self.assertEqual(
+            self._names('/api/ingredients/'), ['сахар', 'мука', 'соль']
+        )
+        self.recipes[1].delete()
+        usage.ingredients_changed([self.salt.pk], [])
+        self.salt.refresh_from_db()
+        self.assertEqual(self.salt.usage_count, 0)
+
+    def test_rebuild(self):
+        Ingredient.objects.update(usage_count=7)
+        self.assertEqual(usage.rebuild_usage_counts(), 3)
+        self.assertEqual(
+            dict(Ingredient.objects.values_list('name', 'usage_count')),
+            {'соль': 2, 'мука': 1, 'сахар': 0},
+        )
+
+
+class ImportRecipesTest(TemporaryMediaTestCase):
+    def setUp(self):
+        super().setUp()
+        buffer = io.BytesIO()
+        Image.new('RGB', (1, 1)).save(buffer, 'PNG')
+        self.image = base64.b64encode(buffer.getvalue()).decode()
+
+    def _record(self, name, email='cook@example.org', username='cook',
+                ingredient='шафран', unit='г'):
+        return {
+            'author': {
+                'email': email, 'username': username,
+                'first_name': 'Повар', 'last_name': 'Тестовый',
+            },
+            'name': name,
+            'text': 'Описание',
+            'cooking_time': 15,
+            'pub_date': '2020-01-02T03:04:05+00:00',
+            'image': {'name': 'recipes/images/old.png', 'data': self.image},
+            'ingredients': [
+                {'name': ingredient, 'measurement_unit': unit, 'amount': 1},
+            ],
+        }
+
+    def _import(self, *records):
+        path = os.path.join(self.media, 'recipes.jsonl')
+        with open(path, 'w', encoding='utf-8') as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + '\n')
+        stdout = io.StringIO()
+        call_command('import_recipes', path, '--workers', '1', stdout=stdout)
+        return stdout.getvalue()
+
+    def test_new_ingredients_rebuild_catalog(self):
+        self._import(self._record('Плов'))
+        recipe = Recipe.objects.get(name='Плов')
+        self.assertEqual(
+            recipe.pub_date,
+            datetime.datetime(2020, 1, 2, 3, 4, 5, tzinfo=datetime.UTC),
+        )
+        with open(os.path.join(
+            self.media, catalog.CATALOG_DIR, catalog.MANIFEST_NAME
+        )) as f:
+            self.assertEqual(json.load(f)['count'], 1)
+
+    def test_pub_date_field_not_mutated(self):
+        self._import(self._record('Плов'))
+        self.assertTrue(Recipe._meta.get_field('pub_date').auto_now_add)
+
+    def test_username_taken_by_other_email(self):
+        User.objects.create(username='cook', email='other@example.org')
+        User.objects.create(username='cook-2', email='third@example.org')
+        self._import(
+            self._record('Плов'),
+            self._record('Борщ', email='second@example.org'),
+        )
+        self.assertEqual(
+            User.objects.get(email='cook@example.org').username, 'cook-3'
+        )
+        self.assertEqual(
+            User.objects.get(email='second@example.org').username, 'cook-4'
+        )
+
+    def test_unit_mismatch_skips_record(self):
+        Ingredient.objects.create(name='соль', measurement_unit='г')
+        output = self._import(
+            self._record('Плов', ingredient='соль', unit='щепотка'),
+            self._record('Борщ', ingredient='соль'),
+            self._record('Суп', ingredient='укроп', unit='пучок'),
+            self._record('Салат', ingredient='укроп', unit='г'),
+        )
+        self.assertEqual(
+            set(Recipe.objects.values_list('name', flat=True)),
+            {'Борщ', 'Суп'},
+        )
+        self.assertEqual(
+            Ingredient.objects.get(name='укроп').measurement_unit, 'пучок'
+        )
+        self.assertIn('"соль" is measured in "г", not "щепотка"', output)
+        self.assertIn('"укроп" is measured in "пучок", not "г"', output)
+        self.assertIn('skipped 2 already present or invalid', output)
+
+    def test_rollback_removes_written_images(self):
+        images = os.path.join(self.media, 'recipes', 'images')
+        shared = default_storage.save(
+            'recipes/images/shared.png',
+            ContentFile(base64.b64decode(self.image)),
+        )
+        Recipe.objects.create(
+            author=User.objects.create(username='u', email='u@example.org'),
+            name='Старый', text='Описание', image=shared, cooking_time=5,
+        )
+        buffer = io.BytesIO()
+        Image.new('RGB', (2, 2)).save(buffer, 'PNG')
+        record = self._record('Борщ')
+        record['image']['data'] = base64.b64encode(buffer.getvalue()).decode()
+        with mock.patch(
+            'recipes.management.commands.import_recipes.recipes_added',
+            side_effect=RuntimeError,
+        ), self.assertRaises(RuntimeError):
+            self._import(self._record('Плов'), record)
+        self.assertEqual(Recipe.objects.count(), 1)
+        self.assertEqual(
+            [files for _, _, files in os.walk(images) if files],
+            [[os.path.basename(shared)]],
+        )
+
+
+class DuplicateRecipesTest(ThrottleResetTestCase):
+    IMAGE = 'data:image/png;base64,' + base64.b64encode(loadtest.PNG).decode()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = User.objects.create(
+            username='first', email='first@example.org'
+        )
+        cls.second = User.objects.create(
+            username='second', email='second@example.org'
+        )
+        cls.ingredients = [
+            Ingredient.objects.create(
+                name=f'продукт {i}', measurement_unit='г'
+            )
+            for i in range(3)
+        ]
+
+    def post(self, user, name, amounts):
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post('/api/recipes/', {
+            'name': name, 'text': 'Описание', 'cooking_time': 10,
+            'image': self.IMAGE,
+            'ingredients': [
+                {'id': self.ingredients[index].pk, 'amount': amount}
+                for index, amount in amounts
+            ],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.content)
+        return response
+
+    def test_fingerprints_and_write_warning(self):
+        original = self.post(self.first, 'Омлёт с сыром', [(0, 2), (1, 50)])
+        self.assertNotIn('X-Duplicate-Recipes', original)
+        recipe = Recipe.objects.get(pk=original.json()['id'])
+        self.assertEqual(
+            recipe.name_fingerprint,
+            duplicates.name_fingerprint('  омлет, с   СЫРОМ! '),
+        )
+
+        same_ingredients = self.post(
+            self.second, 'Другое название', [(1, 50), (0, 2)]
+        )
+        self.assertEqual(
+            same_ingredients['X-Duplicate-Recipes'], str(recipe.pk)
+        )
+        self.assertTrue(same_ingredients['Warning'].startswith('199 '))
+
+        other_amounts = self.post(self.second, 'Омлет с сыром', [(0, 3)])
+        self.assertNotIn('X-Duplicate-Recipes', other_amounts)
+        same_name = self.post(self.first, 'омлет с сыром', [(2, 1)])
+        self.assertEqual(same_name['X-Duplicate-Recipes'], str(recipe.pk))
+
+    def test_duplicate_groups_report(self):
+        first = self.post(self.first, 'Каша', [(0, 1), (1, 1)]).json()['id']
+        second = self.post(self.second, 'каша', [(1, 1), (0, 1)]).json()['id']
+        third = self.post(self.second, 'Суп', [(1, 1), (0, 1)]).json()['id']
+        self.post(self.first, 'Салат', [(2, 1)])
+        with self.assertNumQueries(1):
+            groups = duplicates.duplicate_groups()
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(
+            [recipe.pk for recipe in groups[0]['recipes']],
+            [first, second, third],
+        )
+        self.assertFalse(groups[0]['same_name'])
+
+        admin = User.objects.create(
+            username='admin', email='admin@example.org',
+            is_staff=True, is_superuser=True,
+        )
+        self.client.force_login(admin)
+        response = self.client.get('/admin/recipes/recipe/duplicates/')
+        self.assertContains(response, 'Суп')
+        self.assertContains(
+            self.client.get('/admin/recipes/recipe/'),
+            '/admin/recipes/recipe/duplicates/',
+        )
@@ -0,0 +1,9 @@
+from django.urls import re_path
+
+from .views import short_link_redirect
+
+
+urlpatterns = [
+    re_path(r'^(?P<code>[0-9a-zA-Z]+)/?$', short_link_redirect,
+            name='short-link'),
+]
@@ -0,0 +1,62 @@
+"""
+Счетчики использования ингредиентов в рецептах (Ingredient.usage_count).
+
+Счетчики меняются на дельту при записи и удалении рецептов, поэтому
+сортировка ингредиентов по популярности не агрегирует RecipeIngredient
+на каждый запрос. Расхождения (правка RecipeIngredient напрямую, сбои)
+исправляет периодический rebuild_usage_counts.
+"""
+from collections import Counter, defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Ingredient, RecipeIngredient
+
+
+def apply_deltas(deltas):
+    """
+    Прибавляет дельты {ingredient_id: дельта} к счетчикам.
+    Один UPDATE на каждое различное значение дельты.
+    """
+    by_delta = defaultdict(list)
+    for ingredient_id, delta in deltas.items():
+        if delta:
+            by_delta[delta].append(ingredient_id)
+    for delta, ingredient_ids in by_delta.items():
+        queryset = Ingredient.objects.filter(pk__in=ingredient_ids)
+        if delta < 0:
+            queryset = queryset.filter(usage_count__gte=-delta)
+        queryset.update(usage_count=F('usage_count') + delta)
+
+
+def ingredients_changed(old_ids, new_ids):
+    """Учитывает смену состава одного рецепта."""
+    old_ids, new_ids = set(old_ids), set(new_ids)
+    deltas = dict.fromkeys(new_ids - old_ids, 1)
+    deltas.update(dict.fromkeys(old_ids - new_ids, -1))
+    apply_deltas(deltas)
+
+
+def recipes_added(ingredient_ids_by_recipe):
+    """Учитывает пачку новых рецептов: {recipe_id: [ingredient_id, ...]}."""
+    apply_deltas(Counter(
+        ingredient_id
+        for ingredient_ids in ingredient_ids_by_recipe.values()
+        for ingredient_id in set(ingredient_ids)
+    ))
+
+
+def rebuild_usage_counts():
+    """
+    Пересчитывает все счетчики одним UPDATE по RecipeIngredient.
+    Возвращает количество обновленных ингредиентов.
+    """
+    counts = RecipeIngredient.objects.filter(
+        ingredient=OuterRef('pk')
+    ).order_by().values('ingredient').annotate(
+        total=Count('id')
+    ).values('total')
+    return Ingredient.objects.update(
+        usage_count=Coalesce(Subquery(counts), 0)
+    )
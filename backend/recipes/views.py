@@ -1,21 +1,37 @@
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
+from django_filters.utils import translate_validation
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
-from django.db.models import Exists, OuterRef, Value, BooleanField, Sum
-from django.http import HttpResponse
+from django.db.models import (
+    Exists, OuterRef, Value, BooleanField, Count, F, Prefetch
+)
+from django.http import Http404, HttpResponse, HttpResponseRedirect
+
+from api.mixins import MultiGetMixin, get_query_list
+from api.renderers import FastJSONRenderer
 
+from .cart import format_amount
 from .models import (
     Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart
 )
+
 from .permissions import IsAuthorOrAdminOrReadOnly
+from .readers import read_recipes
 from .serializers import (
-    IngredientSerializer, RecipeMinifiedSerializer, RecipeReadSerializer,
-    RecipeWriteSerializer
+    CookableRecipeSerializer, IngredientSerializer,
+    PopularIngredientSerializer, RecipeMinifiedSerializer,
+    RecipeReadSerializer, RecipeWriteSerializer, ShoppingCartTotalSerializer
 )
+from . import shortlinks
+from . import duplicates as recipe_duplicates
+from . import facets as recipe_facets
+from .catalog import current_manifest
 from .filters import IngredientFilter, RecipeFilter
+from .similarity import find_similar
 
 
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
@@ -23,19 +39,54 @@ class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     ViewSet для просмотра ингредиентов.
     Предоставляет только list и retrieve (GET запросы).
     Поддерживает фильтрацию по ?name=...
+    Популярные ингредиенты (по usage_count) идут первыми.
     """
-    queryset = Ingredient.objects.all().order_by('name')
+    POPULAR_LIMIT = 10
+    POPULAR_MAX_LIMIT = 100
+
+    queryset = Ingredient.objects.all().order_by('-usage_count', 'name')
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
 
+    @action(detail=False, methods=['get'])
+    def catalog(self, request):
+        """
+        Версия и адрес статического снимка полного каталога.
+        Сам снимок отдается nginx, минуя Django.
+        """
+        manifest = current_manifest()
+        return Response({
+            'version': manifest['version'],
+            'url': request.build_absolute_uri(manifest['url']),
+            'count': manifest['count'],
+        }, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def popular(self, request):
+        """
+        Самые используемые ингредиенты (?limit=, по умолчанию 10).
+        Учитывает фильтр ?name=.
+        """
+        try:
+            limit = int(request.query_params.get('limit', self.POPULAR_LIMIT))
+        except ValueError:
+            limit = self.POPULAR_LIMIT
+        limit = min(max(limit, 1), self.POPULAR_MAX_LIMIT)
+        queryset = self.filter_queryset(self.get_queryset()).filter(
+            usage_count__gt=0
+        )[:limit]
+        serializer = PopularIngredientSerializer(queryset, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
 
-class RecipeViewSet(viewsets.ModelViewSet):
+class RecipeViewSet(MultiGetMixin, viewsets.ModelViewSet):
     """
     ViewSet для управления Рецептами.
-    Поддерживает CRUD, фильтрацию, добавление в избранное/корзину.
+    Поддерживает CRUD, фильтрацию, добавление в избранное/корзину
+    и выборку нескольких рецептов по ?ids=.
     """
     queryset = Recipe.objects.select_related('author').prefetch_related(
         'recipe_ingredients__ingredient',
@@ -43,6 +94,47 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    SPARSE_COLUMNS = {'name', 'image', 'text', 'cooking_time'}
+    COOKABLE_MAX_INGREDIENTS = 50
+    COOKABLE_MAX_MISSING = 10
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+    read_many = staticmethod(read_recipes)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Список рецептов через быстрый путь: из БД берутся только id
+        страницы, остальное - из кеша фрагментов (см. readers).
+        С ?fields= используется обычный сериализатор.
+        """
+        if 'ids' in request.query_params:
+            return self.multi_get(request)
+        if get_query_list(request, 'fields'):
+            return super().list(request, *args, **kwargs)
+        # Базовый queryset без аннотаций Exists: флаги пользователя
+        # считаются отдельно по id страницы.
+        queryset = self.filter_queryset(super().get_queryset()).select_related(
+            None
+        ).prefetch_related(None).values_list('id', flat=True)
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(read_recipes(page, request))
+        return Response(read_recipes(queryset, request))
+
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Рецепт через быстрый путь (кеш фрагментов).
+        С ?fields= используется обычный сериализатор.
+        """
+        if get_query_list(request, 'fields'):
+            return super().retrieve(request, *args, **kwargs)
+        try:
+            pk = int(kwargs[self.lookup_url_kwarg or self.lookup_field])
+        except ValueError:
+            raise Http404
+        data = read_recipes([pk], request)
+        if not data:
+            raise Http404
+        return Response(data[0])
 
     def get_serializer_class(self):
         """ Выбираем сериализатор в зависимости от действия. """
@@ -53,15 +145,14 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         queryset = super().get_queryset()
         user = self.request.user
+        fields = set()
+        if self.action in ('list', 'retrieve'):
+            fields = get_query_list(self.request, 'fields')
+            if fields:
+                queryset = self._sparse_queryset(queryset, fields)
 
-        if user.is_authenticated:
-            is_favorited_param = self.request.query_params.get('is_favorited')
-            if is_favorited_param is not None and is_favorited_param.lower() in ['1', 'true']:
-                queryset = queryset.filter(favorited_by__user=user)
-
-            is_in_shopping_cart_param = self.request.query_params.get('is_in_shopping_cart')
-            if is_in_shopping_cart_param is not None and is_in_shopping_cart_param.lower() in ['1', 'true']:
-                queryset = queryset.filter(in_shopping_carts__user=user)
+        if fields and not fields & {'is_favorited', 'is_in_shopping_cart'}:
+            return queryset
 
         if user.is_authenticated:
             queryset = queryset.annotate(
@@ -79,11 +170,42 @@ class RecipeViewSet(viewsets.ModelViewSet):
             )
         return queryset
 
+    def _sparse_queryset(self, queryset, fields):
+        """
+        Подгоняет queryset под ?fields= и ?expand=: загружает только
+        нужные колонки и не делает join/prefetch для ненужных связей.
+        """
+        expand = get_query_list(self.request, 'expand')
+        queryset = queryset.select_related(None).prefetch_related(None)
+        columns = {'id'} | (fields & self.SPARSE_COLUMNS)
+
+        if 'author' in fields:
+            columns.add('author')
+            if 'author' in expand:
+                queryset = queryset.select_related('author')
+
+        if 'ingredients' in fields:
+            if 'ingredients' in expand:
+                queryset = queryset.prefetch_related(
+                    'recipe_ingredients__ingredient'
+                )
+            else:
+                queryset = queryset.prefetch_related(Prefetch(
+                    'recipe_ingredients',
+                    queryset=RecipeIngredient.objects.only(
+                        'id', 'recipe_id', 'ingredient_id'
+                    )
+                ))
+        return queryset.only(*columns)
+
     def get_permissions(self):
         """ Определяем права доступа в зависимости от действия. """
-        if self.action in ('list', 'retrieve'):
+        if self.action in ('list', 'retrieve', 'similar', 'cookable',
+                           'facets'):
             permission_classes = [AllowAny]
-        elif self.action in ('create', 'favorite', 'shopping_cart', 'download_shopping_cart'):
+        elif self.action in ('create', 'favorite', 'shopping_cart',
+                             'download_shopping_cart',
+                             'shopping_cart_preview'):
             permission_classes = [IsAuthenticated]
         else:
             permission_classes = [IsAuthorOrAdminOrReadOnly]
@@ -92,6 +214,23 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         """ Устанавливаем автора при создании рецепта. """
         serializer.save(author=self.request.user)
+        self.duplicate_ids = serializer.duplicate_ids
+
+    def perform_update(self, serializer):
+        serializer.save()
+        self.duplicate_ids = serializer.duplicate_ids
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        """ Предупреждение о возможных дубликатах после записи. """
+        response = super().finalize_response(
+            request, response, *args, **kwargs
+        )
+        if getattr(self, 'duplicate_ids', None):
+            for header, value in recipe_duplicates.warning_headers(
+                self.duplicate_ids
+            ).items():
+                response[header] = value
+        return response
 
     def _add_or_remove_relation(self, request, pk, related_model, error_messages):
         """
@@ -159,30 +298,23 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def download_shopping_cart(self, request):
         """
         Возвращает TXT-файл со списком покупок для пользователя.
-        Ингредиенты агрегируются по названию и единице измерения.
+        Количества берутся из итогов, поддерживаемых инкрементально.
         """
-        user = request.user
+        totals = list(request.user.shopping_cart_totals.select_related(
+            'ingredient'
+        ).order_by('ingredient__name'))
 
-        if not user.shopping_cart.exists():
+        if not totals:
              return Response(
                  {"errors": "Список покупок пуст."},
                  status=status.HTTP_400_BAD_REQUEST
              )
 
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__in_shopping_carts__user=user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(
-            total_amount=Sum('amount')
-        ).order_by('ingredient__name')
-
         shopping_list_content = "Список покупок для Foodgram:\n\n"
-        for item in ingredients:
-            name = item['ingredient__name']
-            unit = item['ingredient__measurement_unit']
-            amount = item['total_amount']
+        for item in totals:
+            name = item.ingredient.name
+            unit = item.ingredient.measurement_unit
+            amount = format_amount(item.amount)
             shopping_list_content += f"• {name} ({unit}) — {amount}\n"
 
         filename = 'shopping_list.txt'
@@ -194,6 +326,21 @@ class RecipeViewSet(viewsets.ModelViewSet):
 
         return response
 
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_cart_preview(self, request):
+        """
+        Итоги списка покупок в JSON (без формирования файла).
+        """
+        totals = request.user.shopping_cart_totals.select_related(
+            'ingredient'
+        ).order_by('ingredient__name')
+        serializer = ShoppingCartTotalSerializer(totals, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
     @action(
         detail=True,
         methods=['get'],
@@ -202,8 +349,139 @@ class RecipeViewSet(viewsets.ModelViewSet):
     )
     def get_link(self, request, pk=None):
         """
-        Возвращает короткую ссылку на рецепт (в данном случае просто ID).
+        Возвращает короткую ссылку на рецепт вида /s/<base62-код>.
+        """
+        recipe = get_object_or_404(Recipe.objects.only('pk'), pk=pk)
+        code = shortlinks.get_or_create_code(recipe.pk)
+        short_link_data = {
+            'short-link': request.build_absolute_uri(f'/s/{code}')
+        }
+        return Response(short_link_data, status=status.HTTP_200_OK)
+
+    @action(
+        detail=True,
+        methods=['get'],
+        permission_classes=[AllowAny]
+    )
+    def similar(self, request, pk=None):
+        """
+        Возвращает рецепты с похожим набором ингредиентов.
+        Кандидаты берутся из LSH-индекса, размер ответа задается ?limit=.
+        """
+        recipe = get_object_or_404(Recipe, pk=pk)
+        try:
+            limit = int(request.query_params.get('limit', 6))
+        except (TypeError, ValueError):
+            limit = 6
+        limit = min(max(limit, 1), 50)
+
+        recipes = find_similar(recipe.pk, limit=limit)
+        serializer = RecipeMinifiedSerializer(
+            recipes, many=True, context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[AllowAny]
+    )
+    def cookable(self, request):
+        """
+        Поиск рецептов по имеющимся ингредиентам.
+        ?ingredients=1,2,3 - id имеющихся ингредиентов
+        (не больше COOKABLE_MAX_INGREDIENTS),
+        ?max_missing=K - сколько ингредиентов может не хватать
+        (по умолчанию 0, не больше COOKABLE_MAX_MISSING).
+        Рецепты ранжируются по числу недостающих, затем совпавших
+        ингредиентов.
+
+        Стоимость: по одному проходу индекса (ingredient, recipe) на
+        ингредиент и GROUP BY по всем найденным связям, то есть она
+        пропорциональна суммарной популярности переданных ингредиентов
+        (соль или сахар встречаются почти во всех рецептах). Поэтому
+        число ингредиентов и K ограничены, а рецепты, у которых
+        ингредиентов больше, чем len(ingredients) + K, отсекаются
+        по ingredients_count до группировки.
         """
-        recipe = self.get_object()
-        short_link_data = {'short-link': str(recipe.pk)}
-        return Response(short_link_data, status=status.HTTP_200_OK)
\ No newline at end of file
+        raw_ids = []
+        for value in request.query_params.getlist('ingredients'):
+            raw_ids.extend(part for part in value.split(',') if part.strip())
+        try:
+            ingredient_ids = {int(value) for value in raw_ids}
+            max_missing = int(request.query_params.get('max_missing', 0))
+        except (TypeError, ValueError):
+            return Response(
+                {'errors': 'Параметры ingredients и max_missing '
+                           'должны быть целыми числами.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not ingredient_ids:
+            return Response(
+                {'errors': 'Укажите хотя бы один ингредиент.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(ingredient_ids) > self.COOKABLE_MAX_INGREDIENTS:
+            return Response(
+                {'errors': 'Можно указать не больше '
+                           f'{self.COOKABLE_MAX_INGREDIENTS} ингредиентов.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        max_missing = min(max(max_missing, 0), self.COOKABLE_MAX_MISSING)
+
+        queryset = Recipe.objects.filter(
+            ingredients_count__lte=len(ingredient_ids) + max_missing,
+            recipe_ingredients__ingredient_id__in=ingredient_ids,
+        ).annotate(
+            matched_count=Count('recipe_ingredients')
+        ).annotate(
+            missing_count=F('ingredients_count') - F('matched_count')
+        ).filter(
+            missing_count__lte=max_missing
+        ).order_by('missing_count', '-matched_count', '-pub_date')
+
+        page = self.paginate_queryset(queryset)
+        serializer = CookableRecipeSerializer(
+            page if page is not None else queryset,
+            many=True,
+            context={'request': request}
+        )
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['get'])
+    def facets(self, request):
+        """
+        Счетчики для вариантов фильтров при текущих параметрах фильтра:
+        корзины времени приготовления, авторы и ингредиенты
+        (?facet_limit= - сколько авторов и ингредиентов, по умолчанию 10).
+        """
+        filterset = RecipeFilter(
+            request.query_params, queryset=Recipe.objects.all(),
+            request=request
+        )
+        if not filterset.is_valid():
+            raise translate_validation(filterset.errors)
+        try:
+            limit = int(request.query_params.get(
+                'facet_limit', recipe_facets.DEFAULT_LIMIT
+            ))
+        except ValueError:
+            limit = recipe_facets.DEFAULT_LIMIT
+        limit = min(max(limit, 1), recipe_facets.MAX_LIMIT)
+        return Response(
+            recipe_facets.facets(filterset, limit), status=status.HTTP_200_OK
+        )
+
+
+def short_link_redirect(request, code):
+    """
+    Редирект по короткой ссылке. Обычная Django-view без DRF:
+    адрес берется из кеша, переход учитывается в буфере процесса.
+    """
+    path = shortlinks.resolve(code)
+    if path is None:
+        raise Http404('Короткая ссылка не найдена.')
+    shortlinks.register_click(code)
+    return HttpResponseRedirect(path)
@@ -1,14 +1,26 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from api.admin import AutocompleteFilter, LargeTableAdminMixin, count_subquery
+from recipes.models import Recipe
 from .models import User, Subscription
 
+class SubscriberFilter(AutocompleteFilter):
+    title = 'подписчику'
+    field_name = 'user'
+
+
+class AuthorFilter(AutocompleteFilter):
+    title = 'автору'
+    field_name = 'author'
+
+
 @admin.register(User)
-class UserAdmin(BaseUserAdmin):
+class UserAdmin(LargeTableAdminMixin, BaseUserAdmin):
     list_display = (
         'id', 'username', 'email', 'first_name', 'last_name',
         'is_staff', 'get_recipes_count', 'get_follower_count'
     )
-    list_filter = ('email', 'username', 'first_name', 'last_name')
+    list_filter = ('is_staff', 'is_active')
     search_fields = ('email', 'username')
     ordering = ('username',)
     fieldsets = (
@@ -20,17 +32,27 @@ class UserAdmin(BaseUserAdmin):
     )
     readonly_fields = ('last_login', 'date_joined')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_count=count_subquery(Recipe.objects.all(), 'author'),
+            follower_count=count_subquery(
+                Subscription.objects.all(), 'author'
+            ),
+        )
+
     @admin.display(description='Кол-во рецептов')
     def get_recipes_count(self, obj):
-        return obj.recipes.count()
+        return obj.recipes_count
 
     @admin.display(description='Кол-во подписчиков')
     def get_follower_count(self, obj):
-        return obj.following.count()
+        return obj.follower_count
 
 @admin.register(Subscription)
-class SubscriptionAdmin(admin.ModelAdmin):
+class SubscriptionAdmin(LargeTableAdminMixin, admin.ModelAdmin):
     list_display = ('id', 'user', 'author', 'created_at')
+    list_select_related = ('user', 'author')
     search_fields = ('user__username', 'user__email', 'author__username', 'author__email')
-    list_filter = ('created_at',)
-    ordering = ('-created_at',)
\ No newline at end of file
+    list_filter = (SubscriberFilter, AuthorFilter, 'created_at')
+    ordering = ('-id',)
+    autocomplete_fields = ('user', 'author')
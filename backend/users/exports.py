@@ -0,0 +1,286 @@
+"""
+Выгрузка данных пользователя в ZIP-архив.
+
+Архив собирается потоково: zipfile пишет в несмещаемый буфер, который
+опустошается после каждой порции, строки БД читаются через iterator(),
+картинки копируются из MEDIA_ROOT блоками. Поэтому расход памяти не
+зависит от объема данных. Небольшие выгрузки отдаются сразу
+(StreamingHttpResponse), крупные пишутся в файл в фоновом потоке
+(см. DataExport), а клиент опрашивает статус и скачивает готовый архив.
+Очередь живет в памяти процесса: выгрузка, оставшаяся в pending/running
+дольше STALE_SECONDS (воркер перезапустили), помечается как failed,
+и пользователь может запустить новую.
+"""
+import json
+import logging
+import os
+import time
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+
+from recipes.models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+
+from .models import DataExport, Subscription
+
+logger = logging.getLogger(__name__)
+
+EXPORTS_DIR = 'exports'
+CHUNK_SIZE = 64 * 1024
+ROWS_CHUNK_SIZE = 500
+SYNC_MAX_RECIPES = 100
+KEEP_SECONDS = 60 * 60 * 24
+STALE_SECONDS = 60 * 60 * 2
+
+_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='export')
+
+
+class _Sink:
+    """
+    Несмещаемый приемник для zipfile: без seek() zipfile пишет
+    дескрипторы данных после каждого файла и не возвращается назад.
+    """
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+        self.pending = 0
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        self.pending += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def seek(self, *args):
+        raise OSError('Поток не поддерживает seek')
+
+    def flush(self):
+        pass
+
+    def drain(self):
+        data = b''.join(self.chunks)
+        self.chunks.clear()
+        self.pending = 0
+        return data
+
+
+def _entry(name, compress_type=zipfile.ZIP_DEFLATED):
+    info = zipfile.ZipInfo(name, date_time=time.localtime()[:6])
+    info.compress_type = compress_type
+    return info
+
+
+def _recipe_rows(user):
+    """Рецепты пользователя с ингредиентами, порциями по ROWS_CHUNK_SIZE."""
+    recipes = Recipe.objects.filter(author=user).order_by('pk').values(
+        'id', 'name', 'text', 'cooking_time', 'pub_date', 'image'
+    ).iterator(chunk_size=ROWS_CHUNK_SIZE)
+    chunk = []
+    for recipe in recipes:
+        chunk.append(recipe)
+        if len(chunk) >= ROWS_CHUNK_SIZE:
+            yield from _with_ingredients(chunk)
+            chunk = []
+    yield from _with_ingredients(chunk)
+
+
+def _with_ingredients(recipes):
+    if not recipes:
+        return
+    ingredients = {recipe['id']: [] for recipe in recipes}
+    for recipe_id, name, unit, amount in RecipeIngredient.objects.filter(
+        recipe_id__in=ingredients.keys()
+    ).order_by('pk').values_list(
+        'recipe_id', 'ingredient__name', 'ingredient__measurement_unit',
+        'amount'
+    ):
+        ingredients[recipe_id].append(
+            {'name': name, 'measurement_unit': unit, 'amount': amount}
+        )
+    for recipe in recipes:
+        recipe['ingredients'] = ingredients[recipe['id']]
+        yield recipe
+
+
+def _tables(user):
+    """Пары (имя файла в архиве, итератор строк)."""
+    return (
+        ('recipes.json', _recipe_rows(user)),
+        ('favorites.json', Favorite.objects.filter(user=user).order_by(
+            'pk'
+        ).values(
+            'recipe_id', 'recipe__name', 'added_at'
+        ).iterator(chunk_size=ROWS_CHUNK_SIZE)),
+        ('shopping_cart.json', ShoppingCart.objects.filter(
+            user=user
+        ).order_by('pk').values(
+            'recipe_id', 'recipe__name', 'added_at'
+        ).iterator(chunk_size=ROWS_CHUNK_SIZE)),
+        ('subscriptions.json', Subscription.objects.filter(
+            user=user
+        ).order_by('pk').values(
+            'author_id', 'author__username', 'created_at'
+        ).iterator(chunk_size=ROWS_CHUNK_SIZE)),
+    )
+
+
+def _image_names(user):
+    names = Recipe.objects.filter(author=user).exclude(image='').order_by(
+        'pk'
+    ).values_list('image', flat=True).iterator(chunk_size=ROWS_CHUNK_SIZE)
+    if user.avatar:
+        yield user.avatar.name
+    yield from names
+
+
+def iter_archive(user):
+    """Генератор байтов ZIP-архива с данными пользователя."""
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w') as archive:
+        profile = {
+            'id': user.pk,
+            'email': user.email,
+            'username': user.username,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'avatar': user.avatar.name if user.avatar else None,
+        }
+        archive.writestr(
+            _entry('profile.json'),
+            json.dumps(profile, ensure_ascii=False, indent=2)
+        )
+        yield sink.drain()
+
+        for name, rows in _tables(user):
+            with archive.open(_entry(name), 'w') as dest:
+                dest.write(b'[')
+                for index, row in enumerate(rows):
+                    if index:
+                        dest.write(b',')
+                    dest.write(b'\n')
+                    dest.write(json.dumps(
+                        row, cls=DjangoJSONEncoder, ensure_ascii=False
+                    ).encode())
+                    if sink.pending >= CHUNK_SIZE:
+                        yield sink.drain()
+                dest.write(b'\n]\n')
+            yield sink.drain()
+
+        for name in _image_names(user):
+            try:
+                source = default_storage.open(name, 'rb')
+            except OSError:
+                logger.warning('Файл %s не найден, пропускаем', name)
+                continue
+            with source, archive.open(
+                _entry(f'media/{name}', zipfile.ZIP_STORED), 'w',
+                force_zip64=source.size >= zipfile.ZIP64_LIMIT
+            ) as dest:
+                for block in iter(lambda: source.read(CHUNK_SIZE), b''):
+                    dest.write(block)
+                    yield sink.drain()
+            yield sink.drain()
+    yield sink.drain()
+
+
+def is_large(user):
+    """Выгрузку с большим числом рецептов (и картинок) делаем в фоне."""
+    return Recipe.objects.filter(author=user).count() > SYNC_MAX_RECIPES
+
+
+def exports_root():
+    return os.path.join(settings.MEDIA_ROOT, EXPORTS_DIR)
+
+
+def export_path(export):
+    return os.path.join(exports_root(), export.file_name)
+
+
+def _cleanup():
+    """Удаляет архивы и записи старше KEEP_SECONDS."""
+    expired = DataExport.objects.filter(
+        created_at__lt=timezone.now() - timedelta(seconds=KEEP_SECONDS)
+    )
+    for file_name in expired.exclude(file_name='').values_list(
+        'file_name', flat=True
+    ):
+        try:
+            os.remove(os.path.join(exports_root(), file_name))
+        except FileNotFoundError:
+            pass
+    expired.delete()
+
+
+def reap_stale():
+    """Помечает как failed выгрузки, потерянные вместе с воркером."""
+    now = timezone.now()
+    DataExport.objects.filter(
+        status__in=(DataExport.PENDING, DataExport.RUNNING),
+        created_at__lt=now - timedelta(seconds=STALE_SECONDS),
+    ).update(status=DataExport.FAILED, finished_at=now)
+
+
+def _run(export_id):
+    export = DataExport.objects.select_related('user').get(pk=export_id)
+    export.status = DataExport.RUNNING
+    export.save(update_fields=['status'])
+    file_name = f'{uuid.uuid4().hex}.zip'
+    path = os.path.join(exports_root(), file_name)
+    tmp_path = f'{path}.tmp'
+    try:
+        os.makedirs(exports_root(), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            for chunk in iter_archive(export.user):
+                f.write(chunk)
+        os.replace(tmp_path, path)
+        export.status = DataExport.DONE
+        export.file_name = file_name
+        export.size = os.path.getsize(path)
+    except Exception:
+        logger.exception('Ошибка выгрузки %s', export_id)
+        export.status = DataExport.FAILED
+        try:
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+    finally:
+        export.finished_at = timezone.now()
+        export.save(update_fields=[
+            'status', 'file_name', 'size', 'finished_at'
+        ])
+        # Поток пула не проходит через request_finished, соединение
+        # закрываем сами, иначе оно останется открытым до конца процесса.
+        connection.close()
+
+
+def active_export(user):
+    """Незавершенная выгрузка пользователя или None."""
+    reap_stale()
+    return DataExport.objects.filter(
+        user=user, status__in=(DataExport.PENDING, DataExport.RUNNING)
+    ).order_by('-pk').first()
+
+
+def start_export(user):
+    """
+    Возвращает незавершенную выгрузку пользователя, а если ее нет -
+    создает новую фоновую выгрузку.
+    """
+    _cleanup()
+    export = active_export(user)
+    if export is not None:
+        return export
+    export = DataExport.objects.create(user=user)
+    transaction.on_commit(lambda: _executor.submit(_run, export.pk))
+    return export
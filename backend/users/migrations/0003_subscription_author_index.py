@@ -0,0 +1,21 @@
+# Generated by Django 5.2 on 2026-10-19 09:19
+
+from django.db import migrations, models
+
+from api.operations import AddIndexConcurrently
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять внутри транзакции.
+    atomic = False
+
+    dependencies = [
+        ('users', '0002_data_exports'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='subscription',
+            index=models.Index(fields=['author', 'user'], name='subscription_author_user'),
+        ),
+    ]
@@ -91,7 +91,67 @@ class Subscription(models.Model):
                 check=~Q(user=F('author')), name='prevent_self_subscription'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'], name='subscription_author_user'
+            ),
+        ]
+        ordering = ('-created_at',)
+
+    def __str__(self):
+        return f'{self.user} подписан на {self.author}'
+
+
+class DataExport(models.Model):
+    """
+    Фоновая выгрузка данных пользователя в ZIP-архив.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, _('В очереди')),
+        (RUNNING, _('Выполняется')),
+        (DONE, _('Готово')),
+        (FAILED, _('Ошибка')),
+    )
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='data_exports',
+        verbose_name=_('Пользователь'),
+    )
+    status = models.CharField(
+        _('Статус'),
+        max_length=16,
+        choices=STATUS_CHOICES,
+        default=PENDING,
+    )
+    file_name = models.CharField(
+        _('Файл архива'),
+        max_length=255,
+        blank=True,
+    )
+    size = models.PositiveBigIntegerField(
+        _('Размер (байт)'),
+        default=0,
+    )
+    created_at = models.DateTimeField(
+        _('Создана'),
+        auto_now_add=True,
+    )
+    finished_at = models.DateTimeField(
+        _('Завершена'),
+        null=True,
+        blank=True,
+    )
+
+    class Meta:
+        verbose_name = _('Выгрузка данных')
+        verbose_name_plural = _('Выгрузки данных')
         ordering = ('-created_at',)
 
     def __str__(self):
-        return f'{self.user} подписан на {self.author}'
\ No newline at end of file
+        return f'Выгрузка {self.pk} ({self.user}): {self.status}'
@@ -0,0 +1,59 @@
+from api.fast import FieldPlan, ReadContext, column
+from .models import Subscription, User
+from .serializers import CustomUserSerializer
+
+USER_COLUMNS = ('email', 'id', 'username', 'first_name', 'last_name',
+                'avatar')
+
+USER_PLAN = FieldPlan(CustomUserSerializer, {
+    'email': column('email'),
+    'id': column('id'),
+    'username': column('username'),
+    'first_name': column('first_name'),
+    'last_name': column('last_name'),
+    'is_subscribed': lambda row, context: row['id'] in context.subscribed,
+    'avatar': lambda row, context: context.file_url(row['avatar']),
+})
+
+
+def subscribed_author_ids(user, author_ids):
+    """
+    Id авторов из author_ids, на которых подписан user (один запрос).
+    """
+    if user is None or not user.is_authenticated or not author_ids:
+        return set()
+    return set(Subscription.objects.filter(
+        user=user, author_id__in=author_ids
+    ).values_list('author_id', flat=True))
+
+
+def user_rows(author_ids):
+    """Строки пользователей для USER_PLAN, словарь по id."""
+    return {
+        row['id']: row
+        for row in User.objects.filter(id__in=author_ids).order_by().values(
+            *USER_COLUMNS
+        )
+    }
+
+
+def read_users(rows, request):
+    """
+    Быстрый аналог CustomUserSerializer(rows, many=True).data
+    для строк values(*USER_COLUMNS).
+    """
+    rows = list(rows)
+    context = ReadContext(request)
+    context.subscribed = subscribed_author_ids(
+        context.user, [row['id'] for row in rows]
+    )
+    return USER_PLAN.render_many(rows, context)
+
+
+def read_users_by_id(user_ids, request):
+    """
+    read_users для пользователей user_ids (в том же порядке;
+    несуществующие пропускаются).
+    """
+    rows = user_rows(user_ids)
+    return read_users([rows[pk] for pk in user_ids if pk in rows], request)
@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
 from rest_framework import serializers
 
-from .models import Subscription
+from api.mixins import SparseFieldsetMixin
+from .models import DataExport, Subscription
 from recipes.models import Recipe
 
 try:
@@ -14,12 +15,13 @@ except ImportError:
 User = get_user_model()
 
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class CustomUserSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Сериализатор для модели Пользователя (User).
     Используется для чтения данных пользователя (GET /api/users/, GET /api/users/{id}/, GET /api/users/me/).
     Также используется как вложенный сериализатор (например, в RecipeSerializer).
-    Добавляет поле is_subscribed.
+    Добавляет поле is_subscribed. Поддерживает ?fields=
+    (см. SparseFieldsetMixin).
     """
     is_subscribed = serializers.SerializerMethodField(read_only=True)
     avatar = serializers.ImageField(read_only=True)
@@ -59,7 +61,9 @@ class UserWithRecipesSerializer(CustomUserSerializer):
     recipes_count = serializers.ReadOnlyField(source='recipes.count')
 
     class Meta(CustomUserSerializer.Meta):
-        fields = CustomUserSerializer.Meta.fields + ('recipes', 'recipes_count')
+        fields = CustomUserSerializer.Meta.fields + (
+            'recipes', 'recipes_count'
+        )
         read_only_fields = fields
 
     def get_recipes(self, obj):
@@ -118,3 +122,25 @@ class SetAvatarResponseSerializer(serializers.ModelSerializer):
         fields = ('avatar',) # Возвращаем только поле аватара
         read_only_fields = fields
 
+
+class DataExportSerializer(serializers.ModelSerializer):
+    """
+    Статус фоновой выгрузки данных; download_url появляется,
+    когда архив готов.
+    """
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = DataExport
+        fields = (
+            'id', 'status', 'size', 'created_at', 'finished_at',
+            'download_url'
+        )
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        if obj.status != DataExport.DONE:
+            return None
+        request = self.context.get('request')
+        url = f'/api/users/me/exports/{obj.pk}/download/'
+        return request.build_absolute_uri(url) if request else url
@@ -1,3 +1,157 @@
-from django.test import TestCase
+import io
+import zipfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from djoser.views import UserViewSet as DjoserUserViewSet
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from api.query_plans import find_sequential_scans
+from api.testing import ThrottleResetTestCase
+from . import exports
+from .models import DataExport, Subscription, User
+from .views import CustomUserViewSet
+
+
+class FastUserListParityTest(ThrottleResetTestCase):
+    """
+    Быстрый путь списка пользователей должен отдавать те же байты,
+    что CustomUserSerializer + JSONRenderer.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = [
+            User.objects.create(
+                username=f'user{i}', email=f'user{i}@example.org',
+                first_name=f'Имя {i}', last_name='Фамилия',
+                avatar=f'users/avatars/аватар {i}.png' if i % 2 else None,
+            )
+            for i in range(5)
+        ]
+        Subscription.objects.create(user=cls.users[0], author=cls.users[1])
+        Subscription.objects.create(user=cls.users[0], author=cls.users[3])
+
+    def _compare(self, client, url):
+        fast = client.get(url)
+        with mock.patch.object(
+            CustomUserViewSet, 'list', DjoserUserViewSet.list
+        ), mock.patch.object(
+            CustomUserViewSet, 'renderer_classes', (JSONRenderer,)
+        ):
+            slow = client.get(url)
+        self.assertEqual(fast.status_code, 200)
+        self.assertEqual(fast.content, slow.content)
+
+    def test_anonymous_list(self):
+        self._compare(APIClient(), '/api/users/?limit=100')
+
+    def test_authenticated_list(self):
+        client = APIClient()
+        client.force_authenticate(self.users[0])
+        self._compare(client, '/api/users/?limit=100')
+        self._compare(client, '/api/users/?limit=2&page=2')
+
+
+class DataExportTest(ThrottleResetTestCase):
+    URL = '/api/users/me/export/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(
+            username='exporter', email='exporter@example.org',
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_small_export_streams(self):
+        response = self.client.get(self.URL)
+        self.assertEqual(response.status_code, 200)
+        archive = zipfile.ZipFile(io.BytesIO(b''.join(
+            response.streaming_content
+        )))
+        self.assertIn('profile.json', archive.namelist())
+        self.assertFalse(DataExport.objects.exists())
+
+    @mock.patch.object(exports, 'SYNC_MAX_RECIPES', -1)
+    def test_get_does_not_start_export(self):
+        response = self.client.get(self.URL)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(DataExport.objects.exists())
+
+    @mock.patch.object(exports, 'SYNC_MAX_RECIPES', -1)
+    def test_get_returns_active_export(self):
+        export = DataExport.objects.create(user=self.user)
+        response = self.client.get(self.URL)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['id'], export.pk)
+
+    def test_post_reuses_active_export(self):
+        first = self.client.post(self.URL)
+        second = self.client.post(self.URL)
+        self.assertEqual(first.status_code, 202)
+        self.assertEqual(first.json()['id'], second.json()['id'])
+        self.assertEqual(DataExport.objects.count(), 1)
+
+    def test_stale_export_failed(self):
+        stale = DataExport.objects.create(
+            user=self.user, status=DataExport.RUNNING
+        )
+        DataExport.objects.filter(pk=stale.pk).update(
+            created_at=timezone.now() - timedelta(
+                seconds=exports.STALE_SECONDS + 1
+            )
+        )
+        response = self.client.get(f'/api/users/me/exports/{stale.pk}/')
+        self.assertEqual(response.json()['status'], DataExport.FAILED)
+        response = self.client.post(self.URL)
+        self.assertNotEqual(response.json()['id'], stale.pk)
+
+
+class QueryPlanTest(ThrottleResetTestCase):
+    """
+    Запросы эндпоинтов пользователей и подписок не должны читать
+    большие таблицы последовательным сканированием.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = User.objects.bulk_create(
+            User(
+                username=f'user{i:03}', email=f'user{i:03}@example.org',
+                first_name='Имя', last_name='Фамилия',
+            )
+            for i in range(200)
+        )
+        Subscription.objects.bulk_create(
+            Subscription(user=user, author=cls.users[(i + j) % 200])
+            for i, user in enumerate(cls.users)
+            for j in range(1, 11)
+        )
+
+    def setUp(self):
+        super().setUp()
+        self.client = APIClient()
+        self.client.force_authenticate(self.users[0])
+
+    def assertIndexScans(self, method, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url)
+        self.assertLess(response.status_code, 400, url)
+        scans = find_sequential_scans(queries.captured_queries)
+        self.assertEqual(scans, [], f'{method.upper()} {url}')
+
+    def test_user_list_and_profile(self):
+        self.assertIndexScans('get', '/api/users/')
+        self.assertIndexScans('get', f'/api/users/{self.users[5].pk}/')
+        self.assertIndexScans('get', '/api/users/subscriptions/')
+
+    def test_subscribe_toggle(self):
+        url = f'/api/users/{self.users[50].pk}/subscribe/'
+        self.assertIndexScans('post', url)
+        self.assertIndexScans('delete', url)
@@ -2,12 +2,20 @@ from djoser.views import UserViewSet as DjoserUserViewSet
 from rest_framework import status, generics
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
+from django.http import FileResponse, Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
-from .models import Subscription, User
+from api.mixins import MultiGetMixin, get_query_list
+from api.renderers import FastJSONRenderer
+
+from . import exports
+from .models import DataExport, Subscription, User
+from .readers import USER_COLUMNS, read_users, read_users_by_id
 from .serializers import (
-    UserWithRecipesSerializer, SetAvatarSerializer, SetAvatarResponseSerializer
+    UserWithRecipesSerializer, SetAvatarSerializer,
+    SetAvatarResponseSerializer, DataExportSerializer
 )
 
 
@@ -25,13 +33,48 @@ class SubscriptionListView(generics.ListAPIView):
         return User.objects.filter(following__user=user).order_by('username')
 
 
-class CustomUserViewSet(DjoserUserViewSet):
+class CustomUserViewSet(MultiGetMixin, DjoserUserViewSet):
     """
     Кастомный ViewSet для Пользователей.
     Наследуется от Djoser UserViewSet. Добавляет кастомные действия
-    для подписок (создание/удаление) и аватара.
+    для подписок (создание/удаление) и аватара, выборку нескольких
+    пользователей по ?ids=.
     Список подписок вынесен в отдельный SubscriptionListView.
     """
+    SPARSE_COLUMNS = {'email', 'username', 'first_name', 'last_name', 'avatar'}
+    renderer_classes = (FastJSONRenderer, BrowsableAPIRenderer)
+    read_many = staticmethod(read_users_by_id)
+
+    def list(self, request, *args, **kwargs):
+        """
+        Список пользователей через быстрый путь (values() + план полей).
+        С ?fields= используется обычный сериализатор.
+        """
+        if 'ids' in request.query_params:
+            return self.multi_get(request)
+        if get_query_list(request, 'fields'):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset()).values(
+            *USER_COLUMNS
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(read_users(page, request))
+        return Response(read_users(queryset, request))
+
+    def get_queryset(self):
+        """
+        При ?fields= загружаем из БД только запрошенные колонки.
+        """
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve'):
+            fields = get_query_list(self.request, 'fields')
+            if fields:
+                queryset = queryset.only(
+                    'id', *(fields & self.SPARSE_COLUMNS)
+                )
+        return queryset
+
     def get_permissions(self):
         """
         Определяем права доступа динамически для стандартных действий Djoser.
@@ -113,4 +156,81 @@ class CustomUserViewSet(DjoserUserViewSet):
                 user.avatar.delete(save=True)
             return Response(status=status.HTTP_204_NO_CONTENT)
 
-        return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
\ No newline at end of file
+        return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
+
+    @action(
+        detail=False,
+        methods=['get', 'post'],
+        permission_classes=[IsAuthenticated],
+        url_path='me/export'
+    )
+    def export(self, request):
+        """
+        Выгрузка данных текущего пользователя в ZIP.
+        GET отдает архив потоком. Если данных много, GET возвращает
+        статус уже запущенной выгрузки (202) или 400: фоновую выгрузку
+        запускает только POST (повторный POST вернет текущую).
+        """
+        user = request.user
+        if request.method == 'GET':
+            if not exports.is_large(user):
+                response = StreamingHttpResponse(
+                    exports.iter_archive(user),
+                    content_type='application/zip'
+                )
+                response['Content-Disposition'] = (
+                    f'attachment; filename="foodgram_{user.username}.zip"'
+                )
+                return response
+            export = exports.active_export(user)
+            if export is None:
+                return Response(
+                    {'detail': 'Данных слишком много для выгрузки потоком. '
+                               'Запустите фоновую выгрузку POST-запросом.'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+        else:
+            export = exports.start_export(user)
+        serializer = DataExportSerializer(
+            export, context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        url_path=r'me/exports/(?P<export_id>\d+)'
+    )
+    def export_status(self, request, export_id=None):
+        """Статус фоновой выгрузки."""
+        exports.reap_stale()
+        export = get_object_or_404(
+            DataExport, pk=export_id, user=request.user
+        )
+        serializer = DataExportSerializer(
+            export, context={'request': request}
+        )
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        methods=['get'],
+        permission_classes=[IsAuthenticated],
+        url_path=r'me/exports/(?P<export_id>\d+)/download'
+    )
+    def export_download(self, request, export_id=None):
+        """Скачивание готового архива фоновой выгрузки."""
+        export = get_object_or_404(
+            DataExport, pk=export_id, user=request.user,
+            status=DataExport.DONE
+        )
+        try:
+            archive = open(exports.export_path(export), 'rb')
+        except FileNotFoundError:
+            raise Http404('Архив выгрузки удален.')
+        return FileResponse(
+            archive, as_attachment=True,
+            filename=f'foodgram_{request.user.username}.zip',
+            content_type='application/zip'
+        )